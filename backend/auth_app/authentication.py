@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def _user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """Возвращает пользователя из кеша с коротким TTL, при промахе загружает из БД."""
+    key = _user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user_model = get_user_model()
+        user = user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            cache.set(key, user, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    """Сбрасывает пользователя в кеше после фиксации транзакции."""
+    transaction.on_commit(lambda: cache.delete(_user_cache_key(user_id)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация за один проход на запрос.
+
+    Результат сохраняется в HttpRequest, поэтому JWTAuthenticationMiddleware
+    и DRF декодируют токен один раз, а пользователь берется из кеша
+    (сбрасывается при сохранении пользователя, см. auth_app.signals).
+    """
+    request_attr = '_jwt_auth_result'
+
+    def authenticate(self, request):
+        django_request = getattr(request, '_request', request)
+        result = getattr(django_request, self.request_attr, None)
+        if result is None:
+            result = super().authenticate(request)
+            if result is not None:
+                setattr(django_request, self.request_attr, result)
+        return result
+
+    def authenticate_token(self, raw_token):
+        """Проверяет токен (например, из WebSocket) и возвращает пользователя."""
+        return self.get_user(self.get_validated_token(raw_token))
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+jwt_authentication = CachedJWTAuthentication()
@@ -0,0 +1,81 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from auth_app.authentication import jwt_authentication
+
+
+class Command(BaseCommand):
+    help = 'Измерить накладные расходы JWT-аутентификации на запрос (до и после кеширования)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Количество запросов в замере')
+        parser.add_argument('--user', type=int, help='ID пользователя (по умолчанию первый активный)')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True).order_by('pk')
+        if options['user'] is not None:
+            users = users.filter(pk=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Нет активного пользователя для замера')
+
+        header = f'Bearer {AccessToken.for_user(user)}'
+        factory = APIRequestFactory()
+        count = options['requests']
+
+        legacy = JWTAuthentication()
+        stateless = JWTStatelessUserAuthentication()
+
+        def legacy_request(request):
+            # Раньше: middleware и DRF независимо декодировали токен и загружали пользователя
+            legacy.authenticate(request)
+            legacy.authenticate(Request(request))
+
+        def cached_request(request):
+            jwt_authentication.authenticate(request)
+            jwt_authentication.authenticate(Request(request))
+
+        def stateless_request(request):
+            stateless.authenticate(Request(request))
+
+        result = {'requests': count, 'user_id': user.pk, 'modes': {}}
+        for name, handler in (
+            ('legacy', legacy_request),
+            ('cached', cached_request),
+            ('validate_stateless', stateless_request),
+        ):
+            requests = [factory.get('/api/posts/', HTTP_AUTHORIZATION=header) for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for request in requests:
+                    handler(request)
+                elapsed = time.perf_counter() - started
+            result['modes'][name] = {
+                'us_per_request': round(elapsed / count * 1e6, 1),
+                'queries_per_request': round(len(queries) / count, 3),
+            }
+
+        self._report(result, options['json'])
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"Запросов: {result['requests']}, пользователь #{result['user_id']}")
+        for name, stats in result['modes'].items():
+            self.stdout.write(
+                f"{name}: {stats['us_per_request']} мкс/запрос, "
+                f"{stats['queries_per_request']} SQL-запросов/запрос"
+            )
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
@@ -0,0 +1,12 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import invalidate_cached_user
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_cache_invalidation_handler(sender, instance, **kwargs):
+    """Сбрасывает закешированного для JWT-аутентификации пользователя."""
+    invalidate_cached_user(instance.pk)
@@ -1,3 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .serializers import MyTokenObtainPairSerializer
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """JWT-аутентификация: один проход на запрос, кеш пользователя и проверка токена."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token(self.user)}')
+
+    @staticmethod
+    def token(user):
+        return str(MyTokenObtainPairSerializer.get_token(user).access_token)
+
+    def user_queries(self, url):
+        """Выполняет запрос и возвращает его статус и число запросов к таблице пользователей."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        table = User._meta.db_table
+        return response.status_code, sum(table in query['sql'] for query in queries)
+
+    def save_user(self, **fields):
+        for name, value in fields.items():
+            setattr(self.user, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+    def test_single_auth_pass(self):
+        # Middleware и DRF аутентифицируют запрос одним проходом
+        self.assertEqual(self.user_queries('/api/notifications/unread-count/'), (200, 1))
+        # Следующий запрос берет пользователя из кеша
+        self.assertEqual(self.user_queries('/api/notifications/unread-count/'), (200, 0))
+
+    def test_profile(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.json(), {'id': self.user.pk, 'email': 'reader@example.com', 'username': 'reader'})
+        with self.assertNumQueries(0):
+            self.client.get('/api/auth/profile/')
+
+    def test_invalidation_on_save(self):
+        self.client.get('/api/auth/profile/')
+
+        self.save_user(username='renamed')
+        self.assertEqual(self.client.get('/api/auth/profile/').json()['username'], 'renamed')
+
+        self.save_user(is_active=False)
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+        self.assertEqual(self.client.get('/api/posts/').status_code, 401)
+
+    def test_invalidation_on_delete(self):
+        self.client.get('/api/auth/profile/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_validate_stateful(self):
+        with self.settings(AUTH_VALIDATE_STATELESS=False):
+            response = self.client.get('/api/auth/validate/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {
+                'valid': True,
+                'user': {'id': self.user.pk, 'email': 'reader@example.com', 'username': 'reader'},
+            })
+
+            self.save_user(is_active=False)
+            self.assertEqual(self.client.get('/api/auth/validate/').status_code, 401)
+
+    def test_validate_stateless(self):
+        with self.settings(AUTH_VALIDATE_STATELESS=True):
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/auth/validate/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {
+                'valid': True,
+                'user': {'id': self.user.pk, 'email': 'reader@example.com', 'username': 'reader'},
+            })
+
+            # Проверяются только подпись и срок: токен деактивированного пользователя действителен
+            self.save_user(is_active=False)
+            self.assertEqual(self.client.get('/api/auth/validate/').status_code, 200)
+
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token(self.user)[:-2]}xx')
+            self.assertEqual(self.client.get('/api/auth/validate/').status_code, 401)
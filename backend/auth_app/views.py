@@ -1,8 +1,11 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import CustomUserSerializer, MyTokenObtainPairSerializer
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -150,9 +153,19 @@ class ValidateTokenView(generics.GenericAPIView):
     """
     Проверка валидности JWT токена.
     Возвращает информацию о пользователе, если токен действителен.
+
+    При AUTH_VALIDATE_STATELESS проверяются только подпись и срок действия,
+    а данные пользователя берутся из claims токена без обращения к БД.
+    Поэтому токен деактивированного или удаленного пользователя остается
+    действительным до истечения срока; False — полная проверка пользователя.
     """
     permission_classes = [IsAuthenticated]
 
+    def get_authenticators(self):
+        if settings.AUTH_VALIDATE_STATELESS:
+            return [JWTStatelessUserAuthentication()]
+        return super().get_authenticators()
+
     @swagger_auto_schema(
         operation_description="Проверка валидности JWT токена",
         responses={
@@ -180,4 +193,13 @@ class ValidateTokenView(generics.GenericAPIView):
         }
     )
     def get(self, request):
-        return Response({'valid': True, 'user': CustomUserSerializer(request.user).data})
\ No newline at end of file
+        if settings.AUTH_VALIDATE_STATELESS:
+            token = request.auth
+            user = {
+                'id': token[api_settings.USER_ID_CLAIM],
+                'email': token.get('email'),
+                'username': token.get('username'),
+            }
+        else:
+            user = CustomUserSerializer(request.user).data
+        return Response({'valid': True, 'user': user})
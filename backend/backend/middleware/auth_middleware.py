@@ -1,8 +1,9 @@
 from django.utils.deprecation import MiddlewareMixin
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
 
+from auth_app.authentication import jwt_authentication
+
 from django.http import JsonResponse
 
 
@@ -21,9 +22,8 @@ class JWTAuthenticationMiddleware(MiddlewareMixin):
             )
 
         try:
-            auth = JWTAuthentication()
-            request.META['HTTP_AUTHORIZATION'] = auth_header  # Устанавливаем заголовок
-            auth_result = auth.authenticate(request)
+            # Результат сохраняется в запросе и повторно используется аутентификацией DRF
+            auth_result = jwt_authentication.authenticate(request)
             if auth_result is not None:
                 request.user, request.auth = auth_result
             else:
@@ -0,0 +1,101 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from blog.metrics import RequestStats, current_stats, request_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Собирает метрики каждого запроса (см. blog.metrics): число и время
+    SQL-запросов, время сериализации и полное время по view и имени маршрута.
+
+    Запросы, превысившие бюджет SQL-запросов маршрута (QUERY_BUDGETS по ключу
+    'МЕТОД имя' или 'имя', иначе QUERY_BUDGET_DEFAULT), пишутся в лог вместе
+    с SQL. При SERVER_TIMING_HEADER те же времена отдаются клиенту в заголовке
+    Server-Timing. Для потоковых ответов время учитывается до начала отдачи тела.
+    Должен стоять первым в MIDDLEWARE, чтобы учитывать время остальных.
+
+    Поддерживает синхронный и асинхронный вызов: SQL-запросы считает
+    blog.metrics.count_queries, которая видит статистику через contextvar
+    и в потоках sync_to_async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._is_measured(request):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._observe(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self._is_measured(request):
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._observe(request, response, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def _is_measured(request):
+        return settings.METRICS_ENABLED and request.path not in settings.METRICS_EXCLUDED_PATHS
+
+    def _observe(self, request, response, stats, duration):
+        view, route = self._view_and_route(request)
+        budget = settings.QUERY_BUDGETS.get(
+            f'{request.method} {route}', settings.QUERY_BUDGETS.get(route, settings.QUERY_BUDGET_DEFAULT)
+        )
+        request_metrics.observe((view, route, request.method), stats, duration, budget)
+        if budget is not None and stats.queries > budget:
+            self._log_budget_exceeded(request, route, stats, budget)
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'serialization;dur={stats.serialization_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        return response
+
+    @staticmethod
+    def _view_and_route(request):
+        match = request.resolver_match
+        if match is None:
+            return 'unresolved', 'unresolved'
+        return match._func_path, match.view_name or match.route
+
+    @staticmethod
+    def _log_budget_exceeded(request, route, stats, budget):
+        statements = '\n'.join(
+            f'  [{duration * 1000:.1f} ms] {sql}' for sql, duration in stats.sql
+        )
+        logger.warning(
+            'Превышен бюджет SQL-запросов: %s %s (%s) — %s запросов при бюджете %s, %.1f ms в БД\n%s',
+            request.method, request.get_full_path(), route, stats.queries, budget,
+            stats.db_time * 1000, statements
+        )
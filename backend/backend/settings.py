@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'whitenoise.runserver_nostatic',
     'channels',
     'rest_framework',
@@ -51,8 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.metrics_middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'backend.middleware.static_middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     #'django.middleware.csrf.CsrfViewMiddleware',
@@ -143,17 +145,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Настройки REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth_app.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',  # По умолчанию для всех API
     ),
+    # JSON-ответы рендерятся orjson (тот же вывод, что у JSONRenderer)
+    'DEFAULT_RENDERER_CLASSES': [
+        'blog.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.MultiPartParser',
+        'blog.parsers.UploadMultiPartParser',
         'rest_framework.parsers.JSONParser',
     ],
+    # Курсорная пагинация по (created_at, id) без OFFSET и COUNT(*)
+    'DEFAULT_PAGINATION_CLASS': 'blog.pagination.KeysetCursorPagination',
 }
 
+# Время жизни пользователя в кеше JWT-аутентификации, секунды (сбрасывается при сохранении)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60))
+# /api/auth/validate/ проверяет только подпись и срок токена, без обращения к БД:
+# токен деактивированного или удаленного пользователя считается действительным до истечения срока
+AUTH_VALIDATE_STATELESS = os.getenv('AUTH_VALIDATE_STATELESS', 'True') == 'True'
+
 # Настройки JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -209,6 +224,7 @@ REDOC_SETTINGS = {
 
 PUBLIC_PATHS = [
     '/api/auth/',
+    '/api/posts/published/',  # Публичная лента опубликованных постов (кешируется)
     '/admin/',           # Сама админ панель
     '/admin/login/',     # Страница входа в админ панель
     '/admin/logout/',    # Страница выхода из админ панели
@@ -220,20 +236,153 @@ PUBLIC_PATHS = [
     '/favicon.ico',      # Фавикон
     '/robots.txt',       # Robots.txt
     '/sitemap.xml',      # Карта сайта
+    '/metrics',          # Метрики Prometheus (доступ ограничивает METRICS_ALLOWED_IPS)
 ]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# Channels
-ASGI_APPLICATION = 'backend.asgi.application'
+# Ограничения при выдаче ветки комментариев (CommentThreadView)
+COMMENT_THREAD_MAX_DEPTH = int(os.getenv('COMMENT_THREAD_MAX_DEPTH', 50))
+COMMENT_THREAD_MAX_NODES = int(os.getenv('COMMENT_THREAD_MAX_NODES', 1000))
+# Размер пачки bulk_create при массовом импорте комментариев
+COMMENT_IMPORT_CHUNK_SIZE = int(os.getenv('COMMENT_IMPORT_CHUNK_SIZE', 2000))
+# Размер пачки строк, читаемых из БД за раз при потоковой выгрузке постов
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Метрики запросов (/metrics в формате Prometheus): время, число SQL-запросов,
+# время БД и сериализации по view и маршруту. По умолчанию /metrics доступен только
+# с loopback; явно пустой METRICS_ALLOWED_IPS снимает ограничение
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+METRICS_EXCLUDED_PATHS = ['/metrics', '/favicon.ico']
+# Бюджет SQL-запросов на HTTP-запрос: превышение пишется в лог вместе с SQL.
+# QUERY_BUDGETS — бюджеты по имени маршрута (или 'МЕТОД имя', если маршрут принимает
+# и чтение, и запись), для остальных — QUERY_BUDGET_DEFAULT
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 20))
+QUERY_BUDGETS = {
+    'post-list': 6,
+    'post-published': 6,
+    'post-my': 6,
+    'post-detail': 8,
+    'post-top-comments': 4,
+    'GET comment-list': 4,
+    'comment-replies': 4,
+    'comment-thread': 4,
+}
+# Заголовок Server-Timing с временем БД, сериализации и полным временем запроса
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'False') == 'True'
+# Бюджеты задержки нагрузочного теста (команда loadtest), мс: сценарий -> {p50/p95/p99/max: предел}.
+# Превышение бюджета или доля ошибок сценария больше LOADTEST_MAX_ERROR_RATE — ненулевой код выхода
+LOADTEST_LATENCY_BUDGETS = {
+    'post-list': {'p95': 300, 'p99': 1000},
+    'post-top-comments': {'p95': 200, 'p99': 800},
+    'comment-replies': {'p95': 200, 'p99': 800},
+    'comment-create': {'p95': 800, 'p99': 2000},
+    'ws-connect': {'p95': 300, 'p99': 1000},
+}
+LOADTEST_MAX_ERROR_RATE = float(os.getenv('LOADTEST_MAX_ERROR_RATE', 0.01))
+
+# Асинхронные представления чтения (лента, пост, комментарии, ответы, ветка) на async ORM
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'True') == 'True'
 
-CHANNEL_LAYERS = {
+# Загрузка вложений: лимиты размера по типу содержимого (байты), максимум файлов
+# в запросе, максимум пикселей изображения (защита от «бомб» при создании миниатюр)
+# и сколько первых байт файла можно принять в поисках заголовка изображения
+UPLOAD_MAX_SIZE = {
+    'text': int(os.getenv('UPLOAD_MAX_TEXT_SIZE', 100 * 1024)),
+    'image': int(os.getenv('UPLOAD_MAX_IMAGE_SIZE', 5 * 1024 * 1024)),
+}
+UPLOAD_MAX_FILES = int(os.getenv('UPLOAD_MAX_FILES', 10))
+UPLOAD_MAX_IMAGE_PIXELS = int(os.getenv('UPLOAD_MAX_IMAGE_PIXELS', 40_000_000))
+UPLOAD_SNIFF_SIZE = int(os.getenv('UPLOAD_SNIFF_SIZE', 256 * 1024))
+
+# Количество последних комментариев верхнего уровня в карточке поста
+RECENT_COMMENTS_LIMIT = int(os.getenv('RECENT_COMMENTS_LIMIT', 3))
+
+# Полнотекстовый поиск (параметр search): конфигурация PostgreSQL для to_tsvector
+# (russian стеммит и русские, и английские слова); запросы из одного слова не длиннее
+# SEARCH_SHORT_QUERY_LENGTH символов дополнительно ищутся по триграммам/префиксу
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+SEARCH_SHORT_QUERY_LENGTH = int(os.getenv('SEARCH_SHORT_QUERY_LENGTH', 4))
+
+# Кеш. По умолчанию локальная память процесса; при нескольких воркерах
+# нужен общий бэкенд, например django.core.cache.backends.redis.RedisCache
+CACHES = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'blog-cache'),
     },
 }
 
+# Кеш ответов публичных лент постов
+LISTING_CACHE_ALIAS = 'default'
+LISTING_CACHE_TIMEOUT = int(os.getenv('LISTING_CACHE_TIMEOUT', 300))
+
+# Фоновая генерация миниатюр вложений (при THUMBNAIL_ASYNC=False — синхронно после коммита)
+THUMBNAIL_ASYNC = os.getenv('THUMBNAIL_ASYNC', 'True') == 'True'
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+# Размеры миниатюр (ширина, высота) — все создаются за одно декодирование
+THUMBNAIL_VARIANTS = {
+    'list': (320, 240),
+    'preview': (640, 480),
+    'retina': (1280, 960),
+}
+# Форматы вариантов в порядке предпочтения (берется первый доступный в Pillow, иначе JPEG)
+THUMBNAIL_FORMATS = os.getenv('THUMBNAIL_FORMATS', 'AVIF,WEBP').split(',')
+# Вариант, который дополнительно сохраняется в JPEG в поле thumbnail для старых клиентов
+THUMBNAIL_FALLBACK_VARIANT = 'list'
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', 80))
+
+# Outbox уведомлений: отправка после коммита в процессе сервера
+# (при NOTIFICATION_OUTBOX_INLINE_DISPATCH=False — только командой dispatch_notifications)
+NOTIFICATION_OUTBOX_INLINE_DISPATCH = os.getenv('NOTIFICATION_OUTBOX_INLINE_DISPATCH', 'True') == 'True'
+NOTIFICATION_OUTBOX_BATCH_SIZE = int(os.getenv('NOTIFICATION_OUTBOX_BATCH_SIZE', 100))
+NOTIFICATION_OUTBOX_CONCURRENCY = int(os.getenv('NOTIFICATION_OUTBOX_CONCURRENCY', 20))
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 10))
+# Аренда пачки и базовая задержка повтора, секунды
+NOTIFICATION_OUTBOX_LEASE = int(os.getenv('NOTIFICATION_OUTBOX_LEASE', 30))
+NOTIFICATION_OUTBOX_RETRY_DELAY = int(os.getenv('NOTIFICATION_OUTBOX_RETRY_DELAY', 5))
+
+# Уведомления: время жизни кеша счетчика непрочитанных (секунды) и сколько
+# пропущенных уведомлений отправлять при переподключении
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = int(os.getenv('NOTIFICATION_UNREAD_CACHE_TIMEOUT', 3600))
+NOTIFICATION_REPLAY_LIMIT = int(os.getenv('NOTIFICATION_REPLAY_LIMIT', 100))
+
+# Channels
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Слой каналов: memory — только внутри одного процесса;
+# redis — любой сервер с протоколом Redis (Redis, Valkey, KeyDB), нужен пакет channels-redis;
+# postgres — LISTEN/NOTIFY в основной БД, без дополнительных сервисов
+CHANNEL_LAYER_BACKEND = os.getenv('CHANNEL_LAYER_BACKEND', 'memory')
+
+if CHANNEL_LAYER_BACKEND == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': [os.getenv('CHANNEL_REDIS_URL', 'redis://localhost:6379/0')],
+            },
+        },
+    }
+elif CHANNEL_LAYER_BACKEND == 'postgres':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'blog.channel_layers.PostgresChannelLayer',
+            'CONFIG': {
+                'database': 'default',
+                'notify_channel': os.getenv('CHANNEL_NOTIFY_CHANNEL', 'channels_layer'),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        },
+    }
+
 
 
 # Static files (CSS, JavaScript, Images)
@@ -4,6 +4,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from auth_app.views import RegisterView, MyTokenObtainPairView, UserProfileView, ValidateTokenView
+from blog.views import metrics_view
 
 from api_docs.schema import urlpatterns as docs_urls
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -16,7 +17,8 @@ urlpatterns = [
     path('api/auth/validate/', ValidateTokenView.as_view(), name='token_validate'),
     path('api/auth/profile/', UserProfileView.as_view(), name='user_profile'),
 
-    path('api/', include('blog.urls'))
+    path('api/', include('blog.urls')),
+    path('metrics', metrics_view, name='metrics'),
 
 ] + docs_urls
 
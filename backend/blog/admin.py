@@ -1,7 +1,6 @@
 from django.contrib import admin
-from django.db import models
 
-from .models import Post, Comment, PostAttachment, CommentAttachment, CommentTree
+from .models import Post, Comment, PostAttachment, CommentAttachment, CommentTree, Notification, NotificationOutbox
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
@@ -56,19 +55,6 @@ class PostAdmin(admin.ModelAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        """Аннотируем количество комментариев."""
-        return super().get_queryset(request).annotate(
-            _comments_count=models.Count('comments', filter=models.Q(comments__is_deleted=False))
-        )
-
-    def comments_count(self, obj):
-        """Отображаем количество комментариев."""
-        return obj._comments_count
-
-    comments_count.admin_order_field = '_comments_count'
-    comments_count.short_description = 'Комментарии'
-
     actions = ['send_test_notification']
 
     def send_test_notification(self, request, queryset):
@@ -141,18 +127,6 @@ class CommentAdmin(admin.ModelAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        """Аннотируем количество ответов."""
-        return super().get_queryset(request).annotate(
-            _replies_count=models.Count('replies', filter=models.Q(replies__is_deleted=False)))
-
-    def replies_count(self, obj):
-        """Отображаем количество ответов."""
-        return obj._replies_count
-
-    replies_count.admin_order_field = '_replies_count'
-    replies_count.short_description = 'Ответы'
-
     def get_short_content(self, obj):
         """Возвращает сокращенное содержание комментария."""
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
@@ -223,4 +197,23 @@ class CommentAttachmentAdmin(admin.ModelAdmin):
         """Возвращает имя файла изображения."""
         return obj.image.name.split('/')[-1] if obj.image else 'Нет изображения'
 
-    get_filename.short_description = 'Имя файла'
\ No newline at end of file
+    get_filename.short_description = 'Имя файла'
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """Админ-панель для уведомлений."""
+    list_display = ('title', 'user', 'notification_type', 'read', 'created_at')
+    list_filter = ('notification_type', 'read')
+    search_fields = ('title', 'message', 'user__username')
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """Админ-панель для неотправленных уведомлений."""
+    list_display = ('id', 'user', 'created_at', 'attempts', 'locked_until', 'last_error')
+    readonly_fields = ('user', 'payload', 'created_at', 'attempts', 'locked_until', 'last_error')
+    list_filter = ('attempts',)
+    ordering = ('id',)
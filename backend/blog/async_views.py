@@ -0,0 +1,192 @@
+"""
+Асинхронные варианты представлений чтения (лента, пост, комментарии поста,
+ответы, ветка).
+
+Синхронное представление под ASGI целиком выполняется в потоке через
+sync_to_async. Здесь обработчик — корутина: запросы к БД идут через async ORM
+(afirst, aget, async for), страница выбирается apaginate_queryset, JSON
+рендерится в цикле событий, а в поток уходят только отдельные запросы.
+Ответы совпадают с синхронными представлениями байт в байт: используются те
+же queryset, сериализаторы, пагинация и рендереры.
+
+Включаются настройкой ASYNC_READ_VIEWS (см. blog/urls.py).
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.shortcuts import aget_object_or_404 as _aget_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .cache import listing_cache
+from .fieldsets import FieldSelection
+from .models import Comment, Post
+from .querysets import comment_queryset, post_comments_queryset
+from .thread_service import comment_thread_service
+from .views import (
+    CommentRepliesListView, CommentThreadView, PostListView, PostRetrieveView, PostTopCommentsView
+)
+
+
+async def aget_object_or_404(queryset, *filter_args, **filter_kwargs):
+    """Асинхронный rest_framework.generics.get_object_or_404."""
+    try:
+        return await _aget_object_or_404(queryset, *filter_args, **filter_kwargs)
+    except (TypeError, ValueError, ValidationError):
+        raise Http404
+
+
+class AsyncAPIViewMixin:
+    """
+    dispatch APIView для асинхронных обработчиков.
+
+    Проверки initial (аутентификация, права, троттлинг) выполняются в потоке,
+    так как классы из настроек могут обращаться к БД. Синхронные обработчики
+    (options) также вызываются через sync_to_async. Ответы JSON-рендереров
+    рендерятся в цикле событий, остальные (Browsable API) — в потоке.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if isinstance(self.response, Response) and not self.response.is_rendered:
+            if isinstance(getattr(self.response, 'accepted_renderer', None), JSONRenderer):
+                self.response.render()
+            else:
+                await sync_to_async(self.response.render)()
+        return self.response
+
+
+class AsyncListMixin(AsyncAPIViewMixin):
+    """ListModelMixin.list на async ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(await self.aget_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([item async for item in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aget_queryset(self):
+        """get_queryset без обращений к БД; переопределяется, если они нужны."""
+        return self.get_queryset()
+
+    async def afilter_queryset(self, queryset):
+        # DjangoFilterBackend проверяет значения ModelChoiceFilter запросом к БД
+        if any(issubclass(backend, DjangoFilterBackend) for backend in self.filter_backends) and (
+            set(self.request.query_params) & set(getattr(self, 'filterset_fields', ()))
+        ):
+            return await sync_to_async(self.filter_queryset)(queryset)
+        return self.filter_queryset(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+
+class AsyncCachedListMixin:
+    """CachedListMixin.list на асинхронном API кеша."""
+
+    async def alist(self, request, *args, **kwargs):
+        version = await listing_cache.aget_version()
+        key = listing_cache.make_key(self.get_cache_endpoint(request), request, version)
+        entry = await listing_cache.aget(key)
+        if entry is None:
+            response = await super().alist(request, *args, **kwargs)
+            entry = await listing_cache.aset(key, response.data, version)
+        return self.get_cached_response(request, entry)
+
+
+class AsyncPostListView(AsyncCachedListMixin, AsyncListMixin, PostListView):
+    """Список постов (асинхронный)."""
+
+
+class AsyncPostRetrieveView(AsyncAPIViewMixin, PostRetrieveView):
+    """Просмотр деталей поста (асинхронный): комментарии загружаются до сериализации."""
+
+    async def get(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        selection = FieldSelection.from_request(request)
+        if selection.includes('comments'):
+            instance.root_comments = [
+                comment async for comment in post_comments_queryset(instance, selection.nested('comments'))
+            ]
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncPostTopCommentsView(AsyncListMixin, PostTopCommentsView):
+    """Комментарии верхнего уровня поста (асинхронный)."""
+
+    async def aget_queryset(self):
+        post = await aget_object_or_404(Post, pk=self.kwargs['pk'])
+        return comment_queryset(Comment.objects.filter(
+            post=post,
+            parent__isnull=True,
+            is_deleted=False
+        ), FieldSelection.from_request(self.request))
+
+
+class AsyncCommentRepliesListView(AsyncListMixin, CommentRepliesListView):
+    """Список ответов на комментарий (асинхронный)."""
+
+    async def aget_queryset(self):
+        comment = await aget_object_or_404(Comment, pk=self.kwargs['pk'])
+        return comment_queryset(comment.replies.filter(is_deleted=False), FieldSelection.from_request(self.request))
+
+
+class AsyncCommentThreadView(AsyncAPIViewMixin, CommentThreadView):
+    """Вся ветка комментариев (асинхронный)."""
+
+    async def get(self, request, pk):
+        try:
+            thread, truncated = await comment_thread_service.abuild_thread(
+                pk,
+                context={'request': request},
+                max_depth=self._get_int_param('max_depth'),
+                max_nodes=self._get_int_param('max_nodes')
+            )
+        except Comment.DoesNotExist:
+            raise Http404
+
+        response = Response(thread)
+        if truncated:
+            response['X-Thread-Truncated'] = 'true'
+        return response
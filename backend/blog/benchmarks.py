@@ -0,0 +1,340 @@
+"""
+Набор микробенчмарков для сравнения производительности между коммитами.
+
+Каждый замер — функция подготовки, которая возвращает вызываемый объект без
+аргументов; run_benchmark подбирает число вызовов в раунде так, чтобы раунд
+длился не меньше min_time, и считает статистику времени одного вызова по
+раундам. Замеры с БД (uses_db) выполняются в транзакции, которая
+откатывается после замера, поэтому не оставляют данных и не влияют друг
+на друга.
+
+Запуск, сохранение результата в JSON и сравнение с предыдущим результатом —
+команда bench_suite.
+"""
+import math
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from PIL import Image, ImageDraw
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .fast_serializers import CommentReadSerializer, PostReadSerializer
+from .imaging import render_thumbnails
+from .management.commands.bench_html_validator import build_inputs
+from .management.commands.bench_serializers import build_posts
+from .models import Comment, Post
+from .notification_service import notification_service
+from .serializers import CommentSerializer, PostSerializer
+from .validators import HTMLValidator
+
+SERIALIZED_OBJECTS = 1000
+TREE_DEPTHS = (1, 5, 10, 25, 50)
+NOTIFICATION_BATCH = 1000
+# (формат, ширина, высота, режим) исходных изображений для миниатюр
+THUMBNAIL_SOURCES = (
+    ('JPEG', 640, 480, 'RGB'),
+    ('JPEG', 1920, 1080, 'RGB'),
+    ('JPEG', 4000, 3000, 'RGB'),
+    ('PNG', 1920, 1080, 'RGBA'),
+    ('GIF', 800, 600, 'P'),
+)
+
+
+class Benchmark:
+    """Замер: имя группы, имя внутри группы, параметры и функция подготовки."""
+
+    def __init__(self, group, name, setup, params=None, uses_db=False):
+        self.group = group
+        self.name = name
+        self.setup = setup
+        self.params = params or {}
+        self.uses_db = uses_db
+
+    @property
+    def full_name(self):
+        return f'{self.group}.{self.name}'
+
+
+def measure(func, rounds, min_time, warmup=1):
+    """
+    Статистика времени одного вызова func в секундах.
+
+    Число вызовов в раунде подбирается по времени прогрева так, чтобы раунд
+    длился не меньше min_time: короткие операции меряются пачками, и
+    погрешность таймера не влияет на результат.
+    """
+    started = time.perf_counter()
+    for _ in range(max(warmup, 1)):
+        func()
+    single = (time.perf_counter() - started) / max(warmup, 1)
+    iterations = max(1, math.ceil(min_time / single)) if single > 0 else 1
+
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - started) / iterations)
+
+    mean = statistics.fmean(samples)
+    return {
+        'min': min(samples),
+        'max': max(samples),
+        'mean': mean,
+        'median': statistics.median(samples),
+        'stddev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': rounds,
+        'iterations': iterations,
+        'ops': 1 / mean if mean else None,
+    }
+
+
+def run_benchmark(benchmark, rounds, min_time, warmup=1):
+    """Готовит и выполняет замер; изменения в БД откатываются."""
+    if not benchmark.uses_db:
+        return measure(benchmark.setup(), rounds, min_time, warmup)
+    with transaction.atomic():
+        stats = measure(benchmark.setup(), rounds, min_time, warmup)
+        transaction.set_rollback(True)
+    return stats
+
+
+def compare(baseline, current, threshold):
+    """
+    Сравнение медиан двух результатов bench_suite.
+
+    Возвращает строки (имя, медиана до, медиана после, отношение, статус);
+    статус regression/improvement — изменение больше threshold (доля),
+    new/removed — замер есть только в одном из результатов.
+    """
+    rows = []
+    old = baseline['benchmarks']
+    new = current['benchmarks']
+    for name in sorted(set(old) | set(new)):
+        if name not in old:
+            rows.append((name, None, new[name]['stats']['median'], None, 'new'))
+            continue
+        if name not in new:
+            rows.append((name, old[name]['stats']['median'], None, None, 'removed'))
+            continue
+        before = old[name]['stats']['median']
+        after = new[name]['stats']['median']
+        ratio = after / before if before else None
+        if ratio is None:
+            status = 'same'
+        elif ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'same'
+        rows.append((name, before, after, ratio, status))
+    return rows
+
+
+# Сериализаторы
+
+def serializer_benchmarks():
+    posts = build_posts(SERIALIZED_OBJECTS)
+    comments = [post.recent_top_comments[0] for post in build_posts(SERIALIZED_OBJECTS, comments_per_post=1)]
+    context = {'request': Request(APIRequestFactory().get('/api/posts/', HTTP_HOST='blog.example.com'))}
+
+    def serialize(serializer_class, items):
+        return lambda: serializer_class(items, many=True, context=context).data
+
+    cases = (
+        ('post_drf', PostSerializer, posts),
+        ('post_fast', PostReadSerializer, posts),
+        ('comment_drf', CommentSerializer, comments),
+        ('comment_fast', CommentReadSerializer, comments),
+    )
+    for name, serializer_class, items in cases:
+        yield Benchmark(
+            'serializers', f'{name}_{len(items)}',
+            lambda serializer_class=serializer_class, items=items: serialize(serializer_class, items),
+            {'serializer': serializer_class.__name__, 'objects': len(items)}
+        )
+
+
+# Валидатор HTML
+
+def html_validator_benchmarks():
+    validator = HTMLValidator()
+
+    def validate(value):
+        def call():
+            try:
+                validator(value)
+            except ValidationError:
+                # Неудобные входы отклоняются валидатором, время отказа тоже замеряется
+                pass
+        return call
+
+    for name, value in build_inputs().items():
+        yield Benchmark(
+            'html_validator', name,
+            lambda value=value: validate(value),
+            {'bytes': len(value.encode('utf-8'))}
+        )
+
+
+# Таблица замыканий комментариев
+
+def _tree_fixture(depth, prefix):
+    """Пост и ветка из depth комментариев (каждый — ответ на предыдущий)."""
+    user = get_user_model().objects.create(username=f'{prefix}_{depth}', email=f'{prefix}_{depth}@example.com')
+    post = Post.objects.create(author=user, title='Замер дерева комментариев', content='<p>Текст</p>')
+    chain = []
+    parent = None
+    for _ in range(depth):
+        parent = Comment.objects.create(post=post, author=user, content='Комментарий', parent=parent)
+        chain.append(parent)
+    return user, post, chain
+
+
+def insert_reply(depth):
+    """Создание ответа на комментарий глубины depth: Comment.save и _insert_tree_paths."""
+    user, post, chain = _tree_fixture(depth, 'bench_insert')
+    deepest = chain[-1]
+
+    def call():
+        Comment(post=post, author=user, content='Ответ', parent=deepest).save()
+    return call
+
+
+def move_subtree(depth):
+    """Перенос ветки из depth комментариев между двумя корнями: _move_subtree."""
+    user, post, chain = _tree_fixture(depth, 'bench_move')
+    roots = [Comment.objects.create(post=post, author=user, content='Корень') for _ in range(2)]
+    head = chain[0]
+
+    def call():
+        head.parent = roots[0] if head.parent_id != roots[0].pk else roots[1]
+        head.save()
+    return call
+
+
+def comment_tree_benchmarks():
+    for depth in TREE_DEPTHS:
+        yield Benchmark(
+            'comment_tree', f'insert_depth_{depth}', lambda depth=depth: insert_reply(depth),
+            {'depth': depth}, uses_db=True
+        )
+    for depth in TREE_DEPTHS:
+        yield Benchmark(
+            'comment_tree', f'move_subtree_{depth}', lambda depth=depth: move_subtree(depth),
+            {'depth': depth}, uses_db=True
+        )
+
+
+# Миниатюры
+
+def build_image(format_name, width, height, mode):
+    """Изображение с градиентом и фигурами: сжимается не лучше обычной фотографии."""
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for number in range(20):
+        left = width * number // 20
+        top = height * (number % 5) // 5
+        draw.ellipse(
+            [left, top, left + width // 8, top + height // 6],
+            fill=(number * 12 % 256, 255 - number * 12 % 256, number * 40 % 256)
+        )
+    if mode == 'RGBA':
+        img.putalpha(Image.linear_gradient('L').resize((width, height)))
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.Palette.ADAPTIVE)
+    output = BytesIO()
+    img.save(output, format=format_name)
+    return output.getvalue()
+
+
+def thumbnail_benchmarks():
+    options = (
+        settings.THUMBNAIL_VARIANTS,
+        settings.THUMBNAIL_FORMATS,
+        settings.THUMBNAIL_FALLBACK_VARIANT,
+        settings.THUMBNAIL_QUALITY,
+    )
+
+    def render(data):
+        return lambda: render_thumbnails(BytesIO(data), *options)
+
+    for format_name, width, height, mode in THUMBNAIL_SOURCES:
+        def setup(format_name=format_name, width=width, height=height, mode=mode):
+            return render(build_image(format_name, width, height, mode))
+
+        yield Benchmark(
+            'thumbnails', f'{format_name.lower()}_{width}x{height}', setup,
+            {'format': format_name, 'width': width, 'height': height, 'mode': mode}
+        )
+
+
+# Уведомления
+
+def _notification_fixture():
+    author, reader = (
+        get_user_model().objects.create(username=f'bench_notify_{number}', email=f'bench_notify_{number}@example.com')
+        for number in range(2)
+    )
+    post = Post.objects.create(author=author, title='Замер уведомлений', content='<p>Текст</p>')
+    return author, reader, post
+
+
+def notify_comment():
+    """Уведомление автора поста о комментарии: запись уведомления и outbox."""
+    author, reader, post = _notification_fixture()
+    comment = Comment.objects.create(post=post, author=reader, content='Комментарий')
+    comment = Comment.objects.select_related('post', 'author').get(pk=comment.pk)
+    return lambda: notification_service.notify_comment_on_post(comment)
+
+
+def notify_reply():
+    """Уведомление автора комментария об ответе."""
+    author, reader, post = _notification_fixture()
+    parent = Comment.objects.create(post=post, author=author, content='Комментарий')
+    reply = Comment.objects.create(post=post, author=reader, content='Ответ', parent=parent)
+    reply = Comment.objects.select_related('post', 'author', 'parent').get(pk=reply.pk)
+    return lambda: notification_service.notify_reply_to_comment(reply)
+
+
+def bulk_notify():
+    """Массовая отправка: bulk_notify пачки уведомлений разным пользователям."""
+    author, reader, post = _notification_fixture()
+    notifications = [
+        ((author.pk, reader.pk)[number % 2], 'Новый пост', f'Уведомление {number}')
+        for number in range(NOTIFICATION_BATCH)
+    ]
+    return lambda: notification_service.bulk_notify(notifications)
+
+
+def notification_benchmarks():
+    yield Benchmark('notifications', 'comment_on_post', notify_comment, uses_db=True)
+    yield Benchmark('notifications', 'reply_to_comment', notify_reply, uses_db=True)
+    yield Benchmark(
+        'notifications', f'bulk_notify_{NOTIFICATION_BATCH}', bulk_notify,
+        {'notifications': NOTIFICATION_BATCH}, uses_db=True
+    )
+
+
+BENCHMARK_GROUPS = {
+    'serializers': serializer_benchmarks,
+    'html_validator': html_validator_benchmarks,
+    'comment_tree': comment_tree_benchmarks,
+    'thumbnails': thumbnail_benchmarks,
+    'notifications': notification_benchmarks,
+}
+
+
+def collect_benchmarks(patterns=None):
+    """Замеры, полное имя которых содержит один из patterns (по умолчанию — все)."""
+    for group in BENCHMARK_GROUPS.values():
+        for benchmark in group():
+            if not patterns or any(pattern in benchmark.full_name for pattern in patterns):
+                yield benchmark
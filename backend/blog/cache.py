@@ -0,0 +1,81 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ListingCache:
+    """
+    Кеш ответов лент постов с версионированными ключами.
+
+    Любое изменение постов, комментариев или вложений меняет версию, после чего
+    все ранее сохраненные ответы перестают находиться по ключу и вытесняются по TTL.
+    Версия — момент последнего изменения в наносекундах, поэтому она же
+    служит значением Last-Modified.
+    """
+    version_key = 'blog:listing:version'
+
+    @property
+    def cache(self):
+        return caches[settings.LISTING_CACHE_ALIAS]
+
+    def get_version(self):
+        """Возвращает текущую версию, создавая ее при первом обращении или после вытеснения."""
+        version = self.cache.get(self.version_key)
+        if version is None:
+            version = time.time_ns()
+            if not self.cache.add(self.version_key, version, timeout=None):
+                version = self.cache.get(self.version_key, version)
+        return version
+
+    async def aget_version(self):
+        """get_version для асинхронных представлений."""
+        version = await self.cache.aget(self.version_key)
+        if version is None:
+            version = time.time_ns()
+            if not await self.cache.aadd(self.version_key, version, timeout=None):
+                version = await self.cache.aget(self.version_key, version)
+        return version
+
+    def invalidate(self):
+        """Сбрасывает все закешированные ответы лент."""
+        self.cache.set(self.version_key, time.time_ns(), timeout=None)
+
+    def make_key(self, endpoint, request, version):
+        """Ключ ответа: версия, эндпоинт, хост (в ответе абсолютные URL) и query-параметры с курсором."""
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+        )
+        raw = f'{request.scheme}://{request.get_host()}|{params}'
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return f'blog:listing:{version}:{endpoint}:{digest}'
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    def set(self, key, data, version):
+        """Сохраняет данные ответа вместе с ETag и Last-Modified."""
+        entry = self._make_entry(key, data, version)
+        self.cache.set(key, entry, timeout=settings.LISTING_CACHE_TIMEOUT)
+        return entry
+
+    async def aset(self, key, data, version):
+        entry = self._make_entry(key, data, version)
+        await self.cache.aset(key, entry, timeout=settings.LISTING_CACHE_TIMEOUT)
+        return entry
+
+    @staticmethod
+    def _make_entry(key, data, version):
+        return {
+            'data': data,
+            'etag': f'"{hashlib.md5(key.encode("utf-8")).hexdigest()}"',
+            'last_modified': version // 1_000_000_000,
+        }
+
+listing_cache = ListingCache()
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import string
+import threading
+import time
+import uuid
+from copy import deepcopy
+
+from channels.layers import InMemoryChannelLayer
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Полезная нагрузка NOTIFY в PostgreSQL ограничена 8000 байтами
+MAX_PAYLOAD_SIZE = 8000
+
+
+class PostgresChannelLayer(InMemoryChannelLayer):
+    """
+    Слой каналов для нескольких процессов поверх PostgreSQL LISTEN/NOTIFY.
+
+    Каналы и группы хранятся в памяти процесса, как в InMemoryChannelLayer,
+    а отправка в группу и в канал другого процесса публикуется через NOTIFY.
+    Каждый процесс, у которого есть подключенные консьюмеры, держит одно
+    соединение с LISTEN и раскладывает полученные сообщения по своим
+    локальным каналам, поэтому group_send доходит до сокетов на любом воркере.
+    Процессы, которые только отправляют (HTTP-запросы, команды), слушатель не открывают.
+    """
+
+    def __init__(self, database='default', notify_channel='channels_layer', **kwargs):
+        super().__init__(**kwargs)
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', notify_channel):
+            raise ValueError(f'Недопустимое имя канала NOTIFY: {notify_channel}')
+        self.database = database
+        self.notify_channel = notify_channel
+        # Префикс каналов этого процесса: по нему слушатели отбирают адресованные им сообщения
+        self.process_prefix = uuid.uuid4().hex[:12]
+        self._listener = None
+        self._listener_loop = None
+        self._listener_ready = None
+        self._sender = None
+        self._sender_lock = threading.Lock()
+
+    # Соединения с PostgreSQL
+
+    def _connect(self):
+        wrapper = connections[self.database]
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        connection.autocommit = True
+        return connection
+
+    def _notify(self, payload):
+        """Публикует сообщение (выполняется в пуле потоков, чтобы не блокировать цикл событий)."""
+        with self._sender_lock:
+            for attempt in range(2):
+                if self._sender is None or self._sender.closed:
+                    self._sender = self._connect()
+                try:
+                    with self._sender.cursor() as cursor:
+                        cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, payload])
+                    return
+                except Exception:
+                    # Соединение могло оборваться: переподключаемся один раз
+                    self._sender.close()
+                    self._sender = None
+                    if attempt:
+                        raise
+
+    async def _publish(self, data):
+        payload = json.dumps(data, separators=(',', ':'), default=str)
+        if len(payload.encode('utf-8')) > MAX_PAYLOAD_SIZE:
+            raise ValueError(f'Сообщение больше {MAX_PAYLOAD_SIZE} байт не помещается в NOTIFY')
+        await asyncio.get_running_loop().run_in_executor(None, self._notify, payload)
+
+    async def _ensure_listener(self):
+        """Открывает соединение с LISTEN в текущем цикле событий (заново — после обрыва)."""
+        loop = asyncio.get_running_loop()
+        if self._listener_loop is not loop:
+            self._stop_listener()
+            self._listener_loop = loop
+        if self._listener_ready is None:
+            self._listener_ready = loop.create_task(self._start_listener(loop))
+        await self._listener_ready
+
+    async def _start_listener(self, loop):
+        connection = None
+        try:
+            connection = await loop.run_in_executor(None, self._connect)
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.notify_channel}')
+        except Exception:
+            # Следующий receive или group_add попробует подключиться снова
+            if connection is not None:
+                connection.close()
+            self._listener_ready = None
+            raise
+        loop.add_reader(connection.fileno(), self._on_notify, connection)
+        self._listener = connection
+
+    async def _reconnect(self):
+        try:
+            await self._ensure_listener()
+        except Exception:
+            logger.exception('Не удалось заново открыть соединение LISTEN %s', self.notify_channel)
+
+    def _close_listener(self):
+        if self._listener is not None:
+            self._listener_loop.remove_reader(self._listener.fileno())
+            self._listener.close()
+        self._listener = None
+        self._listener_ready = None
+
+    def _stop_listener(self):
+        self._close_listener()
+        self._listener_loop = None
+
+    def _on_notify(self, connection):
+        try:
+            connection.poll()
+        except Exception:
+            # Рестарт сервера, таймаут простоя, сетевой сбой: без нового соединения
+            # сообщения в этот процесс перестали бы приходить
+            logger.exception('Соединение LISTEN %s оборвалось', self.notify_channel)
+            self._close_listener()
+            # Уже ожидающие receive сами слушатель не откроют: переподключаемся сразу
+            self._listener_loop.create_task(self._reconnect())
+            return
+        while connection.notifies:
+            payload = connection.notifies.pop(0).payload
+            try:
+                self._dispatch(json.loads(payload))
+            except (ValueError, TypeError, KeyError):
+                logger.warning('Пропущено некорректное сообщение NOTIFY: %.200s', payload)
+
+    def _dispatch(self, data):
+        """Раскладывает опубликованное сообщение по локальным каналам процесса."""
+        if 'group' in data:
+            for channel in list(self.groups.get(data['group'], {})):
+                self._put(channel, data['message'])
+        elif self._is_local(data['channel']):
+            self._put(data['channel'], data['message'])
+
+    def _put(self, channel, message):
+        queue = self.channels.setdefault(channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+        try:
+            queue.put_nowait((time.time() + self.expiry, deepcopy(message)))
+        except asyncio.QueueFull:
+            # Как и в group_send других слоев, переполненный канал пропускает сообщение
+            pass
+
+    def _is_local(self, channel):
+        return channel.startswith(f'specific.{self.process_prefix}!')
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        if self._is_local(channel):
+            await super().send(channel, message)
+        else:
+            await self._publish({'channel': channel, 'message': message})
+
+    async def receive(self, channel):
+        await self._ensure_listener()
+        return await super().receive(channel)
+
+    async def new_channel(self, prefix='specific.'):
+        return 'specific.%s!%s' % (
+            self.process_prefix,
+            ''.join(random.choice(string.ascii_letters) for _ in range(12)),
+        )
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        await self._ensure_listener()
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        await self._publish({'group': group, 'message': message})
+
+    async def close(self):
+        self._stop_listener()
+        with self._sender_lock:
+            if self._sender is not None:
+                self._sender.close()
+                self._sender = None
+
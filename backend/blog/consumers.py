@@ -1,16 +1,17 @@
+import asyncio
 import json
 import uuid
 from datetime import datetime
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from jwt import decode as jwt_decode
-from django.conf import settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
 
-User = get_user_model()
+from auth_app.authentication import jwt_authentication
+
+from .notification_service import notification_service
+from .outbox_service import outbox_dispatcher
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -36,12 +37,16 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             )
 
             await self.accept()
+            # Уведомления из outbox отправляются в цикле событий, где подключены сокеты
+            outbox_dispatcher.attach_loop(asyncio.get_running_loop())
 
             await self.send(text_data=json.dumps({
                 'type': 'connection_established',
                 'message': f'Подключен как {user.username}',
-                'user_id': user.id
+                'user_id': user.id,
+                'unread_count': await self.get_unread_count()
             }))
+            await self.replay_missed_notifications()
 
         except Exception as e:
             print(f"WebSocket connection error: {str(e)}")
@@ -59,13 +64,71 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         """Получение сообщения от клиента."""
         try:
             data = json.loads(text_data)
-            # Можно добавить обработку команд от клиента
-            # Например, запрос на получение непрочитанных уведомлений
-            if data.get('action') == 'get_unread_count':
-                # Здесь можно добавить логику получения количества непрочитанных уведомлений
-                pass
         except json.JSONDecodeError:
-            pass
+            return
+        if not isinstance(data, dict):
+            await self.send_error('Ожидается JSON-объект')
+            return
+
+        # Можно добавить обработку команд от клиента
+        # Например, запрос на получение непрочитанных уведомлений
+        if data.get('action') == 'get_unread_count':
+            await self.send_unread_count()
+        elif data.get('action') == 'mark_read':
+            ids, up_to_id = data.get('ids'), data.get('up_to_id')
+            if ids is not None and not (isinstance(ids, list) and all(map(self.is_int, ids))):
+                await self.send_error('ids должен быть списком целых чисел', action='mark_read')
+                return
+            if up_to_id is not None and not self.is_int(up_to_id):
+                await self.send_error('up_to_id должен быть целым числом', action='mark_read')
+                return
+            await self.mark_read(ids, up_to_id)
+            await self.send_unread_count()
+
+    @staticmethod
+    def is_int(value):
+        # bool — подкласс int, но id уведомления не бывает true/false
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    async def send_error(self, message, action=None):
+        """Сообщает клиенту о некорректной команде, не закрывая соединение."""
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'action': action,
+            'message': message
+        }))
+
+    async def send_unread_count(self):
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count',
+            'count': await self.get_unread_count()
+        }))
+
+    async def replay_missed_notifications(self):
+        """Отправляет непрочитанные уведомления, пришедшие после last_id, который передал клиент."""
+        try:
+            last_id = int(self.get_query_param('last_id'))
+        except (TypeError, ValueError):
+            return
+
+        notifications = await database_sync_to_async(notification_service.get_missed_notifications)(
+            self.user.id, last_id
+        )
+        if notifications:
+            await self.send(text_data=json.dumps({
+                'type': 'notifications_replay',
+                'notifications': notifications
+            }))
+            # Клиент увеличивает счетчик на каждое уведомление — присылаем точное значение
+            await self.send_unread_count()
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        return notification_service.get_unread_count(self.user.id)
+
+    @database_sync_to_async
+    def mark_read(self, ids, up_to_id):
+        return notification_service.mark_read(self.user.id, ids=ids, up_to_id=up_to_id)
 
     async def notification_message(self, event):
         """Отправка уведомления клиенту."""
@@ -88,37 +151,17 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 pass
 
         # Если не нашли в заголовках, пробуем query параметры
-        query_string = self.scope['query_string'].decode('utf-8')
-        if 'token=' in query_string:
-            try:
-                token = query_string.split('token=')[1].split('&')[0]
-                return token
-            except IndexError:
-                pass
+        return self.get_query_param('token')
 
-        return None
+    def get_query_param(self, name):
+        """Возвращает значение параметра из query string подключения."""
+        values = parse_qs(self.scope['query_string'].decode('utf-8')).get(name)
+        return values[0] if values else None
 
     @database_sync_to_async
     def get_user_from_token(self, token):
-        """Получает пользователя по JWT токену."""
+        """Получает пользователя по JWT токену: одно декодирование, пользователь из кеша."""
         try:
-            # Проверяем токен
-            UntypedToken(token)
-
-            # Декодируем токен
-            decoded_data = jwt_decode(
-                token,
-                settings.SECRET_KEY,
-                algorithms=["HS256"]
-            )
-
-            # Получаем пользователя
-            user_id = decoded_data.get('user_id')
-            if user_id:
-                user = User.objects.get(id=user_id)
-                return user
-
-        except (InvalidToken, TokenError, User.DoesNotExist, KeyError):
-            pass
-
-        return AnonymousUser()
\ No newline at end of file
+            return jwt_authentication.authenticate_token(token)
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return AnonymousUser()
@@ -0,0 +1,164 @@
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Prefetch
+
+from .models import Comment
+
+
+class PostExportService:
+    """
+    Потоковая выгрузка постов с обсуждениями в NDJSON.
+
+    Каждая строка — объект с полем type: post (с метаданными вложений),
+    за которым следуют comment всех его веток. Посты и комментарии читаются
+    двумя курсорами (.iterator с chunk_size: на PostgreSQL — серверные
+    курсоры), упорядоченными по посту, и сливаются на лету, поэтому память
+    не зависит от объема выгрузки. Вложения подгружаются на каждую пачку
+    в списки (to_attr), без создания queryset на каждую запись.
+
+    Комментарии идут по таблице замыканий: ветка за веткой, внутри ветки
+    по глубине, так что родитель всегда выгружается раньше ответов и строки
+    comment одного поста можно снова загрузить через import_comments
+    в плоском формате (id/parent).
+    """
+
+    # Размер буфера, который отдается клиенту или сжимается за раз
+    buffer_size = 64 * 1024
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    def iter_records(self, posts):
+        """Генератор словарей-записей для постов queryset и их комментариев."""
+        comments = Comment.objects.filter(
+            post__in=posts.values('pk'),
+            descendants__ancestor__parent__isnull=True
+        ).annotate(
+            thread_root=F('descendants__ancestor_id'),
+            thread_depth=F('descendants__depth')
+        ).select_related('author').prefetch_related(
+            Prefetch('attachments', to_attr='attachment_list')
+        ).order_by('post_id', 'thread_root', 'thread_depth', 'created_at', 'id')
+        posts = posts.select_related('author').prefetch_related(
+            Prefetch('attachments', to_attr='attachment_list')
+        ).order_by('pk')
+
+        comment_iterator = comments.iterator(chunk_size=self.chunk_size)
+        comment = next(comment_iterator, None)
+        for post in posts.iterator(chunk_size=self.chunk_size):
+            yield self._post_record(post)
+            while comment is not None and comment.post_id == post.pk:
+                yield self._comment_record(comment)
+                comment = next(comment_iterator, None)
+
+    def iter_ndjson(self, posts, compress=False):
+        """Генератор байтовых фрагментов NDJSON (при compress — в формате gzip)."""
+        chunks = self._iter_lines(posts)
+        if compress:
+            chunks = self._gzip(chunks)
+        return chunks
+
+    async def aiter_ndjson(self, posts, compress=False):
+        """
+        iter_ndjson для ASGI: асинхронный итератор, который получает фрагменты по одному.
+
+        Синхронный StreamingHttpResponse под ASGI Django читает целиком
+        (sync_to_async(list)), и вся выгрузка оказывается в памяти. Здесь каждый
+        фрагмент запрашивается у генератора отдельным вызовом в том же потоке,
+        что и представление, — курсоры БД остаются в своем подключении.
+        """
+        chunks = self.iter_ndjson(posts, compress=compress)
+        next_chunk = sync_to_async(next, thread_sensitive=True)
+        try:
+            while True:
+                chunk = await next_chunk(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # Клиент мог отключиться: закрываем генератор, чтобы освободить курсоры
+            await sync_to_async(chunks.close, thread_sensitive=True)()
+
+    def _iter_lines(self, posts):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        buffer = []
+        size = 0
+        for record in self.iter_records(posts):
+            line = (encoder.encode(record) + '\n').encode('utf-8')
+            buffer.append(line)
+            size += len(line)
+            if size >= self.buffer_size:
+                yield b''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield b''.join(buffer)
+
+    @staticmethod
+    def _gzip(chunks):
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    # Записи
+
+    def _post_record(self, post):
+        return {
+            'type': 'post',
+            'id': post.pk,
+            'author': post.author_id,
+            'author_username': post.author.username,
+            'title': post.title,
+            'content': post.content,
+            'is_published': post.is_published,
+            'comments_count': post.comments_count,
+            'created_at': post.created_at,
+            'updated_at': post.updated_at,
+            'attachments': [
+                self._attachment_record(attachment, attachment.file, file_type=attachment.file_type)
+                for attachment in post.attachment_list
+            ],
+        }
+
+    def _comment_record(self, comment):
+        return {
+            'type': 'comment',
+            'id': comment.pk,
+            'post': comment.post_id,
+            'parent': comment.parent_id,
+            'depth': comment.thread_depth,
+            'author': comment.author_id,
+            'author_username': comment.author.username,
+            # Текст удаленного комментария не выгружается
+            'content': '' if comment.is_deleted else comment.content,
+            'is_deleted': comment.is_deleted,
+            'replies_count': comment.replies_count,
+            'created_at': comment.created_at,
+            'updated_at': comment.updated_at,
+            'attachments': [
+                self._attachment_record(attachment, attachment.image)
+                for attachment in comment.attachment_list
+            ],
+        }
+
+    @staticmethod
+    def _attachment_record(attachment, source, **extra):
+        """Метаданные вложения без обращения к хранилищу файлов."""
+        return {
+            'id': attachment.pk,
+            'name': source.name,
+            **extra,
+            'thumbnail': attachment.thumbnail.name or None,
+            'thumbnail_status': attachment.thumbnail_status,
+            'thumbnail_variants': attachment.thumbnail_variants,
+            'uploaded_at': attachment.uploaded_at,
+        }
+
+
+post_export_service = PostExportService()
@@ -0,0 +1,281 @@
+"""
+Быстрые read-only сериализаторы для списков.
+
+Выдают те же данные, что PostSerializer, CommentSerializer и сериализаторы
+вложений (с учетом ?fields= и ?expand=), но без механики полей DRF:
+для каждого выбранного поля один раз собирается функция доступа, и запись
+превращается в словарь одним проходом по этим функциям. Абсолютная база
+URL медиафайлов и часовой пояс дат вычисляются один раз на запрос.
+"""
+from operator import attrgetter
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework.fields import DateTimeField
+from rest_framework.settings import ISO_8601, api_settings
+
+from .fieldsets import FieldSelection
+from .metrics import timed
+from .querysets import comment_queryset
+from .serializers import (
+    CommentAttachmentSerializer, CommentSerializer, PostAttachmentSerializer, PostSerializer
+)
+
+
+def prefetched(instance, name):
+    """
+    Записи связи из кеша prefetch_related без создания менеджера и queryset
+    на каждый объект; без prefetch — обычный запрос.
+    """
+    cache = getattr(instance, '_prefetched_objects_cache', {})
+    if name in cache:
+        return cache[name]
+    return getattr(instance, name).all()
+
+
+class DateTimeFormatter:
+    """Дата в формате DateTimeField DRF с часовым поясом, определенным один раз."""
+
+    def __init__(self):
+        self.field = DateTimeField()
+        self.timezone = self.field.default_timezone()
+        self.iso = api_settings.DATETIME_FORMAT is not None and api_settings.DATETIME_FORMAT.lower() == ISO_8601
+
+    def __call__(self, value):
+        if not value:
+            return None
+        if not self.iso or self.timezone is None or value.tzinfo is None:
+            return self.field.to_representation(value)
+        value = value.astimezone(self.timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+
+class MediaURLBuilder:
+    """
+    URL файлов как request.build_absolute_uri(file.url).
+
+    Для локального хранилища абсолютная база MEDIA_URL вычисляется один раз,
+    и URL файла получается конкатенацией; для остальных хранилищ URL строит
+    само хранилище.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._bases = {}
+
+    def __call__(self, storage, name):
+        base = self._get_base(storage)
+        path = filepath_to_uri(name).lstrip('/')
+        # Сегменты . и .. хранилище нормализует через urljoin: такие имена отдаем ему
+        if base is None or '/.' in '/' + path:
+            url = storage.url(name)
+            return self.request.build_absolute_uri(url) if self.request else url
+        return base + path
+
+    def _get_base(self, storage):
+        key = id(storage)
+        if key not in self._bases:
+            base = None
+            if isinstance(storage, FileSystemStorage):
+                base = storage.base_url
+                if self.request is not None:
+                    base = self.request.build_absolute_uri(base)
+            self._bases[key] = base
+        return self._bases[key]
+
+
+class FastReadSerializer:
+    """
+    Базовый быстрый сериализатор с интерфейсом сериализатора DRF для чтения
+    (instance, many, context, selection и свойство data).
+
+    Наследник задает serializer_class (порядок полей и expandable_fields
+    берутся из него) и get_accessors() — функции доступа к полям.
+    """
+    serializer_class = None
+
+    def __init__(self, instance=None, many=False, context=None, selection=None, parent=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.request = self.context.get('request')
+        if parent is None:
+            self.dates = DateTimeFormatter()
+            self.urls = MediaURLBuilder(self.request)
+        else:
+            self.dates = parent.dates
+            self.urls = parent.urls
+        self.selection = selection if selection is not None else FieldSelection.from_request(self.request)
+
+        accessors = self.get_accessors()
+        self.accessors = [
+            (name, accessors[name])
+            for name in self.serializer_class.Meta.fields
+            if self.is_selected(name)
+        ]
+
+    def is_selected(self, name):
+        if name in self.serializer_class.expandable_fields:
+            return self.selection.expands(name)
+        return self.selection.includes(name)
+
+    def nested(self, serializer_class, name):
+        """Вложенный сериализатор поля name (создается, только если поле выбрано)."""
+        if not self.is_selected(name):
+            return None
+        return serializer_class(context=self.context, selection=self.selection.nested(name), parent=self)
+
+    def get_accessors(self):
+        raise NotImplementedError
+
+    def to_representation(self, instance):
+        return {name: accessor(instance) for name, accessor in self.accessors}
+
+    def to_representation_many(self, instances):
+        accessors = self.accessors
+        return [{name: accessor(instance) for name, accessor in accessors} for instance in instances]
+
+    @property
+    def data(self):
+        with timed('serialization'):
+            if self.many:
+                return self.to_representation_many(self.instance)
+            return self.to_representation(self.instance)
+
+
+class ThumbnailAccessorsMixin:
+    """Поля thumbnail_url и thumbnail_srcset (см. ThumbnailUrlsMixin)."""
+
+    def get_thumbnail_accessors(self):
+        urls = self.urls
+
+        def thumbnail_url(attachment):
+            thumbnail = attachment.thumbnail
+            return urls(thumbnail.storage, thumbnail.name) if thumbnail else None
+
+        def thumbnail_srcset(attachment):
+            variants = attachment.thumbnail_variants
+            if not variants:
+                return None
+            storage = attachment.thumbnail.storage
+            return ', '.join(
+                f"{urls(storage, variant['name'])} {variant['width']}w"
+                for variant in sorted(variants.values(), key=lambda item: item['width'])
+            ) or None
+
+        return {
+            'thumbnail_url': thumbnail_url,
+            'thumbnail_srcset': thumbnail_srcset,
+            'thumbnail_status': attrgetter('thumbnail_status'),
+        }
+
+
+class PostAttachmentReadSerializer(ThumbnailAccessorsMixin, FastReadSerializer):
+    serializer_class = PostAttachmentSerializer
+
+    def get_accessors(self):
+        urls = self.urls
+        dates = self.dates
+
+        def file_url(attachment):
+            file = attachment.file
+            return urls(file.storage, file.name) if file else None
+
+        return {
+            'id': attrgetter('pk'),
+            'file_type': attrgetter('file_type'),
+            'file_url': file_url,
+            'uploaded_at': lambda attachment: dates(attachment.uploaded_at),
+            **self.get_thumbnail_accessors(),
+        }
+
+
+class CommentAttachmentReadSerializer(ThumbnailAccessorsMixin, FastReadSerializer):
+    serializer_class = CommentAttachmentSerializer
+
+    def get_accessors(self):
+        urls = self.urls
+        dates = self.dates
+
+        def image_url(attachment):
+            image = attachment.image
+            return urls(image.storage, image.name) if image else None
+
+        return {
+            'id': attrgetter('pk'),
+            'image_url': image_url,
+            'uploaded_at': lambda attachment: dates(attachment.uploaded_at),
+            **self.get_thumbnail_accessors(),
+        }
+
+
+class CommentReadSerializer(FastReadSerializer):
+    serializer_class = CommentSerializer
+
+    def get_accessors(self):
+        dates = self.dates
+        accessors = {
+            'id': attrgetter('pk'),
+            'author': lambda comment: str(comment.author),
+            'author_username': lambda comment: comment.author.username,
+            'content': attrgetter('content'),
+            'created_at': lambda comment: dates(comment.created_at),
+            'updated_at': lambda comment: dates(comment.updated_at),
+            'parent': attrgetter('parent_id'),
+            'post': attrgetter('post_id'),
+            'post_title': lambda comment: comment.post.title,
+            'is_deleted': attrgetter('is_deleted'),
+            'replies_count': attrgetter('replies_count'),
+        }
+
+        attachments = self.nested(CommentAttachmentReadSerializer, 'attachments')
+        if attachments is not None:
+            accessors['attachments'] = lambda comment: attachments.to_representation_many(
+                prefetched(comment, 'attachments')
+            )
+
+        replies = self.nested(CommentReadSerializer, 'replies')
+        if replies is not None:
+            def get_replies(comment):
+                items = getattr(comment, 'visible_replies', None)
+                if items is None:
+                    items = comment_queryset(
+                        comment.replies.filter(is_deleted=False), replies.selection
+                    ).order_by('created_at', 'id')
+                return replies.to_representation_many(items)
+
+            accessors['replies'] = get_replies
+        return accessors
+
+
+class PostReadSerializer(FastReadSerializer):
+    serializer_class = PostSerializer
+
+    def get_accessors(self):
+        dates = self.dates
+        accessors = {
+            'id': attrgetter('pk'),
+            'author': lambda post: str(post.author),
+            'author_username': lambda post: post.author.username,
+            'title': attrgetter('title'),
+            'content': attrgetter('content'),
+            'is_published': attrgetter('is_published'),
+            'created_at': lambda post: dates(post.created_at),
+            'updated_at': lambda post: dates(post.updated_at),
+            'comments_count': attrgetter('comments_count'),
+        }
+
+        attachments = self.nested(PostAttachmentReadSerializer, 'attachments')
+        if attachments is not None:
+            accessors['attachments'] = lambda post: attachments.to_representation_many(
+                prefetched(post, 'attachments')
+            )
+
+        comments = self.nested(CommentReadSerializer, 'recent_comments')
+        if comments is not None:
+            accessors['recent_comments'] = lambda post: comments.to_representation_many(
+                getattr(post, 'recent_top_comments', ())
+            )
+        return accessors
@@ -0,0 +1,111 @@
+"""
+Выборочные поля ответа (?fields=) и раскрытие дополнительных полей (?expand=).
+
+fields=id,title,recent_comments.content — вернуть только перечисленные поля;
+поле вложенного сериализатора без уточнения возвращается целиком.
+expand=replies,recent_comments.replies — добавить поля, которые по умолчанию
+не выводятся (expandable_fields сериализатора).
+
+Тот же выбор полей используется при построении queryset (см. querysets.py),
+чтобы не подгружать связи и не выполнять prefetch для невыведенных полей.
+"""
+
+from .metrics import timed
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_tree(value):
+    """Разбирает 'a,b.c,b.d' в дерево {'a': {}, 'b': {'c': {}, 'd': {}}}."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+class FieldSelection:
+    """Выбранные и раскрытые поля сериализатора; fields=None — все поля по умолчанию."""
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields or None
+        self.expand = expand or {}
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None:
+            return cls()
+        params = getattr(request, 'query_params', request.GET)
+        return cls(
+            parse_field_tree(params.get(FIELDS_PARAM, '')),
+            parse_field_tree(params.get(EXPAND_PARAM, ''))
+        )
+
+    def includes(self, name):
+        """Выводится ли поле по умолчанию (не из expandable_fields)."""
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        """Запрошено ли раскрытие поля из expandable_fields."""
+        return name in self.expand
+
+    def nested(self, name):
+        """Выбор полей для вложенного сериализатора поля name."""
+        fields = self.fields.get(name) if self.fields is not None else None
+        return FieldSelection(fields, self.expand.get(name))
+
+    def without_expand(self, name):
+        """Та же выборка без раскрытия поля name (его заполняет вызывающий код)."""
+        expand = {key: value for key, value in self.expand.items() if key != name}
+        return FieldSelection(self.fields, expand)
+
+
+class SparseFieldsetMixin:
+    """
+    Миксин сериализатора: при чтении выводятся только выбранные поля.
+
+    Сериализатор верхнего уровня берет выбор из query-параметров запроса
+    в context, вложенные получают свою часть выбора от родителя (или явно
+    через аргумент selection). Запись данных выбор полей не затрагивает.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, selection=None, **kwargs):
+        self._selection = selection
+        super().__init__(*args, **kwargs)
+
+    @property
+    def selection(self):
+        if self._selection is None:
+            parent = self.parent
+            if parent is not None and getattr(parent, 'many', False):
+                parent = parent.parent
+            if parent is None:
+                self._selection = FieldSelection.from_request(self.context.get('request'))
+            else:
+                self._selection = FieldSelection()
+        return self._selection
+
+    def is_selected(self, name):
+        if name in self.expandable_fields:
+            return self.selection.expands(name)
+        return self.selection.includes(name)
+
+    @property
+    def data(self):
+        # Время сериализации учитывается в метриках запроса (blog.metrics)
+        with timed('serialization'):
+            return super().data
+
+    @property
+    def _readable_fields(self):
+        for name, field in self.fields.items():
+            if field.write_only or not self.is_selected(name):
+                continue
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsetMixin) and nested._selection is None:
+                nested._selection = self.selection.nested(name)
+            yield field
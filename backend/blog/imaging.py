@@ -0,0 +1,78 @@
+"""
+Обработка изображений без зависимостей от Django.
+
+Модуль импортируется в рабочих процессах пула миниатюр, которые запускаются
+методом spawn и не инициализируют Django.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+FALLBACK_FORMAT = 'JPEG'
+
+
+def pick_format(formats):
+    """Возвращает первый из форматов, который умеет сохранять установленная сборка Pillow."""
+    Image.init()
+    for format_name in formats:
+        if format_name.upper() in Image.SAVE:
+            return format_name.upper()
+    return FALLBACK_FORMAT
+
+
+def _encode(img, format_name, quality):
+    if format_name == FALLBACK_FORMAT and img.mode != 'RGB':
+        # JPEG не поддерживает прозрачность: кладем изображение на белый фон
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A') if img.mode == 'RGBA' else None)
+        img = background
+    output = BytesIO()
+    img.save(output, format=format_name, quality=quality)
+    return output.getvalue()
+
+
+def render_thumbnails(source, variants, formats, fallback_variant, quality=80):
+    """
+    Создает все размеры миниатюр за одно декодирование исходного изображения.
+
+    variants — словарь {имя: (ширина, высота)}, размеры ограничивают миниатюру
+    с сохранением пропорций и никогда не увеличивают изображение.
+    Варианты сохраняются в первом доступном формате из formats, вариант
+    fallback_variant дополнительно кодируется в JPEG для клиентов без WebP/AVIF.
+
+    Возвращает {'variants': {имя: (байты, ширина, высота, формат)}, 'fallback': байты}.
+    """
+    format_name = pick_format(formats)
+    # Рамка, вмещающая все варианты (у вариантов могут быть разные пропорции)
+    largest = (max(width for width, _ in variants.values()), max(height for _, height in variants.values()))
+
+    with Image.open(source) as img:
+        if img.format == 'JPEG':
+            # Декодирование сразу с уменьшением в 2/4/8 раз, но не меньше рамки всех вариантов
+            img.draft('RGB', largest)
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+        base = img.convert('RGBA' if has_alpha else 'RGB')
+
+    result = {'variants': {}, 'fallback': None}
+    sizes = set()
+    previous_box, previous = None, base
+    # От большего к меньшему: размер получается из предыдущего варианта, если его рамка
+    # вмещает новую, иначе (другие пропорции) — из исходного изображения
+    for name, size in sorted(variants.items(), key=lambda item: (item[1][0] * item[1][1], item[1]), reverse=True):
+        contained = previous_box is not None and size[0] <= previous_box[0] and size[1] <= previous_box[1]
+        # Предыдущий вариант уже закодирован, его можно уменьшать на месте
+        current = previous if contained else base.copy()
+        current.thumbnail(size, Image.LANCZOS)
+        # Небольшое изображение не увеличивается, одинаковые варианты не дублируем
+        if current.size not in sizes:
+            result['variants'][name] = (
+                _encode(current, format_name, quality),
+                current.width,
+                current.height,
+                format_name.lower()
+            )
+            sizes.add(current.size)
+        if name == fallback_variant:
+            result['fallback'] = _encode(current, FALLBACK_FORMAT, quality)
+        previous_box, previous = size, current
+    return result
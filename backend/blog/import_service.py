@@ -0,0 +1,296 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import listing_cache
+from .models import Comment, CommentTree, Post
+from .notification_service import notification_service
+from .validators import HTMLValidator
+
+
+def parse_ndjson(lines):
+    """Разбирает NDJSON (по объекту JSON в строке), пустые строки пропускаются."""
+    items = []
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            raise ValidationError(f'Строка {number}: некорректный JSON ({e}).')
+    return items
+
+
+class CommentImportService:
+    """
+    Массовый импорт дерева комментариев поста.
+
+    Комментарии передаются деревом (вложенные списки replies) или плоским
+    списком, где parent ссылается на id одного из предыдущих элементов.
+    Комментарии вставляются bulk_create пачками по уровням дерева (родитель
+    получает id раньше ответов), строки таблицы замыканий вычисляются в
+    памяти и тоже вставляются пачками, счетчики обновляются одним UPDATE.
+    Comment.save и сигналы не вызываются, поэтому уведомления создаются
+    пакетно (или не создаются при notify=False).
+    """
+
+    html_validator = HTMLValidator()
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.COMMENT_IMPORT_CHUNK_SIZE
+
+    def import_comments(self, post, items, default_author_id, parent=None, notify=True):
+        """
+        Импортирует комментарии в пост (или ответами на комментарий parent этого поста).
+
+        Возвращает {'comments': число комментариев, 'tree_rows': число строк CommentTree}.
+        Ошибки входных данных — django.core.exceptions.ValidationError.
+        """
+        if parent is not None and parent.post_id != post.pk:
+            raise ValidationError('Родительский комментарий относится к другому посту.')
+        return self._import([(post, items, default_author_id)], parent, notify)
+
+    def import_threads(self, threads, notify=True):
+        """
+        Импортирует комментарии нескольких постов одной транзакцией.
+
+        threads — список (post, items, default_author_id); комментарии всех
+        постов вставляются общими пачками, поэтому импорт множества небольших
+        обсуждений (например, в seed_blog) не упирается в запросы на каждый пост.
+        Возвращает то же, что import_comments, суммарно по всем постам.
+        """
+        return self._import(threads, None, notify)
+
+    def _import(self, threads, parent, notify):
+        comments, parents, depths = [], [], []
+        # Границы комментариев каждого поста в общих списках
+        ranges = []
+        for post, items, default_author_id in threads:
+            post_comments, post_parents, post_depths = self._build_comments(post, items, default_author_id)
+            offset = len(comments)
+            comments.extend(post_comments)
+            parents.extend(index if index is None else index + offset for index in post_parents)
+            depths.extend(post_depths)
+            ranges.append((post, offset, len(comments)))
+        if not comments:
+            return {'comments': 0, 'tree_rows': 0}
+        self._check_authors(comments)
+
+        with transaction.atomic():
+            self._insert_comments(comments, parents, depths, parent)
+            tree_rows = self._insert_tree_paths(comments, parents, parent)
+            for post, start, end in ranges:
+                if start == end:
+                    continue
+                post_comments = comments[start:end]
+                post_parents = [index if index is None else index - start for index in parents[start:end]]
+                self._update_counters(post, post_comments, post_parents, parent)
+                if notify:
+                    self._notify(post, post_comments, post_parents, parent)
+            transaction.on_commit(listing_cache.invalidate)
+
+        return {'comments': len(comments), 'tree_rows': tree_rows}
+
+    # Разбор входных данных
+
+    def _build_comments(self, post, items, default_author_id):
+        """
+        Превращает дерево или плоский список в список несохраненных Comment
+        с индексами родителей и глубиной (родитель всегда раньше ответа).
+        """
+        if isinstance(items, dict):
+            items = items.get('comments')
+        if not isinstance(items, list):
+            raise ValidationError('Ожидается список комментариев.')
+
+        now = timezone.now()
+        comments, parents, depths = [], [], []
+        external_ids = {}
+        # Обход в глубину без рекурсии: глубина дерева ограничена только памятью
+        stack = [(item, None, f'[{number}]') for number, item in reversed(list(enumerate(items)))]
+        while stack:
+            item, parent_index, path = stack.pop()
+            if not isinstance(item, dict):
+                raise ValidationError(f'{path}: ожидается объект комментария.')
+
+            if parent_index is None and item.get('parent') is not None:
+                try:
+                    parent_index = external_ids[item['parent']]
+                except (KeyError, TypeError):
+                    raise ValidationError(
+                        f'{path}: родитель {item["parent"]!r} не найден среди предыдущих комментариев.'
+                    )
+
+            index = len(comments)
+            comments.append(self._build_comment(post, item, path, default_author_id, now))
+            parents.append(parent_index)
+            depths.append(0 if parent_index is None else depths[parent_index] + 1)
+
+            if item.get('id') is not None:
+                if item['id'] in external_ids:
+                    raise ValidationError(f'{path}: повторяющийся id {item["id"]!r}.')
+                external_ids[item['id']] = index
+
+            replies = item.get('replies') or []
+            if not isinstance(replies, list):
+                raise ValidationError(f'{path}.replies: ожидается список комментариев.')
+            stack.extend(
+                (reply, index, f'{path}.replies[{number}]')
+                for number, reply in reversed(list(enumerate(replies)))
+            )
+
+        for index, parent_index in enumerate(parents):
+            if parent_index is not None and not comments[index].is_deleted:
+                comments[parent_index].replies_count += 1
+        return comments, parents, depths
+
+    def _build_comment(self, post, item, path, default_author_id, now):
+        is_deleted = bool(item.get('is_deleted', False))
+        content = item.get('content')
+        if is_deleted and content in (None, ''):
+            # Выгрузка не содержит текста удаленных комментариев
+            content = ''
+        elif not isinstance(content, str) or not content.strip():
+            raise ValidationError(f'{path}.content: текст комментария не может быть пустым.')
+        else:
+            try:
+                content = self.html_validator.clean(content.strip())
+            except ValidationError as e:
+                raise ValidationError(f'{path}.content: {" ".join(e.messages)}')
+
+        created_at = now
+        if item.get('created_at') is not None:
+            created_at = parse_datetime(str(item['created_at']))
+            if created_at is None:
+                raise ValidationError(f'{path}.created_at: некорректная дата {item["created_at"]!r}.')
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+
+        author_id = item.get('author', default_author_id)
+        if not isinstance(author_id, int) or isinstance(author_id, bool):
+            raise ValidationError(f'{path}.author: ожидается id пользователя.')
+
+        return Comment(
+            post_id=post.pk,
+            author_id=author_id,
+            content=content,
+            created_at=created_at,
+            is_deleted=is_deleted,
+            replies_count=0
+        )
+
+    def _check_authors(self, comments):
+        author_ids = {comment.author_id for comment in comments}
+        found = set(get_user_model().objects.filter(pk__in=author_ids).values_list('pk', flat=True))
+        missing = sorted(author_ids - found)
+        if missing:
+            raise ValidationError(f'Пользователи не найдены: {", ".join(map(str, missing))}.')
+
+    # Запись
+
+    def _insert_comments(self, comments, parents, depths, parent):
+        """Вставляет комментарии по уровням: id родителей известны до вставки ответов."""
+        levels = {}
+        for index, depth in enumerate(depths):
+            levels.setdefault(depth, []).append(index)
+
+        for depth in sorted(levels):
+            level = []
+            for index in levels[depth]:
+                comment = comments[index]
+                parent_index = parents[index]
+                if parent_index is not None:
+                    comment.parent_id = comments[parent_index].pk
+                elif parent is not None:
+                    comment.parent_id = parent.pk
+                level.append(comment)
+            Comment.objects.bulk_create(level, batch_size=self.chunk_size)
+
+    def _insert_tree_paths(self, comments, parents, parent):
+        """
+        Строит строки таблицы замыканий в памяти и вставляет их пачками
+        через executemany: строк в разы больше, чем комментариев, и создание
+        моделей CommentTree заняло бы большую часть времени импорта.
+        """
+        base_paths = []
+        if parent is not None:
+            base_paths = list(CommentTree.objects.filter(
+                comment_id=parent.pk
+            ).values_list('ancestor_id', 'depth'))
+
+        sql = (
+            f'INSERT INTO {CommentTree._meta.db_table} (comment_id, ancestor_id, depth) '
+            f'VALUES (%s, %s, %s)'
+        )
+        paths = []
+        batch = []
+        inserted = 0
+        with connection.cursor() as cursor:
+            for index, comment in enumerate(comments):
+                parent_index = parents[index]
+                inherited = base_paths if parent_index is None else paths[parent_index]
+                comment_paths = [(comment.pk, 0)] + [
+                    (ancestor_id, depth + 1) for ancestor_id, depth in inherited
+                ]
+                paths.append(comment_paths)
+                batch.extend((comment.pk, ancestor_id, depth) for ancestor_id, depth in comment_paths)
+                if len(batch) >= self.chunk_size:
+                    cursor.executemany(sql, batch)
+                    inserted += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+        return inserted
+
+    def _update_counters(self, post, comments, parents, parent):
+        visible = sum(1 for comment in comments if not comment.is_deleted)
+        if visible:
+            Post.objects.filter(pk=post.pk).update(comments_count=F('comments_count') + visible)
+
+        if parent is not None:
+            roots = sum(
+                1 for comment, parent_index in zip(comments, parents)
+                if parent_index is None and not comment.is_deleted
+            )
+            if roots:
+                Comment.objects.filter(pk=parent.pk).update(replies_count=F('replies_count') + roots)
+
+    def _notify(self, post, comments, parents, parent):
+        """Те же уведомления, что и при создании комментария через API, одним пакетом."""
+        usernames = dict(get_user_model().objects.filter(
+            pk__in={comment.author_id for comment in comments}
+        ).values_list('pk', 'username'))
+
+        notifications = []
+        for comment, parent_index in zip(comments, parents):
+            if comment.is_deleted:
+                continue
+            if parent_index is not None:
+                recipient_id = comments[parent_index].author_id
+            elif parent is not None:
+                recipient_id = parent.author_id
+            else:
+                recipient_id = post.author_id
+            if recipient_id == comment.author_id:
+                continue
+            title, message = notification_service.comment_notification_text(
+                usernames[comment.author_id],
+                post.title,
+                is_reply=parent_index is not None or parent is not None
+            )
+            notifications.append((recipient_id, title, message))
+
+        notification_service.bulk_notify(notifications, chunk_size=self.chunk_size)
+
+
+comment_import_service = CommentImportService()
@@ -0,0 +1,511 @@
+"""
+Нагрузочный тест приложения ASGI (backend.asgi:application).
+
+Виртуальные пользователи в одном цикле событий повторяют вызовы клиента
+Angular в заданной пропорции (SCENARIOS, DEFAULT_MIX): лента постов,
+комментарии верхнего уровня, ответы на комментарий, создание комментария
+с вложением и подключение к WebSocket уведомлений (детальный просмотр
+поста и ветка комментариев — только при явном весе в mix). Каждый пользователь
+ждет ответа перед следующим вызовом (замкнутая нагрузка), поэтому
+задержка включает очередь в приложении.
+
+Транспорт — приложение в том же процессе (ASGITransport) или HTTP/1.1 и
+WebSocket через сокет запущенного сервера Daphne/uvicorn (SocketTransport).
+Запуск и проверка бюджетов задержки — команда loadtest.
+"""
+import asyncio
+import base64
+import os
+import random
+import struct
+import time
+import uuid
+from collections import Counter
+from io import BytesIO
+from itertools import accumulate
+from urllib.parse import urlsplit
+
+from channels.testing import WebsocketCommunicator
+from PIL import Image
+
+SCENARIOS = {}
+
+# Доли вызовов по умолчанию: в основном чтение ленты и веток комментариев
+DEFAULT_MIX = {
+    'post-list': 40,
+    'post-top-comments': 25,
+    'comment-replies': 20,
+    'comment-create': 5,
+    'ws-connect': 10,
+    # Остальные эндпоинты чтения включаются через --mix (например, bench_async_views)
+    'post-detail': 0,
+    'comment-thread': 0,
+}
+
+PERCENTILES = (50, 95, 99)
+
+HOST = 'localhost'
+
+
+def scenario(name):
+    """Регистрирует сценарий: async-функция (client, user) -> код ответа."""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentile(values, percent):
+    """Перцентиль отсортированного списка (ближайший ранг)."""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_image(width=640, height=480):
+    """Небольшой JPEG для вложений комментариев."""
+    output = BytesIO()
+    Image.linear_gradient('L').resize((width, height)).convert('RGB').save(output, 'JPEG', quality=85)
+    return output.getvalue()
+
+
+def encode_multipart(fields, files):
+    """Тело multipart/form-data: fields — {имя: значение}, files — [(поле, имя файла, тип, байты)]."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for field, filename, content_type, content in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+class Dataset:
+    """Данные из заполненной базы, с которыми работают сценарии."""
+
+    def __init__(self, post_ids, comments, tokens, image, attachment_ratio):
+        self.post_ids = post_ids
+        # Пары (id комментария с ответами, id его поста)
+        self.comments = comments
+        self.tokens = tokens
+        self.image = image
+        self.attachment_ratio = attachment_ratio
+
+
+class VirtualUser:
+    """Пользователь нагрузочного теста: свой токен и генератор случайных чисел."""
+
+    def __init__(self, number, dataset, rng):
+        self.number = number
+        self.dataset = dataset
+        self.rng = rng
+        self.token = dataset.tokens[number % len(dataset.tokens)]
+
+    @property
+    def headers(self):
+        return [(b'authorization', f'Bearer {self.token}'.encode())]
+
+
+@scenario('post-list')
+async def list_posts(client, user):
+    status, _ = await client.request('GET', '/api/posts/', user.headers)
+    return status
+
+
+@scenario('post-top-comments')
+async def top_comments(client, user):
+    post_id = user.rng.choice(user.dataset.post_ids)
+    status, _ = await client.request('GET', f'/api/posts/{post_id}/top-comments/', user.headers)
+    return status
+
+
+@scenario('comment-replies')
+async def comment_replies(client, user):
+    comment_id, _ = user.rng.choice(user.dataset.comments)
+    status, _ = await client.request('GET', f'/api/comments/{comment_id}/replies/?page_size=25', user.headers)
+    return status
+
+
+@scenario('post-detail')
+async def post_detail(client, user):
+    post_id = user.rng.choice(user.dataset.post_ids)
+    status, _ = await client.request('GET', f'/api/posts/{post_id}/', user.headers)
+    return status
+
+
+@scenario('comment-thread')
+async def comment_thread(client, user):
+    comment_id, _ = user.rng.choice(user.dataset.comments)
+    status, _ = await client.request('GET', f'/api/comments/{comment_id}/thread/', user.headers)
+    return status
+
+
+@scenario('comment-create')
+async def create_comment(client, user):
+    """Комментарий или ответ из формы add-comment клиента, иногда с изображением."""
+    rng = user.rng
+    dataset = user.dataset
+    if dataset.comments and rng.random() < 0.5:
+        parent_id, post_id = rng.choice(dataset.comments)
+        fields = {'content': 'Ответ нагрузочного теста', 'post': post_id, 'parent': parent_id}
+    else:
+        fields = {'content': 'Комментарий <strong>нагрузочного теста</strong>', 'post': rng.choice(dataset.post_ids)}
+    files = []
+    if rng.random() < dataset.attachment_ratio:
+        files.append(('attachments', 'photo.jpg', 'image/jpeg', dataset.image))
+    content_type, body = encode_multipart(fields, files)
+    status, _ = await client.request(
+        'POST', '/api/comments/', user.headers + [(b'content-type', content_type.encode())], body
+    )
+    return status
+
+
+@scenario('ws-connect')
+async def connect_websocket(client, user):
+    """Подключение к уведомлениям: успех — получено сообщение connection_established."""
+    message = await client.websocket(f'/ws/notifications/?token={user.token}')
+    return 101 if message and 'connection_established' in message else 403
+
+
+class ASGIClient:
+    """Вызов приложения ASGI в том же процессе, без сети."""
+
+    def __init__(self, application, timeout):
+        self.application = application
+        self.timeout = timeout
+
+    async def request(self, method, path, headers=(), body=b''):
+        path, _, query = path.partition('?')
+        headers = [(b'host', HOST.encode()), (b'content-length', str(len(body)).encode()), *headers]
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': (HOST, 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        done = asyncio.Event()
+        status = None
+        chunks = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Клиент «отключается» только после получения всего ответа
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    done.set()
+
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            done.set()
+        return status, b''.join(chunks)
+
+    async def websocket(self, path):
+        communicator = WebsocketCommunicator(self.application, path)
+        try:
+            connected, _ = await communicator.connect(self.timeout)
+            if not connected:
+                return None
+            return await communicator.receive_from(self.timeout)
+        finally:
+            await communicator.disconnect(timeout=self.timeout)
+
+    async def close(self):
+        pass
+
+
+class SocketClient:
+    """
+    HTTP/1.1 с keep-alive и WebSocket через сокет сервера.
+
+    Минимальная реализация протоколов для нагрузочного теста: ответы с
+    Content-Length, chunked или до закрытия соединения; у WebSocket читается
+    только первое сообщение, после чего соединение закрывается.
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, headers=(), body=b''):
+        reused = self.writer is not None
+        try:
+            return await self._request(method, path, headers, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            if not reused:
+                raise
+            # Сервер мог закрыть простаивающее keep-alive соединение — повторяем на новом
+            return await self._request(method, path, headers, body)
+
+    async def _request(self, method, path, headers, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        head.extend(f'{name.decode()}: {value.decode()}' for name, value in headers)
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status, response_headers = await self._read_head(self.reader)
+        if 'chunked' in response_headers.get('transfer-encoding', ''):
+            content = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            await self.close()
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, content
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if not size:
+                # Пустые трейлеры
+                await self.reader.readuntil(b'\r\n')
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    @staticmethod
+    async def _read_head(reader):
+        lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def websocket(self, path):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            key = base64.b64encode(os.urandom(16)).decode()
+            writer.write((
+                f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                f'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'
+            ).encode())
+            await writer.drain()
+            status, _ = await self._read_head(reader)
+            if status != 101:
+                return None
+            opcode, payload = await self._read_frame(reader)
+            # Закрывающий кадр клиента маскируется, код 1000 — нормальное закрытие
+            mask = os.urandom(4)
+            code = struct.pack('>H', 1000)
+            writer.write(bytes([0x88, 0x80 | len(code)]) + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(code)))
+            await writer.drain()
+            return payload.decode('utf-8') if opcode == 0x1 else None
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_frame(reader):
+        first, second = await reader.readexactly(2)
+        length = second & 0x7f
+        if length == 126:
+            length, = struct.unpack('>H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('>Q', await reader.readexactly(8))
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return first & 0x0f, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class ASGITransport:
+    """Приложение в том же процессе: все пользователи вызывают его напрямую."""
+
+    def __init__(self, application, timeout):
+        self.application = application
+        self.timeout = timeout
+
+    @property
+    def label(self):
+        return 'asgi'
+
+    def client(self):
+        return ASGIClient(self.application, self.timeout)
+
+
+class SocketTransport:
+    """Сервер по адресу url (http://хост:порт): у каждого пользователя свое соединение."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise ValueError(f'Ожидается адрес вида http://127.0.0.1:8000, получено {url}')
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+
+    @property
+    def label(self):
+        return self.url
+
+    def client(self):
+        return SocketClient(self.host, self.port, self.timeout)
+
+
+class RouteStats:
+    """Задержки и коды ответов одного сценария."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = Counter()
+
+    def add(self, latency, status):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        if status is None or isinstance(status, str) or status >= 400:
+            self.errors += 1
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        result = {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0.0,
+            'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        }
+        for percent in PERCENTILES:
+            value = percentile(latencies, percent)
+            result[f'p{percent}_ms'] = round(value * 1000, 2) if value is not None else None
+        result['max_ms'] = round(latencies[-1] * 1000, 2) if latencies else None
+        result['statuses'] = {str(status): number for status, number in sorted(self.statuses.items(), key=str)}
+        return result
+
+
+class LoadTest:
+    """
+    Замкнутая нагрузка: concurrency пользователей выбирают сценарии по весам mix
+    до истечения duration секунд или max_requests вызовов.
+    """
+
+    def __init__(self, transport, dataset, mix, concurrency, duration=None, max_requests=None,
+                 timeout=30.0, think_time=0.0, seed=0):
+        unknown = set(mix) - set(SCENARIOS)
+        if unknown:
+            raise ValueError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+        self.transport = transport
+        self.dataset = dataset
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        if not self.names:
+            raise ValueError('Все веса сценариев равны нулю')
+        self.cum_weights = list(accumulate(mix[name] for name in self.names))
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.think_time = think_time
+        self.seed = seed
+        self.stats = {name: RouteStats() for name in self.names}
+        self.issued = 0
+
+    async def run(self):
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration else None
+        await asyncio.gather(*(
+            self._user(VirtualUser(number, self.dataset, random.Random(f'{self.seed}-{number}')), deadline)
+            for number in range(self.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+        routes = {name: self.stats[name].summary(elapsed) for name in self.names}
+        requests = sum(route['requests'] for route in routes.values())
+        errors = sum(route['errors'] for route in routes.values())
+        return {
+            'transport': self.transport.label,
+            'concurrency': self.concurrency,
+            'elapsed_s': round(elapsed, 2),
+            'requests': requests,
+            'errors': errors,
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'throughput_rps': round(requests / elapsed, 1) if elapsed else None,
+            'routes': routes,
+        }
+
+    def _has_budget(self, deadline):
+        if self.max_requests is not None and self.issued >= self.max_requests:
+            return False
+        return deadline is None or time.perf_counter() < deadline
+
+    async def _user(self, user, deadline):
+        client = self.transport.client()
+        try:
+            while self._has_budget(deadline):
+                self.issued += 1
+                name = user.rng.choices(self.names, cum_weights=self.cum_weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(SCENARIOS[name](client, user), self.timeout)
+                except asyncio.TimeoutError:
+                    status = 'timeout'
+                    # Соединение с незавершенным ответом использовать нельзя
+                    await client.close()
+                except Exception as e:
+                    # Сбой вызова (разрыв соединения, ошибка протокола) считается ошибкой сценария
+                    status = type(e).__name__
+                    await client.close()
+                self.stats[name].add(time.perf_counter() - started, status)
+                if self.think_time:
+                    await asyncio.sleep(user.rng.expovariate(1 / self.think_time))
+        finally:
+            await client.close()
+
+
+def check_budgets(result, budgets, max_error_rate):
+    """
+    Нарушения бюджетов: budgets — {сценарий: {'p50'/'p95'/'p99'/'max': мс}},
+    max_error_rate — допустимая доля ошибок каждого сценария.
+    """
+    violations = []
+    for name, route in result['routes'].items():
+        for key, limit in budgets.get(name, {}).items():
+            value = route.get(f'{key}_ms')
+            if value is not None and value > limit:
+                violations.append(f'{name}: {key} {value} мс > {limit} мс')
+        if max_error_rate is not None and route['error_rate'] > max_error_rate:
+            violations.append(f'{name}: доля ошибок {route["error_rate"]} > {max_error_rate}')
+    return violations
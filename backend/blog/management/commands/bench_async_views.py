@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Только чтение: запись и WebSocket не зависят от ASYNC_READ_VIEWS
+READ_MIX = (
+    'post-list=30,post-detail=20,post-top-comments=20,comment-replies=20,comment-thread=10,'
+    'comment-create=0,ws-connect=0'
+)
+MODES = (('sync', 'False'), ('async', 'True'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение синхронных и асинхронных представлений чтения (ASYNC_READ_VIEWS) под нагрузкой: '
+        'команда loadtest в отдельном процессе (один воркер) для каждого режима и уровня параллельности. '
+        'Емкость — наибольшая параллельность, при которой p95 всех сценариев не превышает --p95-limit'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', default='1,10,50,100', help='Уровни параллельности через запятую'
+        )
+        parser.add_argument('--duration', type=float, default=10, help='Длительность каждого прогона, секунды')
+        parser.add_argument('--mix', default=READ_MIX, help='Веса сценариев для loadtest')
+        parser.add_argument('--p95-limit', type=float, default=250, help='Предел p95 для оценки емкости, мс')
+        parser.add_argument('--user-prefix', default='', help='Префикс имен пользователей (например, seed42_)')
+        parser.add_argument('--output', help='Сохранить результат в JSON-файл')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(value) for value in options['concurrency'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError(f'Некорректный --concurrency: {options["concurrency"]}')
+        if not levels or min(levels) < 1:
+            raise CommandError('--concurrency: ожидаются положительные целые числа')
+
+        result = {'mix': options['mix'], 'duration_s': options['duration'], 'p95_limit_ms': options['p95_limit']}
+        for mode, value in MODES:
+            runs = [self._run(value, concurrency, options) for concurrency in levels]
+            result[mode] = {
+                'runs': runs,
+                'capacity': max(
+                    (run['concurrency'] for run in runs if run['errors'] == 0 and run['p95_ms'] <= options['p95_limit']),
+                    default=0
+                ),
+            }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, indent=2, ensure_ascii=False)
+        self._report(result, options['json'])
+
+    @staticmethod
+    def _run(async_views, concurrency, options):
+        """Прогон loadtest в отдельном процессе с ASYNC_READ_VIEWS=async_views."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'loadtest.json')
+            command = [
+                sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'loadtest',
+                '--concurrency', str(concurrency), '--duration', str(options['duration']),
+                '--mix', options['mix'], '--user-prefix', options['user_prefix'], '--output', path,
+            ]
+            # Нарушение бюджетов loadtest (ненулевой код) здесь не ошибка: результат сохранен в файл
+            process = subprocess.run(
+                command, env={**os.environ, 'ASYNC_READ_VIEWS': async_views}, capture_output=True, text=True
+            )
+            if not os.path.exists(path):
+                raise CommandError(f'loadtest завершился с ошибкой:\n{process.stderr}')
+            with open(path, encoding='utf-8') as file:
+                run = json.load(file)
+
+        routes = run['routes'].values()
+        return {
+            'concurrency': concurrency,
+            'requests': run['requests'],
+            'errors': run['errors'],
+            'throughput_rps': run['throughput_rps'],
+            'p95_ms': max(route['p95_ms'] for route in routes),
+            'p99_ms': max(route['p99_ms'] for route in routes),
+            'routes': run['routes'],
+        }
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(f"Наихудший p95/p99 по сценариям, {result['duration_s']} с на прогон")
+        for sync_run, async_run in zip(result['sync']['runs'], result['async']['runs']):
+            ratio = async_run['throughput_rps'] / sync_run['throughput_rps'] if sync_run['throughput_rps'] else 0
+            self.stdout.write(
+                f"{sync_run['concurrency']} пользователей: "
+                f"sync {sync_run['throughput_rps']}/с p95 {sync_run['p95_ms']} мс p99 {sync_run['p99_ms']} мс "
+                f"ошибок {sync_run['errors']}; "
+                f"async {async_run['throughput_rps']}/с p95 {async_run['p95_ms']} мс p99 {async_run['p99_ms']} мс "
+                f"ошибок {async_run['errors']} (x{ratio:.2f})"
+            )
+        self.stdout.write(
+            f"Емкость (p95 <= {result['p95_limit_ms']} мс): sync {result['sync']['capacity']}, "
+            f"async {result['async']['capacity']} пользователей"
+        )
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import multiprocessing
+import queue
+import statistics
+import time
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def _subscribe(layer, worker, processes, consumers):
+    """Подключает консьюмеры процесса worker: канал на каждого и группа пользователя, как у NotificationConsumer."""
+    channels = []
+    for number in range(worker, consumers, processes):
+        channel = await layer.new_channel()
+        await layer.group_add(f'bench_user_{number}', channel)
+        channels.append(channel)
+    return channels
+
+
+async def _collect(layer, channels, timeout):
+    """Ждет по одному сообщению в каждом канале и возвращает задержки доставки в мс."""
+    async def receive(channel):
+        message = await layer.receive(channel)
+        return (time.time() - message['sent_at']) * 1000
+
+    tasks = [asyncio.ensure_future(receive(channel)) for channel in channels]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    return [task.result() for task in done], time.time()
+
+
+async def _publish(layer, consumers):
+    started = time.time()
+    for number in range(consumers):
+        await layer.group_send(f'bench_user_{number}', {
+            'type': 'notification_message',
+            'sent_at': time.time(),
+        })
+    return started, time.time()
+
+
+def _worker(worker, processes, consumers, timeout, ready, results):
+    """Процесс с консьюмерами (аналог отдельного воркера Daphne)."""
+    import django
+    django.setup()
+
+    async def run():
+        layer = get_channel_layer()
+        channels = await _subscribe(layer, worker, processes, consumers)
+        ready.put(worker)
+        latencies, finished = await _collect(layer, channels, timeout)
+        results.put({'worker': worker, 'expected': len(channels), 'latencies': latencies, 'finished': finished})
+        await layer.close()
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = 'Измерить задержку и пропускную способность доставки уведомлений через слой каналов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumers', type=int, default=10000, help='Количество подключенных консьюмеров')
+        parser.add_argument('--processes', type=int, default=4, help='Количество процессов с консьюмерами')
+        parser.add_argument('--timeout', type=float, default=60, help='Сколько секунд ждать доставки')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        consumers = options['consumers']
+        processes = options['processes']
+        layer = get_channel_layer()
+
+        if type(layer) is InMemoryChannelLayer:
+            # Без общего брокера процессы не видят группы друг друга: меряем внутри одного процесса
+            if processes != 1:
+                self.stderr.write('InMemoryChannelLayer работает только внутри процесса, используется --processes 1')
+            processes = 1
+            result = asyncio.run(self._run_in_process(layer, consumers, options['timeout']))
+        else:
+            result = self._run_multiprocess(consumers, processes, options['timeout'])
+
+        result.update({
+            'backend': f'{type(layer).__module__}.{type(layer).__name__}',
+            'consumers': consumers,
+            'processes': processes,
+        })
+        self._report(result, options['json'])
+
+    async def _run_in_process(self, layer, consumers, timeout):
+        channels = await _subscribe(layer, 0, 1, consumers)
+        collector = asyncio.ensure_future(_collect(layer, channels, timeout))
+        started, published = await _publish(layer, consumers)
+        latencies, finished = await collector
+        return self._summarize(latencies, consumers, started, published, finished)
+
+    def _run_multiprocess(self, consumers, processes, timeout):
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Queue(), context.Queue()
+        workers = [
+            context.Process(target=_worker, args=(number, processes, consumers, timeout, ready, results))
+            for number in range(processes)
+        ]
+        for process in workers:
+            process.start()
+
+        try:
+            for _ in workers:
+                ready.get(timeout=timeout)
+        except queue.Empty:
+            raise CommandError('Процессы с консьюмерами не подключились за отведенное время')
+
+        started, published = asyncio.run(self._publish_and_close(consumers))
+
+        latencies, finished = [], published
+        for _ in workers:
+            try:
+                worker_result = results.get(timeout=timeout + 5)
+            except queue.Empty:
+                break
+            latencies.extend(worker_result['latencies'])
+            finished = max(finished, worker_result['finished'])
+        for process in workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        return self._summarize(latencies, consumers, started, published, finished)
+
+    async def _publish_and_close(self, consumers):
+        layer = get_channel_layer()
+        try:
+            return await _publish(layer, consumers)
+        finally:
+            await layer.close()
+
+    def _summarize(self, latencies, consumers, started, published, finished):
+        latencies = sorted(latencies)
+        elapsed = max(finished - started, 1e-9)
+        return {
+            'delivered': len(latencies),
+            'lost': consumers - len(latencies),
+            'publish_seconds': round(published - started, 3),
+            'total_seconds': round(elapsed, 3),
+            'throughput_per_second': round(len(latencies) / elapsed, 1),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 2) if latencies else None,
+                'p50': _percentile(latencies, 50),
+                'p95': _percentile(latencies, 95),
+                'p99': _percentile(latencies, 99),
+                'max': latencies[-1] if latencies else None,
+            },
+        }
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        latency = result['latency_ms']
+        self.stdout.write(f"Слой каналов: {result['backend']}")
+        self.stdout.write(f"Консьюмеров: {result['consumers']}, процессов: {result['processes']}")
+        self.stdout.write(
+            f"Доставлено: {result['delivered']}, потеряно: {result['lost']}, "
+            f"за {result['total_seconds']} с ({result['throughput_per_second']} сообщений/с)"
+        )
+        if latency['p50'] is not None:
+            self.stdout.write(
+                f"Задержка, мс: p50={latency['p50']:.2f} p95={latency['p95']:.2f} "
+                f"p99={latency['p99']:.2f} max={latency['max']:.2f}"
+            )
+        style = self.style.SUCCESS if not result['lost'] else self.style.WARNING
+        self.stdout.write(style('Замер завершен'))
@@ -0,0 +1,101 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from blog.serializers import PostSerializer
+from blog.validators import HTMLValidator
+
+PARAGRAPH = (
+    'Обычный текст поста с <strong>выделением</strong>, <i>курсивом</i>, '
+    '<code>print("hello")</code> и <a href="https://example.com/docs" title="Документация">ссылкой</a>. '
+)
+
+
+def build_inputs():
+    """Набор входных данных: обычные посты, большие и заведомо неудобные для валидатора."""
+    large = PARAGRAPH * 6000
+    return {
+        'typical_2kb': PARAGRAPH * 12,
+        'large_1mb': large,
+        'many_links_5000': ''.join(
+            f'<a href="https://example.com/{number}" title="Ссылка {number}">#{number}</a> '
+            for number in range(5000)
+        ),
+        'deep_nesting_200': '<i>' * 200 + 'текст' + '</i>' * 200,
+        'deep_nesting_10000': '<i>' * 10000 + 'текст' + '</i>' * 10000,
+        'forbidden_tag_first': '<script>alert(1)</script>' + large,
+        'unclosed_tag_last': large + '<strong>',
+        'plain_text_1mb': 'Просто текст без разметки. ' * 40000,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Измерить пропускную способность HTMLValidator на больших и неудобных входных данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов для каждого входа')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        validator = HTMLValidator()
+        result = {'repeat': repeat, 'inputs': {}}
+
+        for name, value in build_inputs().items():
+            size = len(value.encode('utf-8'))
+            valid = True
+            try:
+                # Прогрев: парсер потока создается при первом вызове
+                validator(value)
+            except ValidationError:
+                pass
+            started = time.perf_counter()
+            for _ in range(repeat):
+                try:
+                    validator(value)
+                except ValidationError:
+                    valid = False
+            elapsed = (time.perf_counter() - started) / repeat
+            result['inputs'][name] = {
+                'bytes': size,
+                'valid': valid,
+                'ms': round(elapsed * 1000, 3),
+                'mb_per_second': round(size / elapsed / 1e6, 1),
+            }
+
+        result['post_write'] = self._measure_post_write(repeat * 200)
+        self._report(result, options['json'])
+
+    def _measure_post_write(self, count):
+        """Валидация данных поста сериализатором (весь путь записи до save)."""
+        user = get_user_model()(pk=1, username='bench', email='bench@example.com')
+        request = APIRequestFactory().post('/api/posts/create/')
+        request.user = user
+        data = {'title': 'Замер', 'content': PARAGRAPH * 12, 'is_published': True}
+
+        PostSerializer(data=data, context={'request': request}).is_valid()
+        started = time.perf_counter()
+        for _ in range(count):
+            serializer = PostSerializer(data=data, context={'request': request})
+            serializer.is_valid(raise_exception=True)
+        elapsed = time.perf_counter() - started
+        return {'writes': count, 'us_per_write': round(elapsed / count * 1e6, 1)}
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"Повторов: {result['repeat']}")
+        for name, stats in result['inputs'].items():
+            verdict = 'валиден' if stats['valid'] else 'отклонен'
+            self.stdout.write(
+                f"{name}: {stats['bytes']} байт, {verdict}, {stats['ms']} мс, {stats['mb_per_second']} МБ/с"
+            )
+        write = result['post_write']
+        self.stdout.write(f"Валидация поста сериализатором: {write['us_per_write']} мкс/запись")
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
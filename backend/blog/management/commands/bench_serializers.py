@@ -0,0 +1,147 @@
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from blog.fast_serializers import CommentReadSerializer, PostReadSerializer
+from blog.models import Comment, CommentAttachment, Post, PostAttachment
+from blog.renderers import ORJSONRenderer
+from blog.serializers import CommentSerializer, PostSerializer
+
+
+def build_posts(count, comments_per_post=3):
+    """
+    Посты в памяти в том виде, в каком их отдает post_list_queryset:
+    с автором, вложениями в кеше prefetch и последними комментариями.
+    """
+    user_model = get_user_model()
+    author = user_model(pk=1, username='author', email='author@example.com')
+    reader = user_model(pk=2, username='reader', email='reader@example.com')
+    now = timezone.now()
+    variants = {
+        'avif': {'name': 'post_thumbnails/thumb_photo_avif.avif', 'width': 300},
+        'webp': {'name': 'post_thumbnails/thumb_photo_webp.webp', 'width': 300},
+    }
+
+    posts = []
+    comment_id = 0
+    for number in range(count):
+        created_at = now - timedelta(minutes=number)
+        post = Post(
+            pk=number + 1, author=author, title=f'Пост {number}',
+            content='<p>Текст поста с <strong>разметкой</strong></p>' * 5,
+            is_published=True, comments_count=comments_per_post, created_at=created_at, updated_at=created_at
+        )
+        post._prefetched_objects_cache = {'attachments': [
+            PostAttachment(
+                pk=number * 2 + 1, post=post, file=f'post_attachments/2026/01/01/photo_{number}.jpg',
+                file_type='image', thumbnail=f'post_thumbnails/thumb_photo_{number}.jpg',
+                thumbnail_status='ready', thumbnail_variants=variants, uploaded_at=created_at
+            ),
+            PostAttachment(
+                pk=number * 2 + 2, post=post, file=f'post_attachments/2026/01/01/notes_{number}.txt',
+                file_type='text', uploaded_at=created_at
+            ),
+        ]}
+
+        comments = []
+        for _ in range(comments_per_post):
+            comment_id += 1
+            comment = Comment(
+                pk=comment_id, author=reader, post=post, content='Комментарий к посту',
+                replies_count=1, created_at=created_at, updated_at=created_at
+            )
+            comment._prefetched_objects_cache = {'attachments': [
+                CommentAttachment(pk=comment_id, comment=comment, image=f'comment_attachments/img_{comment_id}.png',
+                                  uploaded_at=created_at)
+            ]}
+            comments.append(comment)
+        post.recent_top_comments = comments
+        posts.append(post)
+    return posts
+
+
+class Command(BaseCommand):
+    help = 'Сравнить время сериализации списков: ModelSerializer + JSONRenderer и быстрый путь + orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help='Количество постов в замере')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов (берется лучшее время)')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        count = options['posts']
+        posts = build_posts(count)
+        comments = [comment for post in posts for comment in post.recent_top_comments]
+        request = Request(APIRequestFactory().get('/api/posts/', HTTP_HOST='blog.example.com'))
+        context = {'request': request}
+
+        cases = {
+            'posts': (posts, PostSerializer, PostReadSerializer),
+            'comments': (comments, CommentSerializer, CommentReadSerializer),
+        }
+        result = {'posts': count, 'repeat': options['repeat'], 'cases': {}}
+        for name, (items, serializer_class, fast_serializer_class) in cases.items():
+            drf_output = self._render(serializer_class, JSONRenderer(), items, context)
+            fast_output = self._render(fast_serializer_class, ORJSONRenderer(), items, context)
+            if drf_output != fast_output:
+                raise CommandError(f'{name}: вывод быстрого сериализатора отличается от {serializer_class.__name__}')
+
+            drf = self._measure(serializer_class, JSONRenderer(), items, context, options['repeat'])
+            fast = self._measure(fast_serializer_class, ORJSONRenderer(), items, context, options['repeat'])
+            per_thousand = 1000 / len(items)
+            result['cases'][name] = {
+                'items': len(items),
+                'bytes': len(drf_output),
+                'drf': {key: round(value * per_thousand, 2) for key, value in drf.items()},
+                'fast': {key: round(value * per_thousand, 2) for key, value in fast.items()},
+                'speedup': round(drf['total_ms'] / fast['total_ms'], 1),
+            }
+
+        self._report(result, options['json'])
+
+    @staticmethod
+    def _render(serializer_class, renderer, items, context):
+        return renderer.render(serializer_class(items, many=True, context=context).data)
+
+    @staticmethod
+    def _measure(serializer_class, renderer, items, context, repeat):
+        """Лучшее из repeat время сериализации и рендеринга в миллисекундах."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = serializer_class(items, many=True, context=context).data
+            serialized = time.perf_counter()
+            renderer.render(data)
+            rendered = time.perf_counter()
+            timing = {
+                'serialize_ms': (serialized - started) * 1000,
+                'render_ms': (rendered - serialized) * 1000,
+                'total_ms': (rendered - started) * 1000,
+            }
+            if best is None or timing['total_ms'] < best['total_ms']:
+                best = timing
+        return best
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"Постов: {result['posts']}, повторов: {result['repeat']} (время на 1000 записей)")
+        for name, stats in result['cases'].items():
+            self.stdout.write(f"{name}: {stats['items']} записей, {stats['bytes']} байт")
+            for mode in ('drf', 'fast'):
+                timing = stats[mode]
+                self.stdout.write(
+                    f"  {mode}: сериализация {timing['serialize_ms']} мс, "
+                    f"рендеринг {timing['render_ms']} мс, всего {timing['total_ms']} мс"
+                )
+            self.stdout.write(f"  ускорение: x{stats['speedup']}")
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
@@ -0,0 +1,162 @@
+import json
+import platform
+import subprocess
+
+import django
+import PIL
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from blog.benchmarks import collect_benchmarks, compare, run_benchmark
+
+
+def git_commit():
+    """Текущий коммит репозитория (None вне git)."""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'django': django.get_version(),
+        'pillow': PIL.__version__,
+        'database': connection.vendor,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Набор микробенчмарков (сериализаторы, HTMLValidator, таблица замыканий комментариев, '
+        'миниатюры, уведомления) с сохранением в JSON и сравнением с предыдущим результатом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-k', '--filter', action='append', dest='patterns',
+            help='Запускать только замеры, в имени которых есть подстрока (можно указать несколько раз)'
+        )
+        parser.add_argument('--list', action='store_true', help='Показать имена замеров и выйти')
+        parser.add_argument('--rounds', type=int, default=10, help='Количество раундов каждого замера')
+        parser.add_argument(
+            '--min-time', type=float, default=0.05, help='Минимальная длительность раунда, секунды'
+        )
+        parser.add_argument('--output', help='Сохранить результат в JSON-файл')
+        parser.add_argument('--compare', help='JSON-файл предыдущего запуска для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Доля изменения медианы, начиная с которой замер считается регрессией или ускорением'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true', help='Завершиться с ошибкой при регрессиях'
+        )
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help='Замеры с БД в текущей базе (по умолчанию создается тестовая база, как в manage.py test)'
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после замеров')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        benchmarks = list(collect_benchmarks(options['patterns']))
+        if not benchmarks:
+            raise CommandError('Нет замеров, подходящих под --filter')
+        if options['list']:
+            for benchmark in benchmarks:
+                self.stdout.write(benchmark.full_name)
+            return
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Не удалось прочитать {options["compare"]}: {e}')
+            # При --filter сравниваются только выбранные замеры
+            names = {benchmark.full_name for benchmark in benchmarks}
+            baseline['benchmarks'] = {
+                name: value for name, value in baseline['benchmarks'].items()
+                if name in names or not options['patterns']
+            }
+
+        # Замеры с БД идут в пустой тестовой базе: результаты не зависят от данных разработчика
+        test_db = None
+        if any(benchmark.uses_db for benchmark in benchmarks) and not options['current_db']:
+            test_db = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            result = self._run(benchmarks, options)
+        finally:
+            if test_db is not None:
+                connection.creation.destroy_test_db(test_db, verbosity=0, keepdb=options['keepdb'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, indent=2, ensure_ascii=False)
+
+        rows = compare(baseline, result, options['threshold']) if baseline else None
+        self._report(result, rows, options['json'])
+        if rows and options['fail_on_regression']:
+            regressions = [row[0] for row in rows if row[4] == 'regression']
+            if regressions:
+                raise CommandError(f'Регрессии: {", ".join(regressions)}')
+
+    def _run(self, benchmarks, options):
+        result = {
+            'created_at': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'machine': machine_info(),
+            'options': {'rounds': options['rounds'], 'min_time': options['min_time']},
+            'benchmarks': {},
+        }
+        for benchmark in benchmarks:
+            result['benchmarks'][benchmark.full_name] = {
+                'group': benchmark.group,
+                'params': benchmark.params,
+                'stats': run_benchmark(benchmark, options['rounds'], options['min_time']),
+            }
+        return result
+
+    def _report(self, result, rows, as_json):
+        if as_json:
+            output = dict(result)
+            if rows is not None:
+                output['comparison'] = [
+                    {'name': name, 'before': before, 'after': after, 'ratio': ratio, 'status': status}
+                    for name, before, after, ratio, status in rows
+                ]
+            self.stdout.write(json.dumps(output, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(
+            f"Коммит: {result['commit'] or '-'}, Python {result['machine']['python']}, "
+            f"БД {result['machine']['database']} (время одного вызова, медиана ± стандартное отклонение)"
+        )
+        for name, benchmark in result['benchmarks'].items():
+            stats = benchmark['stats']
+            self.stdout.write(
+                f"{name}: {stats['median'] * 1000:.3f} ± {stats['stddev'] * 1000:.3f} мс "
+                f"({stats['rounds']} x {stats['iterations']})"
+            )
+
+        if rows is not None:
+            self.stdout.write('Сравнение медиан с предыдущим запуском:')
+            styles = {'regression': self.style.ERROR, 'improvement': self.style.SUCCESS}
+            for name, before, after, ratio, status in rows:
+                if ratio is None:
+                    line = f'{name}: {status}'
+                else:
+                    line = f'{name}: {before * 1000:.3f} -> {after * 1000:.3f} мс (x{ratio:.2f}) {status}'
+                self.stdout.write(styles.get(status, str)(line))
+        self.stdout.write(self.style.SUCCESS('Замер завершен'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog.outbox_service import outbox_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Отправить уведомления из outbox в слой каналов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь один раз и завершиться'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Пауза между проверками очереди, секунды'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            sent = outbox_dispatcher.drain()
+            self.stdout.write(self.style.SUCCESS(f'Отправлено уведомлений: {sent}'))
+            return
+
+        self.stdout.write('Диспетчер уведомлений запущен')
+        try:
+            while True:
+                sent = outbox_dispatcher.drain()
+                if sent:
+                    self.stdout.write(f'Отправлено уведомлений: {sent}')
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Диспетчер уведомлений остановлен'))
@@ -0,0 +1,52 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.export_service import PostExportService
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить посты с комментариями и метаданными вложений в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post',
+            type=int,
+            action='append',
+            help='ID поста (можно указать несколько раз, по умолчанию все посты)'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для выгрузки ("-" — стандартный вывод); для *.gz включается сжатие'
+        )
+        parser.add_argument('--gzip', action='store_true', help='Сжать выгрузку gzip')
+        parser.add_argument('--chunk-size', type=int, help='Количество строк, читаемых из БД за раз')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['post']:
+            posts = posts.filter(pk__in=options['post'])
+
+        path = options['output']
+        compress = options['gzip'] or path.endswith('.gz')
+        service = PostExportService(chunk_size=options['chunk_size'])
+
+        started = time.perf_counter()
+        written = 0
+        stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        try:
+            for chunk in service.iter_ndjson(posts, compress=compress):
+                stream.write(chunk)
+                written += len(chunk)
+        finally:
+            if stream is sys.stdout.buffer:
+                stream.flush()
+            else:
+                stream.close()
+
+        if path != '-':
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Записано {written} байт в {path} за {elapsed:.2f} с'))
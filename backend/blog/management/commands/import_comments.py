@@ -0,0 +1,83 @@
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.import_service import CommentImportService, parse_ndjson
+from blog.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Импортировать дерево комментариев поста из файла JSON или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post', type=int, help='ID поста')
+        parser.add_argument('path', help='Путь к файлу ("-" — стандартный ввод)')
+        parser.add_argument(
+            '--format',
+            choices=['json', 'ndjson'],
+            help='Формат файла (по умолчанию по расширению, иначе json)'
+        )
+        parser.add_argument(
+            '--author',
+            type=int,
+            help='ID автора для комментариев без поля author (по умолчанию автор поста)'
+        )
+        parser.add_argument('--parent', type=int, help='ID комментария поста, к которому добавляются ответы')
+        parser.add_argument('--no-notify', action='store_true', help='Не создавать уведомления')
+        parser.add_argument('--chunk-size', type=int, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            post = Post.objects.get(pk=options['post'])
+        except Post.DoesNotExist:
+            raise CommandError(f'Пост {options["post"]} не найден')
+
+        parent = None
+        if options['parent']:
+            try:
+                parent = Comment.objects.get(pk=options['parent'], post=post)
+            except Comment.DoesNotExist:
+                raise CommandError(f'Комментарий {options["parent"]} поста {post.pk} не найден')
+
+        author_id = options['author'] or post.author_id
+        if not get_user_model().objects.filter(pk=author_id).exists():
+            raise CommandError(f'Пользователь {author_id} не найден')
+
+        started = time.perf_counter()
+        try:
+            items = self._read(options['path'], options['format'])
+            result = CommentImportService(chunk_size=options['chunk_size']).import_comments(
+                post,
+                items,
+                default_author_id=author_id,
+                parent=parent,
+                notify=not options['no_notify']
+            )
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'Строк в таблице замыканий: {result["tree_rows"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано комментариев: {result["comments"]} за {elapsed:.2f} с'
+        ))
+
+    def _read(self, path, format_name):
+        if format_name is None:
+            format_name = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'json'
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            if format_name == 'ndjson':
+                return parse_ndjson(stream)
+            try:
+                return json.load(stream)
+            except ValueError as e:
+                raise ValidationError(f'Некорректный JSON: {e}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
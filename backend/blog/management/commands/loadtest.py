@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from blog.loadtest import (
+    DEFAULT_MIX, PERCENTILES, SCENARIOS, ASGITransport, Dataset, LoadTest, SocketTransport,
+    build_image, check_budgets
+)
+from blog.models import Comment, Post
+
+
+def parse_mix(value):
+    """Веса сценариев из строки 'post-list=40,ws-connect=0' поверх DEFAULT_MIX."""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (value or '').split(',')):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise CommandError(f'Неизвестный сценарий {name}. Доступны: {", ".join(SCENARIOS)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Некорректный вес сценария: {item}')
+    return mix
+
+
+def parse_budgets(values):
+    """Бюджеты из settings.LOADTEST_LATENCY_BUDGETS с переопределениями вида 'post-list:p95=250'."""
+    budgets = {name: dict(limits) for name, limits in settings.LOADTEST_LATENCY_BUDGETS.items()}
+    keys = {f'p{percent}' for percent in PERCENTILES} | {'max'}
+    for value in values or ():
+        name, _, limit = value.partition(':')
+        key, _, ms = limit.partition('=')
+        if name not in SCENARIOS or key not in keys:
+            raise CommandError(f'Некорректный бюджет {value}: ожидается сценарий:{"|".join(sorted(keys))}=мс')
+        try:
+            budgets.setdefault(name, {})[key] = float(ms)
+        except ValueError:
+            raise CommandError(f'Некорректный бюджет {value}: ожидается сценарий:p95=мс')
+    return budgets
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест backend.asgi:application в процессе или через сокет сервера Daphne/uvicorn: '
+        'смесь вызовов клиента Angular, p50/p95/p99, пропускная способность и доля ошибок по сценариям. '
+        'Сценарий comment-create пишет комментарии в базу (отключается --mix comment-create=0)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', help='Адрес запущенного сервера (http://127.0.0.1:8000); без него приложение вызывается в процессе'
+        )
+        parser.add_argument('--concurrency', type=int, default=20, help='Количество виртуальных пользователей')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность теста, секунды')
+        parser.add_argument('--requests', type=int, help='Остановиться после стольких вызовов')
+        parser.add_argument(
+            '--mix', help=f'Веса сценариев, например post-list=40,ws-connect=0 (по умолчанию {DEFAULT_MIX})'
+        )
+        parser.add_argument('--think-time', type=float, default=0, help='Средняя пауза между вызовами, секунды')
+        parser.add_argument('--timeout', type=float, default=30, help='Таймаут одного вызова, секунды')
+        parser.add_argument(
+            '--attachment-ratio', type=float, default=0.2, help='Доля создаваемых комментариев с изображением'
+        )
+        parser.add_argument('--user-prefix', default='', help='Префикс имен пользователей (например, seed42_)')
+        parser.add_argument(
+            '--sample', type=int, default=1000, help='Сколько постов и комментариев с ответами выбрать из базы'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument(
+            '--budget', action='append',
+            help='Бюджет задержки сценария поверх LOADTEST_LATENCY_BUDGETS, например post-list:p95=250'
+        )
+        parser.add_argument(
+            '--max-error-rate', type=float, default=settings.LOADTEST_MAX_ERROR_RATE,
+            help='Допустимая доля ошибок каждого сценария'
+        )
+        parser.add_argument('--output', help='Сохранить результат в JSON-файл')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        budgets = parse_budgets(options['budget'])
+        if options['url']:
+            try:
+                transport = SocketTransport(options['url'], options['timeout'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            from backend.asgi import application
+            transport = ASGITransport(application, options['timeout'])
+
+        load_test = LoadTest(
+            transport,
+            self._load_dataset(options, mix),
+            mix,
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            max_requests=options['requests'],
+            timeout=options['timeout'],
+            think_time=options['think_time'],
+            seed=options['seed'],
+        )
+        result = asyncio.run(load_test.run())
+        result['budgets'] = budgets
+        result['violations'] = check_budgets(result, budgets, options['max_error_rate'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, indent=2, ensure_ascii=False)
+        self._report(result, options['json'])
+        if result['violations']:
+            raise CommandError(f'Превышены бюджеты: {"; ".join(result["violations"])}')
+
+    @staticmethod
+    def _load_dataset(options, mix):
+        """Пользователи с токенами, опубликованные посты и комментарии с ответами из базы."""
+        sample = options['sample']
+        users = list(
+            get_user_model().objects.filter(
+                is_active=True, username__startswith=options['user_prefix']
+            ).order_by('pk')[:options['concurrency']]
+        )
+        post_ids = list(
+            Post.objects.filter(is_published=True).order_by('-created_at').values_list('pk', flat=True)[:sample]
+        )
+        comments = list(
+            Comment.objects.filter(is_deleted=False, replies_count__gt=0)
+            .order_by('-pk').values_list('pk', 'post_id')[:sample]
+        )
+        if not users or not post_ids:
+            raise CommandError('Нет пользователей или опубликованных постов: заполните базу командой seed_blog')
+        if (mix.get('comment-replies') or mix.get('comment-thread')) and not comments:
+            raise CommandError('Нет комментариев с ответами для сценариев comment-replies и comment-thread')
+
+        return Dataset(
+            post_ids=post_ids,
+            comments=comments,
+            tokens=[str(AccessToken.for_user(user)) for user in users],
+            image=build_image(),
+            attachment_ratio=options['attachment_ratio'],
+        )
+
+    def _report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(
+            f"{result['transport']}: {result['concurrency']} пользователей, {result['elapsed_s']} с, "
+            f"{result['requests']} вызовов, {result['throughput_rps']} в секунду, ошибок {result['error_rate']:.2%}"
+        )
+        for name, route in result['routes'].items():
+            self.stdout.write(
+                f"{name}: {route['requests']} вызовов, {route['throughput_rps']}/с, "
+                f"p50 {route['p50_ms']} мс, p95 {route['p95_ms']} мс, p99 {route['p99_ms']} мс, "
+                f"max {route['max_ms']} мс, ошибок {route['error_rate']:.2%} {route['statuses']}"
+            )
+        for violation in result['violations']:
+            self.stdout.write(self.style.ERROR(violation))
+        if not result['violations']:
+            self.stdout.write(self.style.SUCCESS('Бюджеты задержки соблюдены'))
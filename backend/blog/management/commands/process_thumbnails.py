@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import PostAttachment, CommentAttachment
+from blog.thumbnail_service import thumbnail_service
+
+
+class Command(BaseCommand):
+    help = 'Создать миниатюры для вложений, оставшихся в очереди (например, после перезапуска сервера)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Повторить обработку вложений, для которых создание миниатюры завершилось ошибкой'
+        )
+        parser.add_argument(
+            '--regenerate',
+            action='store_true',
+            help='Пересоздать и готовые миниатюры (например, после изменения THUMBNAIL_VARIANTS)'
+        )
+
+    def handle(self, *args, **options):
+        statuses = [PostAttachment.THUMBNAIL_PENDING]
+        if options['retry_failed']:
+            statuses.append(PostAttachment.THUMBNAIL_FAILED)
+        if options['regenerate']:
+            statuses.append(PostAttachment.THUMBNAIL_READY)
+
+        for model in (PostAttachment, CommentAttachment):
+            pks = list(
+                model.objects.filter(thumbnail_status__in=statuses).order_by('pk').values_list('pk', flat=True)
+            )
+            for pk in pks:
+                thumbnail_service.process(model, pk)
+            self.stdout.write(f'{model._meta.verbose_name_plural}: обработано {len(pks)}')
+
+        self.stdout.write(self.style.SUCCESS('Очередь миниатюр обработана'))
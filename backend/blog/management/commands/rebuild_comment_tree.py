@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blog.models import Comment, CommentTree
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестроить таблицу замыканий дерева комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post',
+            type=int,
+            help='ID поста, для которого нужно перестроить дерево (по умолчанию все посты)'
+        )
+        parser.add_argument(
+            '--max-depth',
+            type=int,
+            default=1000,
+            help='Максимальная глубина дерева (защита от циклов в данных)'
+        )
+
+    def handle(self, *args, **options):
+        post_id = options['post']
+        comment_table = Comment._meta.db_table
+        tree_table = CommentTree._meta.db_table
+
+        # Один INSERT ... SELECT с рекурсивным CTE вместо построчной вставки
+        post_filter = 'AND c.post_id = %s' if post_id else ''
+        sql = f"""
+            WITH RECURSIVE paths (comment_id, ancestor_id, depth) AS (
+                SELECT c.id, c.id, 0
+                FROM {comment_table} c
+                WHERE 1 = 1 {post_filter}
+                UNION ALL
+                SELECT p.comment_id, c.parent_id, p.depth + 1
+                FROM paths p
+                JOIN {comment_table} c ON c.id = p.ancestor_id
+                WHERE c.parent_id IS NOT NULL AND p.depth < %s
+            )
+            INSERT INTO {tree_table} (comment_id, ancestor_id, depth)
+            SELECT comment_id, ancestor_id, depth FROM paths
+        """
+        params = [post_id, options['max_depth']] if post_id else [options['max_depth']]
+
+        with transaction.atomic():
+            existing = CommentTree.objects.all()
+            if post_id:
+                existing = existing.filter(comment__post_id=post_id)
+            deleted, _ = existing.delete()
+
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+
+            # rowcount для INSERT с CTE поддерживается не всеми бэкендами
+            inserted = existing.count()
+
+        self.stdout.write(f'Удалено связей: {deleted}')
+        self.stdout.write(self.style.SUCCESS(f'Создано связей: {inserted}'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from blog.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счетчики ответов у комментариев и комментариев у постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Количество строк, обновляемых одним UPDATE (по диапазону id)'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        replies = Comment.objects.filter(
+            parent=OuterRef('pk'), is_deleted=False
+        ).order_by().values('parent').annotate(total=Count('pk')).values('total')
+        updated = self._update_in_chunks(
+            Comment, chunk_size, replies_count=Coalesce(Subquery(replies), 0)
+        )
+        self.stdout.write(f'Обновлено комментариев: {updated}')
+
+        comments = Comment.objects.filter(
+            post=OuterRef('pk'), is_deleted=False
+        ).order_by().values('post').annotate(total=Count('pk')).values('total')
+        updated = self._update_in_chunks(
+            Post, chunk_size, comments_count=Coalesce(Subquery(comments), 0)
+        )
+        self.stdout.write(f'Обновлено постов: {updated}')
+
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
+
+    def _update_in_chunks(self, model, chunk_size, **values):
+        """Выполняет UPDATE по диапазонам id, чтобы не блокировать всю таблицу разом."""
+        max_id = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        updated = 0
+        for start in range(0, max_id + 1, chunk_size):
+            with transaction.atomic():
+                updated += model.objects.filter(
+                    id__gte=start, id__lt=start + chunk_size
+                ).update(**values)
+        return updated
@@ -0,0 +1,26 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+
+# DDL поискового индекса хранится только в миграции
+SEARCH_MIGRATION = ('blog', '0009_search_index')
+search_migration = import_module('blog.migrations.0009_search_index')
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересоздать триггеры полнотекстового поиска и заново проиндексировать посты и комментарии '
+        '(например, после смены SEARCH_CONFIG или пересоздания таблиц в SQLite)'
+    )
+
+    def handle(self, *args, **options):
+        if SEARCH_MIGRATION not in MigrationRecorder(connection).applied_migrations():
+            raise CommandError('Миграция blog.0009_search_index не применена: сначала выполните migrate')
+
+        # CREATE INDEX CONCURRENTLY на PostgreSQL нельзя выполнять внутри транзакции
+        with connection.schema_editor(atomic=False) as schema_editor:
+            search_migration.install_search_index(None, schema_editor, config=settings.SEARCH_CONFIG)
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,298 @@
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image, ImageDraw
+
+from blog.cache import listing_cache
+from blog.import_service import CommentImportService
+from blog.models import Comment, CommentAttachment, Post, PostAttachment
+
+WORDS = (
+    'блог пост комментарий ответ автор текст идея вопрос пример код сервер база данных запрос '
+    'индекс кеш очередь поток память время скорость ошибка версия релиз тест команда проект '
+    'python django postgres api json http python3 интересно спасибо согласен думаю возможно '
+    'например кстати однако поэтому действительно хорошо плохо быстро медленно новый старый '
+    'большой маленький простой сложный важный удобный главный последний первый'
+).split()
+
+# Начало периода, в котором распределяются даты постов и комментариев
+SEED_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SEED_PERIOD = timedelta(days=365)
+# Доля удаленных комментариев и средний интервал между комментариями поста
+DELETED_RATIO = 0.02
+COMMENT_INTERVAL_SECONDS = 900
+
+
+def zipf_cum_weights(count, exponent):
+    """Накопленные веса распределения Ципфа для рангов 1..count."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнить базу детерминированными тестовыми данными: пользователи, посты, деревья '
+        'комментариев с популярностью по закону Ципфа и вложения-изображения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('--posts', type=int, default=10000, help='Количество постов')
+        parser.add_argument('--comments', type=int, default=100000, help='Общее количество комментариев')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности постов и активности пользователей'
+        )
+        parser.add_argument('--max-depth', type=int, default=8, help='Максимальная глубина ветки комментариев')
+        parser.add_argument('--max-replies', type=int, default=10, help='Максимум прямых ответов на комментарий')
+        parser.add_argument(
+            '--reply-ratio', type=float, default=0.7,
+            help='Доля комментариев, которые являются ответами (остальные — верхнего уровня)'
+        )
+        parser.add_argument('--published-ratio', type=float, default=0.9, help='Доля опубликованных постов')
+        parser.add_argument(
+            '--post-attachments', type=float, default=0.2, help='Доля постов с изображением во вложении'
+        )
+        parser.add_argument(
+            '--comment-attachments', type=float, default=0.02, help='Доля комментариев с изображением'
+        )
+        parser.add_argument('--images', type=int, default=16, help='Количество сгенерированных изображений')
+        parser.add_argument('--prefix', default='seed', help='Префикс имен пользователей и файлов')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.name_prefix = f'{options["prefix"]}{options["seed"]}'
+        if get_user_model().objects.filter(username__startswith=f'{self.name_prefix}_').exists():
+            raise CommandError(
+                f'Данные с префиксом {self.name_prefix} уже созданы: укажите другой --seed или --prefix'
+            )
+
+        started = time.perf_counter()
+        user_ids = self._stage('Пользователи', self._create_users)
+        posts = self._stage('Посты', self._create_posts, user_ids)
+        images = self._stage('Изображения', self._create_images)
+        self._stage('Вложения постов', self._create_post_attachments, posts, images)
+        self._stage('Комментарии', self._create_comments, posts, user_ids)
+        self._stage('Вложения комментариев', self._create_comment_attachments, posts, images)
+        listing_cache.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.perf_counter() - started:.1f} с'))
+        if images:
+            self.stdout.write('Миниатюры вложений в очереди: manage.py process_thumbnails')
+
+    def _stage(self, title, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(f'{title}: {count} за {time.perf_counter() - started:.1f} с')
+        return result
+
+    # Генерация текста и дат
+
+    def _sentence(self, min_words, max_words):
+        words = self.rng.choices(WORDS, k=self.rng.randint(min_words, max_words))
+        return ' '.join(words).capitalize() + '.'
+
+    def _post_content(self):
+        paragraphs = []
+        for _ in range(self.rng.randint(1, 5)):
+            text = ' '.join(self._sentence(6, 18) for _ in range(self.rng.randint(2, 6)))
+            if self.rng.random() < 0.3:
+                text += f' <strong>{self._sentence(2, 4)}</strong>'
+            paragraphs.append(f'<p>{text}</p>')
+        return ''.join(paragraphs)
+
+    def _random_date(self):
+        return SEED_EPOCH + SEED_PERIOD * self.rng.random()
+
+    # Этапы
+
+    def _create_users(self):
+        User = get_user_model()
+        # Хеш пароля вычисляется один раз: у всех пользователей пароль "password"
+        password = make_password('password')
+        users = [
+            User(
+                username=f'{self.name_prefix}_{number}',
+                email=f'{self.name_prefix}_{number}@example.com',
+                password=password,
+                date_joined=self._random_date()
+            )
+            for number in range(self.options['users'])
+        ]
+        User.objects.bulk_create(users, batch_size=self.chunk_size)
+        return list(
+            User.objects.filter(username__startswith=f'{self.name_prefix}_').order_by('pk').values_list('pk', flat=True)
+        )
+
+    def _create_posts(self, user_ids):
+        if not user_ids:
+            raise CommandError('Для постов нужен хотя бы один пользователь (--users)')
+        author_weights = zipf_cum_weights(len(user_ids), self.options['zipf'])
+        # Самые активные пользователи — случайные, а не первые созданные
+        authors = self.rng.sample(user_ids, len(user_ids))
+
+        created = []
+        for start in range(0, self.options['posts'], self.chunk_size):
+            count = min(self.chunk_size, self.options['posts'] - start)
+            chunk = [
+                Post(
+                    author_id=author_id,
+                    title=self._sentence(3, 8)[:255],
+                    content=self._post_content(),
+                    is_published=self.rng.random() < self.options['published_ratio'],
+                    created_at=self._random_date()
+                )
+                for author_id in self.rng.choices(authors, cum_weights=author_weights, k=count)
+            ]
+            with transaction.atomic():
+                created.extend(Post.objects.bulk_create(chunk))
+        return created
+
+    def _create_images(self):
+        """Небольшие изображения, которые используются всеми вложениями (файлы пишутся один раз)."""
+        names = []
+        for number in range(self.options['images'] if self._needs_images() else 0):
+            width, height = self.rng.choice([(800, 600), (640, 480), (1024, 768), (600, 800)])
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            img = Image.new('RGB', (width, height), color)
+            draw = ImageDraw.Draw(img)
+            for _ in range(8):
+                box = sorted(self.rng.sample(range(width), 2)), sorted(self.rng.sample(range(height), 2))
+                draw.rectangle(
+                    [box[0][0], box[1][0], box[0][1], box[1][1]],
+                    fill=tuple(self.rng.randrange(256) for _ in range(3))
+                )
+            content = BytesIO()
+            img.save(content, 'JPEG', quality=85)
+            names.append(default_storage.save(
+                f'seed/{self.name_prefix}_{number}.jpg', ContentFile(content.getvalue())
+            ))
+        return names
+
+    def _needs_images(self):
+        return self.options['post_attachments'] > 0 or self.options['comment_attachments'] > 0
+
+    def _create_post_attachments(self, posts, images):
+        if not images:
+            return 0
+        attachments = [
+            PostAttachment(
+                post_id=post.pk,
+                file=self.rng.choice(images),
+                file_type='image',
+                thumbnail_status=PostAttachment.THUMBNAIL_PENDING,
+                uploaded_at=post.created_at
+            )
+            for post in posts
+            if self.rng.random() < self.options['post_attachments']
+        ]
+        PostAttachment.objects.bulk_create(attachments, batch_size=self.chunk_size)
+        return len(attachments)
+
+    def _create_comments(self, posts, user_ids):
+        """Деревья комментариев пишет CommentImportService: пачки по уровням и таблица замыканий."""
+        if not posts:
+            return 0
+        post_weights = zipf_cum_weights(len(posts), self.options['zipf'])
+        ranked_posts = self.rng.sample(posts, len(posts))
+        counts = Counter(self.rng.choices(range(len(posts)), cum_weights=post_weights, k=self.options['comments']))
+
+        user_weights = zipf_cum_weights(len(user_ids), self.options['zipf'])
+        authors = self.rng.sample(user_ids, len(user_ids))
+        service = CommentImportService(chunk_size=self.chunk_size)
+
+        total = 0
+        threads = []
+        size = 0
+        # Небольшие обсуждения импортируются вместе, пачками примерно по chunk_size комментариев
+        for rank in sorted(counts):
+            post = ranked_posts[rank]
+            threads.append((post, self._comment_tree(post, counts[rank], authors, user_weights), post.author_id))
+            size += counts[rank]
+            if size >= self.chunk_size:
+                total += service.import_threads(threads, notify=False)['comments']
+                threads = []
+                size = 0
+        if threads:
+            total += service.import_threads(threads, notify=False)['comments']
+        return total
+
+    def _comment_tree(self, post, count, authors, user_weights):
+        """Плоский список комментариев поста (id/parent), родитель всегда раньше ответа."""
+        rng = self.rng
+        max_depth = self.options['max_depth']
+        max_replies = self.options['max_replies']
+        reply_ratio = self.options['reply_ratio']
+
+        depths = []
+        replies = []
+        # Комментарии, на которые еще можно ответить (глубина и число ответов не исчерпаны)
+        open_parents = []
+        items = []
+        created_at = post.created_at
+        for index, author_id in enumerate(rng.choices(authors, cum_weights=user_weights, k=count)):
+            created_at += timedelta(seconds=rng.expovariate(1 / COMMENT_INTERVAL_SECONDS))
+            parent = None
+            if open_parents and rng.random() < reply_ratio:
+                position = rng.randrange(len(open_parents))
+                parent = open_parents[position]
+                replies[parent] += 1
+                if replies[parent] >= max_replies:
+                    open_parents[position] = open_parents[-1]
+                    open_parents.pop()
+
+            depth = 0 if parent is None else depths[parent] + 1
+            depths.append(depth)
+            replies.append(0)
+            if depth < max_depth:
+                open_parents.append(index)
+
+            items.append({
+                'id': index,
+                'parent': parent,
+                'author': author_id,
+                'content': self._sentence(3, 30),
+                'created_at': created_at.isoformat(),
+                'is_deleted': rng.random() < DELETED_RATIO,
+            })
+        return items
+
+    def _create_comment_attachments(self, posts, images):
+        ratio = self.options['comment_attachments']
+        if not images or ratio <= 0:
+            return 0
+        # Посты одного запуска создаются подряд: диапазон pk вместо длинного IN
+        comments = Comment.objects.filter(
+            post_id__gte=posts[0].pk, post_id__lte=posts[-1].pk, is_deleted=False
+        ).order_by('pk').values_list('pk', 'created_at')
+
+        total = 0
+        batch = []
+        for pk, created_at in comments.iterator(chunk_size=self.chunk_size):
+            if self.rng.random() < ratio:
+                batch.append(CommentAttachment(
+                    comment_id=pk,
+                    image=self.rng.choice(images),
+                    thumbnail_status=CommentAttachment.THUMBNAIL_PENDING,
+                    uploaded_at=created_at
+                ))
+            if len(batch) >= self.chunk_size:
+                CommentAttachment.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        CommentAttachment.objects.bulk_create(batch)
+        return total + len(batch)
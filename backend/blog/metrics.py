@@ -0,0 +1,208 @@
+"""
+Метрики HTTP-запросов в текстовом формате Prometheus.
+
+Статистика текущего запроса (число и время SQL-запросов, время сериализации)
+накапливается в RequestStats из contextvar: SQL — через execute_wrapper
+count_queries, который ставится на каждое подключение (blog.signals;
+contextvar виден и в потоках sync_to_async, где async ORM выполняет
+запросы асинхронных представлений), сериализация —
+через timed('serialization') в сериализаторах и рендерере. По завершении
+запроса значения попадают в гистограммы с метками view, route и method.
+
+Гистограммы хранятся в памяти процесса: при нескольких воркерах каждый
+отдает свои значения, и Prometheus собирает их по отдельности.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+LABEL_NAMES = ('view', 'route', 'method')
+
+current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Статистика одного HTTP-запроса."""
+
+    def __init__(self, keep_sql=True):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.keep_sql = keep_sql
+        self.sql = []
+
+    def execute(self, execute, sql, params, many, context):
+        """execute_wrapper подключения: считает запросы и их время."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            if self.keep_sql:
+                self.sql.append((sql, duration))
+
+
+def count_queries(execute, sql, params, many, context):
+    """execute_wrapper подключений: передает запрос в статистику текущего HTTP-запроса."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.execute(execute, sql, params, many, context)
+
+
+@contextmanager
+def timed(kind):
+    """Добавляет время блока к полю {kind}_time статистики текущего запроса."""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        name = f'{kind}_time'
+        setattr(stats, name, getattr(stats, name) + time.perf_counter() - started)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(LABEL_NAMES, labels))
+
+
+class Counter:
+    """Счетчик Prometheus с метками LABEL_NAMES."""
+    type_name = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def collect(self):
+        """Строки текстового формата Prometheus."""
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+        with self._lock:
+            series = self._snapshot()
+        for labels, value in sorted(series):
+            lines.extend(self._sample_lines(format_labels(labels), value))
+        return lines
+
+    def _snapshot(self):
+        return list(self._series.items())
+
+    def _sample_lines(self, label_text, value):
+        return [f'{self.name}{{{label_text}}} {format_value(value)}']
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Histogram(Counter):
+    """Гистограмма Prometheus с метками LABEL_NAMES."""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Счетчики по корзинам (последняя — +Inf) и сумма значений
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def _snapshot(self):
+        # Копии списков, чтобы форматировать без блокировки
+        return [(labels, (list(counts), list(total))) for labels, (counts, total) in self._series.items()]
+
+    def _sample_lines(self, label_text, value):
+        counts, (total,) = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{{label_text},le="{format_value(float(bound))}"}} {cumulative}')
+        lines.append(f'{self.name}_sum{{{label_text}}} {format_value(total)}')
+        lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+class RequestMetrics:
+    """Метрики запросов и выдача их в формате Prometheus."""
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.duration = Histogram(
+            'http_request_duration_seconds', 'Полное время обработки запроса.', DURATION_BUCKETS
+        )
+        self.db_queries = Histogram(
+            'http_request_db_queries', 'Число SQL-запросов за HTTP-запрос.', QUERY_COUNT_BUCKETS
+        )
+        self.db_duration = Histogram(
+            'http_request_db_duration_seconds', 'Время SQL-запросов за HTTP-запрос.', DURATION_BUCKETS
+        )
+        self.serialization_duration = Histogram(
+            'http_request_serialization_duration_seconds',
+            'Время сериализации и рендеринга ответа.',
+            DURATION_BUCKETS
+        )
+        self.budget_exceeded = Counter(
+            'http_request_query_budget_exceeded_total',
+            'Число запросов, превысивших бюджет SQL-запросов маршрута.'
+        )
+
+    @property
+    def metrics(self):
+        return (self.duration, self.db_queries, self.db_duration, self.serialization_duration, self.budget_exceeded)
+
+    def observe(self, labels, stats, duration, budget=None):
+        self.duration.observe(labels, duration)
+        self.db_queries.observe(labels, stats.queries)
+        self.db_duration.observe(labels, stats.db_time)
+        self.serialization_duration.observe(labels, stats.serialization_time)
+        if budget is not None and stats.queries > budget:
+            self.budget_exceeded.inc(labels)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+request_metrics = RequestMetrics()
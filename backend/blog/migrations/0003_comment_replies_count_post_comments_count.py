@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики по существующим комментариям."""
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+
+    replies = Comment.objects.filter(
+        parent=OuterRef('pk'), is_deleted=False
+    ).order_by().values('parent').annotate(total=Count('pk')).values('total')
+    Comment.objects.update(replies_count=Coalesce(Subquery(replies), 0))
+
+    comments = Comment.objects.filter(
+        post=OuterRef('pk'), is_deleted=False
+    ).order_by().values('post').annotate(total=Count('pk')).values('total')
+    Post.objects.update(comments_count=Coalesce(Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_alter_comment_content_alter_post_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество ответов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
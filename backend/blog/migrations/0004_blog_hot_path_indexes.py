@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """
+    На PostgreSQL создает индекс через CREATE INDEX CONCURRENTLY без блокировки записи,
+    на остальных СУБД (SQLite в тестах) — обычным CREATE INDEX.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('blog', '0003_comment_replies_count_post_comments_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfSupported(
+            model_name='comment',
+            index=models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('parent__isnull', True)), fields=['post', 'created_at', 'id'], name='comment_post_root_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['parent', 'created_at', 'id'], name='comment_parent_active_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='commenttree',
+            index=models.Index(fields=['ancestor', 'depth'], name='commenttree_ancestor_depth_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='post_created_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['created_at', 'id'], name='post_published_created_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at', 'id'], name='post_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+def fill_thumbnail_status(apps, schema_editor):
+    """Существующие миниатюры создавались синхронно: отмечаем их готовыми."""
+    for model_name in ('PostAttachment', 'CommentAttachment'):
+        model = apps.get_model('blog', model_name)
+        model.objects.exclude(thumbnail__isnull=True).exclude(thumbnail='').update(thumbnail_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_blog_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commentattachment',
+            name='thumbnail_status',
+            field=models.CharField(choices=[('none', 'Не требуется'), ('pending', 'В обработке'), ('ready', 'Готова'), ('failed', 'Ошибка')], default='none', editable=False, max_length=10, verbose_name='Статус миниатюры'),
+        ),
+        migrations.AddField(
+            model_name='postattachment',
+            name='thumbnail_status',
+            field=models.CharField(choices=[('none', 'Не требуется'), ('pending', 'В обработке'), ('ready', 'Готова'), ('failed', 'Ошибка')], default='none', editable=False, max_length=10, verbose_name='Статус миниатюры'),
+        ),
+        migrations.RunPython(fill_thumbnail_status, migrations.RunPython.noop),
+    ]
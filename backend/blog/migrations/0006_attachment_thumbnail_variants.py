@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_attachment_thumbnail_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commentattachment',
+            name='thumbnail_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Размеры миниатюры'),
+        ),
+        migrations.AddField(
+            model_name='postattachment',
+            name='thumbnail_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Размеры миниатюры'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_notification_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('info', 'Информация'), ('success', 'Успех'), ('warning', 'Предупреждение'), ('error', 'Ошибка')], default='info', max_length=10, verbose_name='Тип')),
+                ('title', models.CharField(max_length=255, verbose_name='Заголовок')),
+                ('message', models.TextField(verbose_name='Текст')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='Дополнительные данные')),
+                ('read', models.BooleanField(default=False, verbose_name='Прочитано')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата создания')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+            ],
+            options={
+                'verbose_name': 'Уведомление',
+                'verbose_name_plural': 'Уведомления',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', 'read', 'id'], name='notification_user_read_idx')],
+            },
+        ),
+    ]
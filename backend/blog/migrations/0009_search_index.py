@@ -0,0 +1,128 @@
+import re
+
+from django.db import migrations
+
+# DDL зафиксирован в миграции и хранится только здесь: изменения кода не должны
+# менять уже примененную схему. Команда rebuild_search_index вызывает
+# install_search_index с текущей настройкой SEARCH_CONFIG
+
+# Конфигурация полнотекстового поиска на момент создания миграции
+SEARCH_CONFIG = 'russian'
+
+# Индексируемые поля таблиц: (поле, вес) и поле для триграммного поиска
+DOCUMENTS = {
+    'blog_post': {'fields': (('title', 'A'), ('content', 'B')), 'trigram_field': 'title'},
+    'blog_comment': {'fields': (('content', 'A'),), 'trigram_field': 'content'},
+}
+
+
+def _pg_vector_sql(config, table, row=''):
+    return ' || '.join(
+        f"setweight(to_tsvector('{config}', coalesce({row}{field}, '')), '{weight}')"
+        for field, weight in DOCUMENTS[table]['fields']
+    )
+
+
+def _pg_install(schema_editor, config):
+    if not re.fullmatch(r'[a-z_][a-z0-9_]*', config):
+        raise ValueError(f'Недопустимая конфигурация полнотекстового поиска: {config}')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, document in DOCUMENTS.items():
+        columns = ', '.join(field for field, _ in document['fields'])
+        schema_editor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector')
+        schema_editor.execute(f"""
+            CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {_pg_vector_sql(config, table, 'NEW.')};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        schema_editor.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF {columns} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+        """)
+        schema_editor.execute(f'UPDATE {table} SET search_vector = {_pg_vector_sql(config, table)}')
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_search_vector_idx '
+            f'ON {table} USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_{document["trigram_field"]}_trgm_idx '
+            f'ON {table} USING gin ({document["trigram_field"]} gin_trgm_ops)'
+        )
+
+
+def _pg_remove(schema_editor):
+    for table, document in DOCUMENTS.items():
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {table}_{document["trigram_field"]}_trgm_idx')
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {table}_search_vector_idx')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update()')
+        schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+    # Расширение pg_trgm не удаляется: оно общее для базы и может использоваться другими объектами
+
+
+def _sqlite_install(schema_editor, config):
+    for table, document in DOCUMENTS.items():
+        fts = f'{table}_fts'
+        columns = ', '.join(field for field, _ in document['fields'])
+        new_values = ', '.join(f'new.{field}' for field, _ in document['fields'])
+        old_values = ', '.join(f'old.{field}' for field, _ in document['fields'])
+        delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+        insert_new = f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});'
+
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{columns}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert_new} END')
+        schema_editor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete_old} END')
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {table} '
+            f'BEGIN {delete_old} {insert_new} END'
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _sqlite_remove(schema_editor):
+    for table in DOCUMENTS:
+        for action in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{action}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+BACKENDS = {
+    'postgresql': (_pg_install, _pg_remove),
+    'sqlite': (_sqlite_install, _sqlite_remove),
+}
+
+
+def install_search_index(apps, schema_editor, config=SEARCH_CONFIG):
+    """Создает столбцы/таблицы поиска, триггеры и индексы и заполняет их."""
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend[0](schema_editor, config)
+
+
+def remove_search_index(apps, schema_editor):
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend[1](schema_editor)
+
+
+class Migration(migrations.Migration):
+    # Индексы на PostgreSQL создаются через CREATE INDEX CONCURRENTLY, вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('blog', '0008_notification'),
+    ]
+
+    operations = [
+        # Расширение pg_trgm создается вместе с индексами: TrigramExtension
+        # при откате удаляет расширение, а на SQLite падает
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
@@ -15,4 +15,79 @@ class TimestampMixin(models.Model):
     )
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+
+class ThumbnailMixin(models.Model):
+    """
+    Миксин для вложений с миниатюрой, которая создается в фоне.
+
+    Наследник задает source_field (поле исходного изображения)
+    и uploader_id (получатель уведомления о готовности миниатюры).
+    """
+    source_field = None
+
+    THUMBNAIL_NONE = 'none'
+    THUMBNAIL_PENDING = 'pending'
+    THUMBNAIL_READY = 'ready'
+    THUMBNAIL_FAILED = 'failed'
+    THUMBNAIL_STATUS_CHOICES = [
+        (THUMBNAIL_NONE, 'Не требуется'),
+        (THUMBNAIL_PENDING, 'В обработке'),
+        (THUMBNAIL_READY, 'Готова'),
+        (THUMBNAIL_FAILED, 'Ошибка'),
+    ]
+
+    thumbnail_status = models.CharField(
+        max_length=10,
+        choices=THUMBNAIL_STATUS_CHOICES,
+        default=THUMBNAIL_NONE,
+        editable=False,
+        verbose_name='Статус миниатюры'
+    )
+    thumbnail_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Размеры миниатюры'
+    )
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем загруженный исходный файл, чтобы не пересоздавать миниатюру без его замены."""
+        instance = super().from_db(db, field_names, values)
+        if cls.source_field in instance.__dict__:
+            instance._loaded_source_name = instance.source_file.name
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Сохранение без обработки изображения: новая миниатюра ставится в очередь (см. signals)."""
+        self._thumbnail_requested = self.needs_thumbnail()
+        if self._thumbnail_requested:
+            self.thumbnail_status = self.THUMBNAIL_PENDING
+        super().save(*args, **kwargs)
+        self._loaded_source_name = self.source_file.name
+
+    def needs_thumbnail(self):
+        return self._source_changed()
+
+    @property
+    def source_file(self):
+        return getattr(self, self.source_field)
+
+    def _source_changed(self):
+        """Новая запись или замененный исходный файл."""
+        if self._state.adding or not hasattr(self, '_loaded_source_name'):
+            return bool(self.source_file)
+        return bool(self.source_file) and self.source_file.name != self._loaded_source_name
+
+    def thumbnail_srcset(self, build_url=None):
+        """Строка для атрибута srcset: URL вариантов миниатюры с их шириной."""
+        storage = self.thumbnail.storage
+        candidates = []
+        for variant in sorted(self.thumbnail_variants.values(), key=lambda item: item['width']):
+            url = storage.url(variant['name'])
+            candidates.append(f"{build_url(url) if build_url else url} {variant['width']}w")
+        return ', '.join(candidates) or None
@@ -1,18 +1,31 @@
 import os
-from io import BytesIO
 
-from PIL import Image
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.utils import timezone
 
-from blog.mixins import TimestampMixin
+from blog.mixins import ThumbnailMixin, TimestampMixin
 from blog.validators import validate_file_size, HTMLValidator
 
 
+def fields_except(instance, excluded):
+    """
+    Поля для update_fields при сохранении существующей записи без указанных полей.
+
+    Счетчики меняются только F-выражениями, поэтому устаревшее значение
+    из экземпляра не должно перезаписывать их при обычном save().
+    Отложенные поля (only/defer) также не сохраняются, как и в Model.save.
+    """
+    skipped = set(excluded) | instance.get_deferred_fields()
+    return [
+        field.attname for field in instance._meta.concrete_fields
+        if not field.primary_key and field.attname not in skipped
+    ]
+
+
 # Create your models here.
 class Post(TimestampMixin, models.Model):
     """Модель поста блога."""
@@ -33,18 +46,42 @@ class Post(TimestampMixin, models.Model):
         default=True,
         verbose_name='Опубликован'
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            # Общая лента и курсорная пагинация по (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='post_created_idx'),
+            # Лента опубликованных постов
+            models.Index(
+                fields=['created_at', 'id'],
+                name='post_published_created_idx',
+                condition=models.Q(is_published=True)
+            ),
+            # Посты текущего пользователя
+            models.Index(fields=['author', 'created_at', 'id'], name='post_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.title[:50]
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = fields_except(self, ('comments_count',))
+        super().save(*args, **kwargs)
 
-class PostAttachment(models.Model):
+
+class PostAttachment(ThumbnailMixin, models.Model):
     """Вложения к постам с обработкой изображений."""
+    source_field = 'file'
+
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -81,55 +118,29 @@ class PostAttachment(models.Model):
         verbose_name_plural = 'Вложения к постам'
 
     def save(self, *args, **kwargs):
-        """Сохранение с определением типа файла и обработкой изображения."""
+        """Сохранение с определением типа файла; миниатюра создается в фоне."""
         self._set_file_type()
         super().save(*args, **kwargs)
-        if self.is_image:
-            self._process_image()
 
-    def _set_file_type(self):
-        """Определяет тип файла по расширению."""
-        ext = os.path.splitext(self.file.name)[1][1:].lower()
-        self.file_type = 'image' if ext in ['jpg', 'jpeg', 'png', 'gif'] else 'text'
+    def needs_thumbnail(self):
+        return self.is_image and super().needs_thumbnail()
 
-    def _process_image(self):
-        """Обрабатывает изображение: создает миниатюру 320x240."""
-        if not self.file:
-            return
+    def _set_file_type(self):
+        """
+        Определяет тип файла: для нового файла из запроса — тип, подтвержденный
+        содержимым при загрузке (blog.uploads), иначе по расширению.
+        """
+        file_type = None
+        if self.file and not self.file._committed:
+            file_type = getattr(self.file.file, 'file_type', None)
+        if file_type is None:
+            ext = os.path.splitext(self.file.name)[1][1:].lower()
+            file_type = 'image' if ext in ['jpg', 'jpeg', 'png', 'gif'] else 'text'
+        self.file_type = file_type
 
-        try:
-            with Image.open(self.file.path) as img:
-                # Проверяем, нужно ли изменять размер
-                if img.width > 320 or img.height > 240:
-                    # Создаем копию изображения для обработки
-                    img_copy = img.copy()
-                    # Пропорциональное изменение размера с сохранением соотношения сторон
-                    img_copy.thumbnail((320, 240), Image.LANCZOS)
-                    self._save_thumbnail(img_copy)
-        except (IOError, OSError) as e:
-            # Логируем ошибку, но не прерываем сохранение
-            print(f'Ошибка обработки изображения: {str(e)}')
-
-    def _save_thumbnail(self, img):
-        """Сохраняет обработанную миниатюру."""
-        thumb_io = BytesIO()
-        # Определяем формат для сохранения
-        format_name = 'JPEG'  # Используем JPEG по умолчанию
-        if img.mode in ('RGBA', 'LA'):
-            # Для изображений с прозрачностью используем PNG
-            format_name = 'PNG'
-        elif hasattr(img, 'format') and img.format:
-            format_name = img.format
-
-        img.save(thumb_io, format=format_name, quality=85)
-
-        # Сохраняем миниатюру
-        filename = os.path.basename(self.file.name)
-        self.thumbnail.save(
-            f'thumb_{filename}',
-            ContentFile(thumb_io.getvalue()),
-            save=False
-        )
+    @property
+    def uploader_id(self):
+        return self.post.author_id
 
     @property
     def is_image(self):
@@ -174,34 +185,192 @@ class Comment(TimestampMixin, models.Model):
         default=False,
         verbose_name='Удален'
     )
+    replies_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество ответов'
+    )
+
+    OTHER_POST_PARENT_MESSAGE = 'Родительский комментарий относится к другому посту.'
 
     class Meta:
         ordering = ['created_at']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+            # Комментарии верхнего уровня поста (top-comments, последние комментарии в ленте)
+            models.Index(
+                fields=['post', 'created_at', 'id'],
+                name='comment_post_root_idx',
+                condition=models.Q(parent__isnull=True, is_deleted=False)
+            ),
+            # Ответы на комментарий
+            models.Index(
+                fields=['parent', 'created_at', 'id'],
+                name='comment_parent_active_idx',
+                condition=models.Q(is_deleted=False)
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем загруженные флаг удаления и родителя для отслеживания их изменения."""
+        instance = super().from_db(db, field_names, values)
+        if 'is_deleted' in instance.__dict__:
+            instance._loaded_is_deleted = instance.is_deleted
+        if 'parent_id' in instance.__dict__:
+            instance._loaded_parent_id = instance.parent_id
+        return instance
+
+    def clean(self):
+        super().clean()
+        if self.parent_id and self.post_id and self.parent.post_id != self.post_id:
+            raise ValidationError({'parent': self.OTHER_POST_PARENT_MESSAGE})
 
     def save(self, *args, **kwargs):
-        """Сохранение с обновлением дерева комментариев."""
-        super().save(*args, **kwargs)
-        self._update_comment_tree()
-
-    def _update_comment_tree(self):
-        """Поддерживает таблицу замыканий для иерархии комментариев."""
-        # Удаляем существующие связи для данного комментария
-        CommentTree.objects.filter(comment=self).delete()
-
-        # Создаем самоссылку (глубина 0)
-        CommentTree.objects.create(comment=self, ancestor=self, depth=0)
-
-        # Если есть родительский комментарий
-        if self.parent:
-            # Получаем всех предков родителя и создаем новые связи
-            for relation in CommentTree.objects.filter(comment=self.parent):
-                CommentTree.objects.create(
-                    comment=self,
-                    ancestor=relation.ancestor,
-                    depth=relation.depth + 1
+        """Сохранение с обновлением дерева комментариев и счетчиков."""
+        with transaction.atomic():
+            state = self._get_saved_state()
+            adding = state is None
+            old_parent_id, was_deleted = state or (self.parent_id, self.is_deleted)
+            reparented = not adding and old_parent_id != self.parent_id
+
+            if adding or reparented:
+                self._check_new_parent(adding)
+            delta = 0 if adding else self._sync_is_deleted(was_deleted)
+            if not adding and kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = fields_except(self, ('replies_count',))
+            super().save(*args, **kwargs)
+
+            # Связи в таблице замыканий меняются только при создании и смене родителя
+            if adding:
+                self._insert_tree_paths()
+                if not self.is_deleted:
+                    self._update_counters(1)
+            elif reparented:
+                self._move_subtree()
+                if delta:
+                    self._update_counters(delta, update_parent=False)
+                if not was_deleted:
+                    self._update_replies_count(old_parent_id, -1)
+                if not self.is_deleted:
+                    self._update_replies_count(self.parent_id, 1)
+            elif delta:
+                self._update_counters(delta)
+
+        self._loaded_is_deleted = self.is_deleted
+        self._loaded_parent_id = self.parent_id
+
+    def _get_saved_state(self):
+        """
+        Родитель и флаг удаления комментария в БД до сохранения (None — комментарий создается).
+
+        Обычно это значения, запомненные в from_db; у экземпляра, созданного
+        с pk вручную или загруженного без этих полей (only/defer), они читаются из БД.
+        """
+        if self.pk is None:
+            return None
+        if hasattr(self, '_loaded_parent_id') and hasattr(self, '_loaded_is_deleted'):
+            return self._loaded_parent_id, self._loaded_is_deleted
+        return Comment.objects.filter(pk=self.pk).values_list('parent_id', 'is_deleted').first()
+
+    def _sync_is_deleted(self, was_deleted):
+        """
+        Атомарно переключает флаг удаления в БД и возвращает изменение счетчиков.
+
+        Условный UPDATE гарантирует, что при параллельных удалениях
+        счетчики изменятся только один раз.
+        """
+        if was_deleted == self.is_deleted:
+            return 0
+
+        changed = Comment.objects.filter(pk=self.pk, is_deleted=was_deleted).update(
+            is_deleted=self.is_deleted
+        )
+        if not changed:
+            return 0
+        return -1 if self.is_deleted else 1
+
+    def _update_counters(self, delta, update_parent=True):
+        """Изменяет счетчики поста и родительского комментария через F-выражения."""
+        Post.objects.filter(pk=self.post_id).update(
+            comments_count=F('comments_count') + delta
+        )
+        if update_parent:
+            self._update_replies_count(self.parent_id, delta)
+
+    @staticmethod
+    def _update_replies_count(comment_id, delta):
+        """Изменяет счетчик ответов комментария через F-выражение."""
+        if comment_id:
+            Comment.objects.filter(pk=comment_id).update(
+                replies_count=F('replies_count') + delta
+            )
+
+    def _insert_tree_paths(self):
+        """
+        Добавляет связи нового комментария в таблицу замыканий.
+
+        Связи строятся из строк предков родителя, поэтому число запросов
+        не зависит от глубины комментария: одно чтение и одна пакетная вставка.
+        """
+        paths = [CommentTree(comment_id=self.pk, ancestor_id=self.pk, depth=0)]
+        if self.parent_id:
+            parent_paths = CommentTree.objects.filter(
+                comment_id=self.parent_id
+            ).values_list('ancestor_id', 'depth')
+            paths.extend(
+                CommentTree(comment_id=self.pk, ancestor_id=ancestor_id, depth=depth + 1)
+                for ancestor_id, depth in parent_paths
+            )
+        CommentTree.objects.bulk_create(paths)
+
+    def _check_new_parent(self, adding=False):
+        """
+        Родитель должен относиться к тому же посту, а при переносе — не входить
+        в собственную ветку комментария (иначе связи и счетчики охватят два поста или цикл).
+        """
+        if not self.parent_id:
+            return
+        if self.parent.post_id != self.post_id:
+            raise ValidationError(self.OTHER_POST_PARENT_MESSAGE)
+        if not adding and CommentTree.objects.filter(
+            ancestor_id=self.pk,
+            comment_id=self.parent_id
+        ).exists():
+            raise ValidationError('Комментарий нельзя сделать ответом на собственный ответ.')
+
+    def _move_subtree(self):
+        """Переносит ветку комментария под нового родителя в таблице замыканий."""
+        subtree = CommentTree.objects.filter(ancestor_id=self.pk)
+        subtree_paths = list(subtree.values_list('comment_id', 'depth'))
+
+        # Удаляем связи ветки со старыми предками, внутренние связи сохраняем
+        CommentTree.objects.filter(
+            comment_id__in=subtree.values('comment_id')
+        ).exclude(
+            ancestor_id__in=subtree.values('comment_id')
+        ).delete()
+
+        if not self.parent_id:
+            return
+
+        parent_paths = list(CommentTree.objects.filter(
+            comment_id=self.parent_id
+        ).values_list('ancestor_id', 'depth'))
+        CommentTree.objects.bulk_create(
+            (
+                CommentTree(
+                    comment_id=comment_id,
+                    ancestor_id=ancestor_id,
+                    depth=parent_depth + depth + 1
                 )
+                for comment_id, depth in subtree_paths
+                for ancestor_id, parent_depth in parent_paths
+            ),
+            batch_size=1000
+        )
 
     def __str__(self):
         return f'Комментарий к "{self.post.title}" от {self.author}'
@@ -227,13 +396,19 @@ class CommentTree(models.Model):
         unique_together = ('comment', 'ancestor')
         verbose_name = 'Дерево комментариев'
         verbose_name_plural = 'Дерево комментариев'
+        indexes = [
+            # Выборка поддерева по предку с ограничением глубины
+            models.Index(fields=['ancestor', 'depth'], name='commenttree_ancestor_depth_idx'),
+        ]
 
     def __str__(self):
         return f'{self.comment} -> {self.ancestor} (глубина: {self.depth})'
 
 
-class CommentAttachment(models.Model):
+class CommentAttachment(ThumbnailMixin, models.Model):
     """Вложения к комментариям (только изображения)."""
+    source_field = 'image'
+
     comment = models.ForeignKey(
         Comment,
         on_delete=models.CASCADE,
@@ -261,37 +436,118 @@ class CommentAttachment(models.Model):
         verbose_name = 'Вложение к комментарию'
         verbose_name_plural = 'Вложения к комментариям'
 
-    def save(self, *args, **kwargs):
-        """Сохранение с обработкой изображения."""
-        super().save(*args, **kwargs)
-        self._process_image()
-
-    def _process_image(self):
-        """Обрабатывает изображение: создает миниатюру 320x240."""
-        try:
-            with Image.open(self.image) as img:
-                # Проверяем, нужно ли изменять размер
-                if img.width > 320 or img.height > 240:
-                    # Пропорциональное изменение размера с сохранением соотношения сторон
-                    img.thumbnail((320, 240), Image.LANCZOS)
-                    self._save_thumbnail(img)
-        except (IOError, OSError) as e:
-            raise ValidationError(f'Ошибка обработки изображения: {str(e)}')
-
-    def _save_thumbnail(self, img):
-        """Сохраняет обработанную миниатюру."""
-        thumb_io = BytesIO()
-        # Определяем формат для сохранения
-        format_name = img.format if img.format else 'JPEG'
-        img.save(thumb_io, format=format_name, quality=85)
-
-        # Сохраняем миниатюру
-        self.thumbnail.save(
-            f'thumb_{os.path.basename(self.image.name)}',
-            ContentFile(thumb_io.getvalue()),
-            save=False
-        )
-        super().save()
+    @property
+    def uploader_id(self):
+        return self.comment.author_id
 
     def __str__(self):
         return f'Изображение к комментарию {self.comment.id}'
+
+
+class Notification(models.Model):
+    """Уведомление пользователя, хранится для счетчика непрочитанных и повторной отправки."""
+    TYPE_CHOICES = [
+        ('info', 'Информация'),
+        ('success', 'Успех'),
+        ('warning', 'Предупреждение'),
+        ('error', 'Ошибка'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Получатель'
+    )
+    notification_type = models.CharField(
+        max_length=10,
+        choices=TYPE_CHOICES,
+        default='info',
+        verbose_name='Тип'
+    )
+    title = models.CharField(
+        max_length=255,
+        verbose_name='Заголовок'
+    )
+    message = models.TextField(verbose_name='Текст')
+    data = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Дополнительные данные'
+    )
+    read = models.BooleanField(
+        default=False,
+        verbose_name='Прочитано'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата создания'
+    )
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        indexes = [
+            # Непрочитанные пользователя: счетчик и повторная отправка после id (диапазон по индексу)
+            models.Index(fields=['user', 'read', 'id'], name='notification_user_read_idx'),
+        ]
+
+    def to_payload(self):
+        """Уведомление в формате сообщения WebSocket."""
+        return {
+            'id': self.id,
+            'type': self.notification_type,
+            'title': self.title,
+            'message': self.message,
+            'timestamp': self.created_at.isoformat(),
+            'read': self.read,
+            'data': self.data,
+        }
+
+    def __str__(self):
+        return f'{self.title} для пользователя {self.user_id}'
+
+
+class NotificationOutbox(models.Model):
+    """
+    Исходящие уведомления (transactional outbox).
+
+    Строка пишется в той же транзакции, что и событие, а после коммита
+    диспетчер отправляет ее в слой каналов и удаляет. При ошибке отправки
+    строка остается и будет отправлена повторно.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Получатель'
+    )
+    payload = models.JSONField(verbose_name='Уведомление')
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата создания'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток отправки'
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Недоступно для отправки до'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = 'Исходящие уведомления'
+
+    def __str__(self):
+        return f'Уведомление #{self.id} для пользователя {self.user_id}'
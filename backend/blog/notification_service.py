@@ -1,9 +1,12 @@
-import json
-import uuid
-from datetime import datetime
+import time
+
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from .models import Comment, Post
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Comment, Post, Notification, NotificationOutbox
+from .outbox_service import outbox_dispatcher
 
 
 class NotificationService:
@@ -12,16 +15,82 @@ class NotificationService:
     def __init__(self):
         self.channel_layer = get_channel_layer()
 
-    def create_notification(self, notification_type, title, message, user_id):
-        """Создает уведомление."""
-        return {
-            'id': str(uuid.uuid4()),
-            'type': notification_type,
-            'title': title,
-            'message': message,
-            'timestamp': datetime.now().isoformat(),
-            'read': False
-        }
+    def create_notification(self, notification_type, title, message, user_id, data=None):
+        """Сохраняет уведомление и возвращает его в формате сообщения WebSocket."""
+        notification = Notification.objects.create(
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            data=data or {}
+        )
+        self.invalidate_unread_count(user_id)
+        return notification.to_payload()
+
+    def get_unread_count(self, user_id):
+        """
+        Количество непрочитанных уведомлений из кеша (при промахе — подсчет по индексу).
+
+        Ключ счетчика содержит версию, которую меняет каждая инвалидация. Если
+        уведомление зафиксировано между подсчетом и записью в кеш, устаревшее
+        значение попадает под прежнюю версию и больше не читается.
+        """
+        key = self._unread_count_key(user_id, self._get_unread_version(user_id))
+        count = cache.get(key)
+        if count is None:
+            count = self.count_unread(user_id)
+            cache.add(key, count, timeout=settings.NOTIFICATION_UNREAD_CACHE_TIMEOUT)
+        return count
+
+    def count_unread(self, user_id):
+        """Количество непрочитанных уведомлений без кеша (по индексу user, read, id)."""
+        return Notification.objects.filter(user_id=user_id, read=False).count()
+
+    def invalidate_unread_count(self, user_id):
+        """Сбрасывает закешированный счетчик (меняет его версию) после фиксации транзакции."""
+        transaction.on_commit(lambda: cache.set(
+            self._unread_version_key(user_id),
+            time.time_ns(),
+            timeout=settings.NOTIFICATION_UNREAD_CACHE_TIMEOUT
+        ))
+
+    def _get_unread_version(self, user_id):
+        """Текущая версия счетчика; создается при первом обращении и после вытеснения."""
+        key = self._unread_version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(key, version, timeout=settings.NOTIFICATION_UNREAD_CACHE_TIMEOUT):
+                version = cache.get(key, version)
+        return version
+
+    def _unread_version_key(self, user_id):
+        return f'blog:notifications:unread-version:{user_id}'
+
+    def _unread_count_key(self, user_id, version):
+        return f'blog:notifications:unread:{user_id}:{version}'
+
+    def mark_read(self, user_id, ids=None, up_to_id=None):
+        """Отмечает прочитанными уведомления пользователя (все, по списку id или до id включительно)."""
+        notifications = Notification.objects.filter(user_id=user_id, read=False)
+        if ids is not None:
+            notifications = notifications.filter(id__in=ids)
+        if up_to_id is not None:
+            notifications = notifications.filter(id__lte=up_to_id)
+        updated = notifications.update(read=True)
+        if updated:
+            self.invalidate_unread_count(user_id)
+        return updated
+
+    def get_missed_notifications(self, user_id, last_id, limit=None):
+        """Непрочитанные уведомления после last_id — один диапазон по индексу (user, read, id)."""
+        limit = limit or settings.NOTIFICATION_REPLAY_LIMIT
+        notifications = Notification.objects.filter(
+            user_id=user_id,
+            read=False,
+            id__gt=last_id
+        ).order_by('id')[:limit]
+        return [notification.to_payload() for notification in notifications]
 
     def send_notification_to_user(self, user_id, notification):
         """Отправляет уведомление конкретному пользователю."""
@@ -34,42 +103,88 @@ class NotificationService:
                 }
             )
 
+    def enqueue_notification(self, user_id, notification):
+        """
+        Записывает уведомление в outbox в текущей транзакции.
+
+        Отправка в слой каналов происходит после коммита и не задерживает запрос;
+        если она не удалась, уведомление остается в outbox для повторной отправки.
+        """
+        NotificationOutbox.objects.create(user_id=user_id, payload=notification)
+        transaction.on_commit(outbox_dispatcher.wake)
+
+    def bulk_notify(self, notifications, notification_type='info', chunk_size=1000):
+        """
+        Сохраняет и ставит в outbox пачку уведомлений [(user_id, title, message), ...].
+
+        Используется массовыми операциями вместо create_notification и
+        enqueue_notification для каждого уведомления.
+        """
+        if not notifications:
+            return
+        created = Notification.objects.bulk_create(
+            (
+                Notification(user_id=user_id, notification_type=notification_type, title=title, message=message)
+                for user_id, title, message in notifications
+            ),
+            batch_size=chunk_size
+        )
+        NotificationOutbox.objects.bulk_create(
+            (
+                NotificationOutbox(user_id=notification.user_id, payload=notification.to_payload())
+                for notification in created
+            ),
+            batch_size=chunk_size
+        )
+        for user_id in {notification.user_id for notification in created}:
+            self.invalidate_unread_count(user_id)
+        transaction.on_commit(outbox_dispatcher.wake)
+
+    @staticmethod
+    def comment_notification_text(author_username, post_title, is_reply=False):
+        """Заголовок и текст уведомления о новом комментарии или ответе."""
+        if is_reply:
+            return 'Ответ на комментарий', f'{author_username} ответил на ваш комментарий в посте "{post_title}"'
+        return 'Новый комментарий', f'{author_username} оставил комментарий к вашему посту "{post_title}"'
+
     def notify_comment_on_post(self, comment):
-        """Уведомление о новом комментарии к посту."""
-        post_author = comment.post.author
+        """Уведомление о новом комментарии к посту (comment с загруженными author и post)."""
+        post_author_id = comment.post.author_id
 
         # Не уведомляем автора о собственных комментариях
-        if post_author.id == comment.author.id:
+        if post_author_id == comment.author_id:
             return
 
+        title, message = self.comment_notification_text(comment.author.username, comment.post.title)
         notification = self.create_notification(
             notification_type='info',
-            title='Новый комментарий',
-            message=f'{comment.author.username} оставил комментарий к вашему посту "{comment.post.title}"',
-            user_id=post_author.id
+            title=title,
+            message=message,
+            user_id=post_author_id
         )
 
-        self.send_notification_to_user(post_author.id, notification)
+        self.enqueue_notification(post_author_id, notification)
 
     def notify_reply_to_comment(self, reply):
-        """Уведомление о ответе на комментарий."""
-        if not reply.parent:
+        """Уведомление о ответе на комментарий (reply с загруженными author, post и parent)."""
+        if not reply.parent_id:
             return
 
-        parent_author = reply.parent.author
+        parent_author_id = reply.parent.author_id
 
         # Не уведомляем автора о собственных ответах
-        if parent_author.id == reply.author.id:
+        if parent_author_id == reply.author_id:
             return
 
+        title, message = self.comment_notification_text(reply.author.username, reply.post.title, is_reply=True)
         notification = self.create_notification(
             notification_type='info',
-            title='Ответ на комментарий',
-            message=f'{reply.author.username} ответил на ваш комментарий в посте "{reply.post.title}"',
-            user_id=parent_author.id
+            title=title,
+            message=message,
+            user_id=parent_author_id
         )
 
-        self.send_notification_to_user(parent_author.id, notification)
+        self.enqueue_notification(parent_author_id, notification)
 
 
 # Создаем глобальный экземпляр сервиса
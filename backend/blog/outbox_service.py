@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Отправка уведомлений из таблицы NotificationOutbox в слой каналов.
+
+    Строки забираются пачками с арендой (locked_until), поэтому несколько
+    диспетчеров (в процессах сервера и команда dispatch_notifications)
+    не отправляют одно уведомление дважды. Отправка идет параллельно,
+    но не более NOTIFICATION_OUTBOX_CONCURRENCY group_send одновременно.
+
+    После коммита wake() запускает разбор очереди задачей в цикле событий
+    сервера, где подключены консьюмеры, а в процессах без консьюмеров —
+    в фоновом потоке.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._task = None
+        self._rerun = False
+        self._thread = None
+        self._thread_event = threading.Event()
+
+    @property
+    def batch_size(self):
+        return settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+
+    @property
+    def concurrency(self):
+        return settings.NOTIFICATION_OUTBOX_CONCURRENCY
+
+    # Запуск после коммита
+
+    def attach_loop(self, loop):
+        """Запоминает цикл событий, в котором работают консьюмеры (вызывается при подключении)."""
+        self._loop = loop
+
+    def wake(self):
+        """Запускает отправку накопившихся уведомлений, не дожидаясь ее завершения."""
+        if not settings.NOTIFICATION_OUTBOX_INLINE_DISPATCH:
+            return
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._start_task)
+        else:
+            self._start_thread()
+
+    def _start_task(self):
+        if self._task is not None and not self._task.done():
+            # Задача уже работает: после текущего прохода она заберет и новые строки
+            self._rerun = True
+            return
+        self._task = asyncio.ensure_future(self._run_task())
+
+    async def _run_task(self):
+        self._rerun = True
+        while self._rerun:
+            self._rerun = False
+            try:
+                await self.adrain()
+            except Exception:
+                logger.exception('Ошибка отправки уведомлений из outbox')
+
+    def _start_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run_thread, name='notification-outbox', daemon=True)
+            self._thread.start()
+        self._thread_event.set()
+
+    def _run_thread(self):
+        while True:
+            self._thread_event.wait()
+            self._thread_event.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception('Ошибка отправки уведомлений из outbox')
+            finally:
+                close_old_connections()
+
+    # Разбор очереди
+
+    def drain(self):
+        """Синхронно отправляет все доступные уведомления, возвращает число отправленных."""
+        return async_to_sync(self.adrain)()
+
+    async def adrain(self):
+        sent_total = 0
+        while True:
+            batch = await database_sync_to_async(self._claim)()
+            if not batch:
+                return sent_total
+            sent, failed = await self._send_batch(batch)
+            await database_sync_to_async(self._acknowledge)(sent, failed)
+            sent_total += len(sent)
+            if len(batch) < self.batch_size:
+                return sent_total
+
+    def _claim(self):
+        """Забирает пачку строк, берет их в аренду и возвращает их."""
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                NotificationOutbox.objects
+                .select_for_update(skip_locked=True)
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+                .filter(attempts__lt=settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS)
+                .order_by('id')[:self.batch_size]
+            )
+            if batch:
+                NotificationOutbox.objects.filter(pk__in=[row.pk for row in batch]).update(
+                    locked_until=now + timedelta(seconds=settings.NOTIFICATION_OUTBOX_LEASE)
+                )
+        return batch
+
+    async def _send_batch(self, batch):
+        channel_layer = get_channel_layer()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(row):
+            async with semaphore:
+                await channel_layer.group_send(
+                    f'user_{row.user_id}',
+                    {
+                        'type': 'notification_message',
+                        'notification': row.payload
+                    }
+                )
+
+        results = await asyncio.gather(*(send(row) for row in batch), return_exceptions=True)
+        sent, failed = [], []
+        for row, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                failed.append((row, result))
+            else:
+                sent.append(row.pk)
+        return sent, failed
+
+    def _acknowledge(self, sent, failed):
+        """Удаляет отправленные строки, неотправленные откладывает на повтор."""
+        NotificationOutbox.objects.filter(pk__in=sent).delete()
+        now = timezone.now()
+        for row, error in failed:
+            logger.warning('Не удалось отправить уведомление #%s: %s', row.pk, error)
+            attempts = row.attempts + 1
+            NotificationOutbox.objects.filter(pk=row.pk).update(
+                attempts=attempts,
+                last_error=repr(error),
+                locked_until=now + timedelta(seconds=settings.NOTIFICATION_OUTBOX_RETRY_DELAY * attempts)
+            )
+
+
+outbox_dispatcher = OutboxDispatcher()
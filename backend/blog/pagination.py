@@ -0,0 +1,209 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация по полям сортировки с добавлением id.
+
+    Курсор хранит значения всех полей сортировки граничной записи, поэтому
+    следующая страница выбирается условием WHERE по индексу, без OFFSET и COUNT(*).
+    Сортировка берется из OrderingFilter представления, затем из атрибута
+    ordering представления, затем из Meta.ordering модели. Кроме полей модели
+    можно сортировать по аннотациям queryset (например, релевантности поиска).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at',)
+    tiebreaker_field = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений: страница загружается async ORM."""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([item async for item in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Queryset страницы по курсору (без выполнения запроса) или None без пагинации."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            self.reverse, self.position = False, None
+        else:
+            self.reverse, self.position = self.cursor
+
+        order = [self._invert(field) for field in self.ordering] if self.reverse else list(self.ordering)
+        queryset = queryset.order_by(*order)
+        if self.position is not None:
+            queryset = queryset.filter(self._get_keyset_filter(order, self.position))
+
+        # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        """Запоминает загруженную страницу и наличие соседних страниц."""
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """Возвращает сортировку с уникальным id в конце для стабильного курсора."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        if not ordering:
+            ordering = (
+                getattr(view, 'ordering', None)
+                or queryset.query.order_by
+                or queryset.model._meta.ordering
+                or self.ordering
+            )
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        ordering = [field for field in ordering if isinstance(field, str)]
+        for field in ordering:
+            assert '__' not in field, (
+                'Курсорная пагинация не поддерживает сортировку по связанным полям: '
+                f'"{field}".'
+            )
+
+        field_names = {field.lstrip('-') for field in ordering}
+        if self.tiebreaker_field not in field_names and 'pk' not in field_names:
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append(f'-{self.tiebreaker_field}' if descending else self.tiebreaker_field)
+        return tuple(ordering)
+
+    def decode_cursor(self, request):
+        """Декодирует курсор из query-параметра в пару (reverse, position)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverse = bool(data['r'])
+            raw_position = data['p']
+            # Поля сортировки не допускают NULL: None в курсоре — подделка
+            if len(raw_position) != len(self.ordering) or None in raw_position:
+                raise ValueError
+            position = [
+                self._get_field(field).to_python(value)
+                for field, value in zip(self.ordering, raw_position)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def encode_cursor(self, reverse, position):
+        """Кодирует курсор и возвращает ссылку на страницу."""
+        data = {'r': int(reverse), 'p': position}
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(data, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self._get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self._get_position(self.page[0]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_html_context(self):
+        return {
+            'previous_url': self.get_previous_link(),
+            'next_url': self.get_next_link(),
+        }
+
+    def _get_field(self, ordering_field):
+        name = ordering_field.lstrip('-')
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        if name == 'pk':
+            return self.model._meta.pk
+        return self.model._meta.get_field(name)
+
+    def _get_attname(self, ordering_field):
+        """Имя атрибута записи и поля в условии WHERE для поля сортировки."""
+        name = ordering_field.lstrip('-')
+        if name in self.annotations:
+            return name
+        return self._get_field(ordering_field).attname
+
+    def _get_position(self, instance):
+        """Значения полей сортировки записи в JSON-совместимом виде."""
+        position = []
+        for ordering_field in self.ordering:
+            value = getattr(instance, self._get_attname(ordering_field))
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return position
+
+    def _get_keyset_filter(self, order, position):
+        """
+        Строит условие (a > x) OR (a = x AND b > y) OR ... для позиции курсора
+        с учетом направления сортировки каждого поля.
+        """
+        condition = Q()
+        equal = Q()
+        for ordering_field, value in zip(order, position):
+            name = self._get_attname(ordering_field)
+            lookup = 'lt' if ordering_field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
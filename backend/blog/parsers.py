@@ -0,0 +1,35 @@
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, MultiPartParser
+
+from .import_service import parse_ndjson
+from .uploads import UploadValidationHandler
+
+
+class NDJSONParser(BaseParser):
+    """Разбирает тело запроса в формате NDJSON в список объектов."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return parse_ndjson(stream)
+        except ValidationError as e:
+            raise ParseError(' '.join(e.messages))
+
+
+class UploadMultiPartParser(MultiPartParser):
+    """
+    multipart/form-data с проверкой файлов во время приема (см. uploads.py).
+
+    Для view с атрибутом upload_file_types ({поле: допустимые типы файлов})
+    файлы принимает только UploadValidationHandler; для остальных view —
+    стандартные обработчики загрузки Django.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        file_types = getattr(parser_context.get('view'), 'upload_file_types', None)
+        if file_types is not None:
+            request = parser_context['request']._request
+            request.upload_handlers = [UploadValidationHandler(request, file_types)]
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+
+from .fieldsets import FieldSelection
+from .models import Post, Comment
+
+
+def comment_queryset(queryset, selection=None, with_post=True):
+    """
+    Подгружает для комментариев только то, что нужно выбранным полям CommentSerializer.
+
+    with_post=False — комментарии выбираются через пост (prefetch или
+    related manager), и Django уже подставил его в comment.post.
+    """
+    selection = selection or FieldSelection()
+    related = []
+    if selection.includes('author') or selection.includes('author_username'):
+        related.append('author')
+    if with_post and selection.includes('post_title'):
+        related.append('post')
+    if related:
+        queryset = queryset.select_related(*related)
+    if not selection.includes('content'):
+        queryset = queryset.defer('content')
+    if selection.includes('attachments'):
+        queryset = queryset.prefetch_related('attachments')
+    if selection.expands('replies'):
+        replies = comment_queryset(
+            Comment.objects.filter(is_deleted=False),
+            selection.nested('replies')
+        ).order_by('created_at', 'id')
+        queryset = queryset.prefetch_related(Prefetch('replies', queryset=replies, to_attr='visible_replies'))
+    return queryset
+
+
+def post_comments_queryset(post, selection=None):
+    """Комментарии верхнего уровня поста для детального просмотра (поле comments)."""
+    return comment_queryset(post.comments.filter(
+        parent=None,
+        is_deleted=False
+    ), selection, with_post=False).order_by('created_at')
+
+
+def recent_comments_prefetch(limit=None, to_attr='recent_top_comments', selection=None):
+    """
+    Prefetch последних N комментариев верхнего уровня для страницы постов.
+
+    Комментарии всех постов страницы выбираются одним запросом с
+    ROW_NUMBER() OVER (PARTITION BY post_id ...) по частичному индексу
+    comment_post_root_idx; количество ответов берется из сохраненного счетчика.
+    """
+    if limit is None:
+        limit = settings.RECENT_COMMENTS_LIMIT
+
+    queryset = Comment.objects.filter(
+        is_deleted=False,
+        parent__isnull=True
+    ).annotate(
+        row_number=Window(
+            RowNumber(),
+            partition_by=F('post_id'),
+            order_by=[F('created_at').desc(), F('id').desc()]
+        )
+    ).filter(
+        row_number__lte=limit
+    ).order_by('-created_at', '-id')
+
+    queryset = comment_queryset(queryset, selection, with_post=False)
+    return Prefetch('comments', queryset=queryset, to_attr=to_attr)
+
+
+def post_list_queryset(recent_comments_limit=None, selection=None):
+    """
+    Queryset постов для лент и детального просмотра.
+
+    Связи, prefetch и тяжелые столбцы загружаются только для полей,
+    выбранных параметром fields (по умолчанию — все поля PostSerializer).
+    """
+    selection = selection or FieldSelection()
+    queryset = Post.objects.all()
+    if selection.includes('author') or selection.includes('author_username'):
+        queryset = queryset.select_related('author')
+    if not selection.includes('content'):
+        queryset = queryset.defer('content')
+    if selection.includes('attachments'):
+        queryset = queryset.prefetch_related('attachments')
+    if selection.includes('recent_comments'):
+        queryset = queryset.prefetch_related(
+            recent_comments_prefetch(recent_comments_limit, selection=selection.nested('recent_comments'))
+        )
+    return queryset
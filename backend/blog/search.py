@@ -0,0 +1,141 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+На PostgreSQL в таблицах blog_post и blog_comment хранится столбец
+search_vector (tsvector), который заполняет триггер при INSERT и при
+изменении текста; заголовок поста имеет вес A, содержимое — вес B.
+По столбцу построен GIN-индекс, а для коротких запросов (набираемое слово,
+опечатки) — триграммный GIN-индекс pg_trgm.
+
+На SQLite (тесты, локальная разработка) тот же поиск работает через
+внешние таблицы FTS5 (blog_post_fts, blog_comment_fts), которые
+поддерживаются триггерами, а релевантность считается функцией bm25.
+
+Столбец и таблицы создаются миграцией 0009_search_index (там же хранится
+их DDL) и не описаны в моделях, поэтому ORM не загружает tsvector вместе
+с записями. После смены SEARCH_CONFIG триггеры пересоздает команда
+rebuild_search_index.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from rest_framework import filters
+
+# Имя аннотации с релевантностью: по ней сортируются результаты поиска
+SEARCH_RANK = 'search_rank'
+
+# Веса полей как в ts_rank по умолчанию: {D, C, B, A}
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+# Индексируемые поля таблиц (как в миграции 0009_search_index): (поле, вес) и поле для триграммного поиска
+DOCUMENTS = {
+    'blog_post': {'fields': (('title', 'A'), ('content', 'B')), 'trigram_field': 'title'},
+    'blog_comment': {'fields': (('content', 'A'),), 'trigram_field': 'content'},
+}
+
+
+def _search_config():
+    config = settings.SEARCH_CONFIG
+    if not re.fullmatch(r'[a-z_][a-z0-9_]*', config):
+        raise ValueError(f'Недопустимая конфигурация полнотекстового поиска: {config}')
+    return config
+
+
+def _is_short_query(text):
+    """Короткий запрос из одного слова: пользователь еще набирает его или ошибся в написании."""
+    return ' ' not in text and len(text) <= settings.SEARCH_SHORT_QUERY_LENGTH
+
+
+# PostgreSQL
+
+def _pg_search(queryset, text):
+    table = queryset.model._meta.db_table
+    vector = RawSQL(f'"{table}"."search_vector"', [], output_field=SearchVectorField())
+    query = SearchQuery(text, config=_search_config(), search_type='websearch')
+    rank = SearchRank(vector, query)
+    condition = Q(_search_vector=query)
+
+    if _is_short_query(text):
+        # Незаконченное слово или опечатка не совпадет с лексемой: добавляем триграммное сходство (оператор %>)
+        field = DOCUMENTS[table]['trigram_field']
+        condition |= Q(**{f'{field}__trigram_word_similar': text})
+        rank = Greatest(rank, TrigramWordSimilarity(text, field))
+
+    return queryset.alias(_search_vector=vector).filter(condition).annotate(**{SEARCH_RANK: rank})
+
+
+# SQLite
+
+def _fts_match(text):
+    """Запрос FTS5 из слов пользователя: каждое слово в кавычках, короткое — как префикс."""
+    words = ['"%s"' % word.replace('"', '""') for word in text.split()]
+    if _is_short_query(text):
+        words[0] += '*'
+    return ' '.join(words)
+
+
+def _sqlite_search(queryset, text):
+    table = queryset.model._meta.db_table
+    fts = f'{table}_fts'
+    match = _fts_match(text)
+    weights = ', '.join(str(WEIGHTS[weight]) for _, weight in DOCUMENTS[table]['fields'])
+    # bm25 тем меньше, чем документ релевантнее: меняем знак, чтобы сортировать как ts_rank
+    rank = RawSQL(
+        f'SELECT -bm25({fts}, {weights}) FROM {fts} WHERE {fts} MATCH %s AND rowid = "{table}"."id"',
+        [match],
+        output_field=FloatField()
+    )
+    matched_ids = RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match])
+    return queryset.filter(id__in=matched_ids).annotate(**{SEARCH_RANK: rank})
+
+
+# Поиск по СУБД (столбцы, таблицы и триггеры создает миграция 0009_search_index)
+BACKENDS = {
+    'postgresql': _pg_search,
+    'sqlite': _sqlite_search,
+}
+
+
+def search(queryset, text):
+    """
+    Фильтрует queryset постов или комментариев по поисковому запросу
+    и добавляет аннотацию SEARCH_RANK (больше — релевантнее).
+
+    Возвращает None, если для СУБД или модели полнотекстовый поиск недоступен.
+    """
+    backend = BACKENDS.get(connections[queryset.db].vendor)
+    if backend is None or queryset.model._meta.db_table not in DOCUMENTS:
+        return None
+    return backend(queryset, text)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Поиск по параметру search через полнотекстовый индекс.
+
+    На СУБД без полнотекстового индекса используется обычный SearchFilter
+    по search_fields представления.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = ' '.join(request.query_params.get(self.search_param, '').replace('\x00', '').split())
+        if not text:
+            return queryset
+        result = search(queryset, text)
+        if result is None:
+            return super().filter_queryset(request, queryset, view)
+        return result
+
+
+class SearchRankOrderingFilter(filters.OrderingFilter):
+    """Без явного параметра ordering результаты поиска сортируются по релевантности."""
+
+    def get_ordering(self, request, queryset, view):
+        if SEARCH_RANK in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return [f'-{SEARCH_RANK}', *(self.get_default_ordering(view) or [])]
+        return super().get_ordering(request, queryset, view)
@@ -1,17 +1,60 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import Post, PostAttachment, Comment, CommentAttachment, CommentTree
+from .fieldsets import SparseFieldsetMixin
+from .models import Post, PostAttachment, Comment, CommentAttachment, CommentTree, Notification
+from .querysets import comment_queryset, post_comments_queryset
+from .uploads import IMAGE, file_type_by_name, format_size, max_upload_size
 from .validators import HTMLValidator
 from drf_yasg.utils import swagger_serializer_method
 
 
-class PostAttachmentSerializer(serializers.ModelSerializer):
+class HTMLContentField(serializers.CharField):
+    """
+    Текст с базовым HTML-форматированием.
+
+    Разметка проверяется HTMLValidator один раз, и сохраняется ее
+    нормализованный вариант (валидаторы поля модели сериализатор не повторяет).
+    """
+    html_validator = HTMLValidator()
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        try:
+            return self.html_validator.clean(value)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
+
+class ThumbnailUrlsMixin(serializers.Serializer):
+    """URL миниатюры в JPEG и srcset с вариантами в современном формате."""
+    thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+
+    def _build_url(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    @swagger_serializer_method(serializer_or_field=serializers.URLField)
+    def get_thumbnail_url(self, obj):
+        """Возвращает URL миниатюры."""
+        return self._build_url(obj.thumbnail.url) if obj.thumbnail else None
+
+    @swagger_serializer_method(serializer_or_field=serializers.CharField)
+    def get_thumbnail_srcset(self, obj):
+        """Возвращает URL вариантов миниатюры в формате атрибута srcset."""
+        return obj.thumbnail_srcset(self._build_url)
+
+
+class PostAttachmentSerializer(SparseFieldsetMixin, ThumbnailUrlsMixin, serializers.ModelSerializer):
     """Сериализатор для чтения вложений к постам."""
     file_url = serializers.SerializerMethodField()
-    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = PostAttachment
-        fields = ['id', 'file_type', 'file_url', 'thumbnail_url', 'uploaded_at']
+        fields = [
+            'id', 'file_type', 'file_url', 'thumbnail_url', 'thumbnail_srcset',
+            'thumbnail_status', 'uploaded_at'
+        ]
         read_only_fields = fields
 
     @swagger_serializer_method(serializer_or_field=serializers.URLField)
@@ -22,14 +65,6 @@ class PostAttachmentSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return obj.file.url if obj.file else None
 
-    @swagger_serializer_method(serializer_or_field=serializers.URLField)
-    def get_thumbnail_url(self, obj):
-        """Возвращает URL миниатюры."""
-        request = self.context.get('request')
-        if obj.thumbnail and request:
-            return request.build_absolute_uri(obj.thumbnail.url)
-        return obj.thumbnail.url if obj.thumbnail else None
-
 
 class PostAttachmentCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания вложений к постам."""
@@ -39,31 +74,34 @@ class PostAttachmentCreateSerializer(serializers.ModelSerializer):
         fields = ['file']
         extra_kwargs = {
             'file': {
-                'help_text': 'Файл для загрузки (jpg, jpeg, png, gif, txt), макс. 100KB'
+                'help_text': 'Файл для загрузки (jpg, jpeg, png, gif, txt), макс. 100KB для txt и 5MB для изображений'
             }
         }
 
     def validate_file(self, value):
-        """Дополнительная валидация файла."""
-        if value.size > 100 * 1024:  # 100 КБ
-            raise serializers.ValidationError('Размер файла не должен превышать 100 КБ.')
-
-        ext = value.name.split('.')[-1].lower()
-        if ext not in ['jpg', 'jpeg', 'png', 'gif', 'txt']:
+        """
+        Дополнительная валидация файла (для загрузок через UploadMultiPartParser
+        размер и содержимое уже проверены при приеме).
+        """
+        file_type = getattr(value, 'file_type', None) or file_type_by_name(value.name)
+        if file_type is None:
             raise serializers.ValidationError(
                 'Недопустимое расширение файла. Разрешены: jpg, jpeg, png, gif, txt'
             )
+
+        max_size = max_upload_size(file_type)
+        if value.size > max_size:
+            raise serializers.ValidationError(f'Размер файла не должен превышать {format_size(max_size)}.')
         return value
 
 
-class CommentAttachmentSerializer(serializers.ModelSerializer):
+class CommentAttachmentSerializer(SparseFieldsetMixin, ThumbnailUrlsMixin, serializers.ModelSerializer):
     """Сериализатор для чтения вложений к комментариям."""
     image_url = serializers.SerializerMethodField()
-    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = CommentAttachment
-        fields = ['id', 'image_url', 'thumbnail_url', 'uploaded_at']
+        fields = ['id', 'image_url', 'thumbnail_url', 'thumbnail_srcset', 'thumbnail_status', 'uploaded_at']
         read_only_fields = fields
 
     @swagger_serializer_method(serializer_or_field=serializers.URLField)
@@ -74,53 +112,78 @@ class CommentAttachmentSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return obj.image.url if obj.image else None
 
-    @swagger_serializer_method(serializer_or_field=serializers.URLField)
-    def get_thumbnail_url(self, obj):
-        """Возвращает URL миниатюры."""
-        request = self.context.get('request')
-        if obj.thumbnail and request:
-            return request.build_absolute_uri(obj.thumbnail.url)
-        return obj.thumbnail.url if obj.thumbnail else None
 
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для комментариев.
 
-class CommentSerializer(serializers.ModelSerializer):
-    """Сериализатор для комментариев."""
+    Поддерживает ?fields= и ?expand=replies (ответы на комментарий).
+    """
     author = serializers.StringRelatedField(read_only=True)
     author_username = serializers.CharField(source='author.username', read_only=True)
     attachments = CommentAttachmentSerializer(many=True, read_only=True)
-    replies_count = serializers.SerializerMethodField()
     post_title = serializers.CharField(source='post.title', read_only=True)
     post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())
+    content = HTMLContentField(help_text='Текст комментария с базовым HTML-форматированием')
+    replies = serializers.SerializerMethodField()
+    expandable_fields = ('replies',)
 
     class Meta:
         model = Comment
         fields = [
             'id', 'author', 'author_username', 'content', 'created_at', 'updated_at',
             'parent', 'post', 'post_title', 'is_deleted',
-            'attachments', 'replies_count'
+            'attachments', 'replies_count', 'replies'
         ]
         read_only_fields = ['author', 'author_username', 'created_at', 'updated_at',
-                            'replies_count', 'post_title', 'attachments']
+                            'replies_count', 'post_title', 'attachments', 'replies']
         extra_kwargs = {
-            'content': {'help_text': 'Текст комментария с базовым HTML-форматированием'},
             'parent': {'help_text': 'Родительский комментарий (если это ответ)'},
             'post': {'help_text': 'Связанный пост'},
             'is_deleted': {'help_text': 'Флаг мягкого удаления'}
         }
 
-    @swagger_serializer_method(serializer_or_field=serializers.IntegerField)
-    def get_replies_count(self, obj):
-        """Возвращает количество ответов на комментарий."""
-        return obj.replies.filter(is_deleted=False).count()
+    @swagger_serializer_method(serializer_or_field=serializers.ListField(child=serializers.DictField()))
+    def get_replies(self, obj):
+        """Неудаленные ответы на комментарий (только при expand=replies)."""
+        selection = self.selection.nested('replies')
+        replies = getattr(obj, 'visible_replies', None)
+        if replies is None:
+            replies = comment_queryset(
+                obj.replies.filter(is_deleted=False), selection
+            ).order_by('created_at', 'id')
+        return CommentSerializer(replies, many=True, context=self.context, selection=selection).data
 
+    def validate(self, attrs):
+        """Родительский комментарий должен относиться к тому же посту."""
+        parent = attrs.get('parent', getattr(self.instance, 'parent', None))
+        post = attrs.get('post', getattr(self.instance, 'post', None))
+        if parent and post and parent.post_id != post.pk:
+            raise serializers.ValidationError({'parent': Comment.OTHER_POST_PARENT_MESSAGE})
+        return attrs
 
-class PostSerializer(serializers.ModelSerializer):
-    """Сериализатор для постов."""
+    def validate_parent(self, value):
+        """Запрещает делать комментарий ответом на собственный ответ."""
+        if value and self.instance and CommentTree.objects.filter(
+            ancestor=self.instance,
+            comment=value
+        ).exists():
+            raise serializers.ValidationError('Комментарий нельзя сделать ответом на собственный ответ.')
+        return value
+
+
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для постов.
+
+    Поддерживает ?fields= и раскрытие полей вложенных комментариев
+    (например, ?expand=recent_comments.replies).
+    """
     author = serializers.StringRelatedField(read_only=True)
     author_username = serializers.CharField(source='author.username', read_only=True)
     attachments = PostAttachmentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
     recent_comments = serializers.SerializerMethodField()
+    content = HTMLContentField(help_text='Текст поста с базовым HTML-форматированием')
 
     class Meta:
         model = Post
@@ -133,20 +196,19 @@ class PostSerializer(serializers.ModelSerializer):
                             'comments_count', 'recent_comments']
         extra_kwargs = {
             'title': {'help_text': 'Заголовок поста'},
-            'content': {'help_text': 'Текст поста с базовым HTML-форматированием'},
             'is_published': {'help_text': 'Флаг публикации поста'}
         }
 
-    @swagger_serializer_method(serializer_or_field=serializers.IntegerField)
-    def get_comments_count(self, obj):
-        """Возвращает количество комментариев к посту."""
-        return obj.comments.filter(is_deleted=False).count()
-
     @swagger_serializer_method(serializer_or_field=CommentSerializer(many=True))
     def get_recent_comments(self, obj):
         # Используем prefetch_related данные из recent_top_comments
         if hasattr(obj, 'recent_top_comments'):
-            return CommentSerializer(obj.recent_top_comments, many=True, context=self.context).data
+            return CommentSerializer(
+                obj.recent_top_comments,
+                many=True,
+                context=self.context,
+                selection=self.selection.nested('recent_comments')
+            ).data
         return []
 
     def validate_title(self, value):
@@ -159,9 +221,7 @@ class PostSerializer(serializers.ModelSerializer):
         return value
 
     def validate_content(self, value):
-        """Проверяет валидность содержания."""
-        validator = HTMLValidator()
-        validator(value)
+        """Проверяет валидность содержания (разметку уже проверил HTMLContentField)."""
         value = value.strip()
         if not value:
             raise serializers.ValidationError('Содержание не может быть пустым.')
@@ -178,11 +238,12 @@ class PostDetailSerializer(PostSerializer):
     @swagger_serializer_method(serializer_or_field=CommentSerializer(many=True))
     def get_comments(self, obj):
         """Возвращает все комментарии поста с древовидной структурой."""
-        root_comments = obj.comments.filter(
-            parent=None,
-            is_deleted=False
-        ).order_by('created_at')
-        return CommentSerializer(root_comments, many=True, context=self.context).data
+        selection = self.selection.nested('comments')
+        # Асинхронное представление загружает комментарии заранее (async ORM)
+        root_comments = getattr(obj, 'root_comments', None)
+        if root_comments is None:
+            root_comments = post_comments_queryset(obj, selection)
+        return CommentSerializer(root_comments, many=True, context=self.context, selection=selection).data
 
 
 class CommentAttachmentCreateSerializer(serializers.ModelSerializer):
@@ -202,10 +263,10 @@ class CommentAttachmentCreateSerializer(serializers.ModelSerializer):
 
     def validate_image(self, value):
         """Дополнительная валидация изображения."""
-        max_size = 5 * 1024 * 1024  # 5 МБ
+        max_size = max_upload_size(IMAGE)
         if value.size > max_size:
             raise serializers.ValidationError(
-                f'Размер изображения не должен превышать {max_size // (1024 * 1024)} МБ.'
+                f'Размер изображения не должен превышать {format_size(max_size)}.'
             )
 
         ext = value.name.split('.')[-1].lower()
@@ -224,6 +285,40 @@ class CommentAttachmentCreateSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class NotificationSerializer(serializers.ModelSerializer):
+    """Сериализатор уведомлений (тот же формат, что и в сообщениях WebSocket)."""
+    type = serializers.CharField(source='notification_type', read_only=True)
+    timestamp = serializers.DateTimeField(source='created_at', read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'type', 'title', 'message', 'timestamp', 'read', 'data']
+        read_only_fields = fields
+
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    """Параметры массовой отметки уведомлений прочитанными."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=1000,
+        help_text='ID уведомлений'
+    )
+    up_to_id = serializers.IntegerField(
+        required=False,
+        help_text='Отметить все уведомления с id не больше указанного'
+    )
+    all = serializers.BooleanField(
+        default=False,
+        help_text='Отметить все уведомления'
+    )
+
+    def validate(self, attrs):
+        if not attrs['all'] and 'ids' not in attrs and 'up_to_id' not in attrs:
+            raise serializers.ValidationError('Укажите ids, up_to_id или all.')
+        return attrs
+
+
 class CommentTreeSerializer(serializers.Serializer):
     """Сериализатор для дерева комментариев."""
     comment_id = serializers.IntegerField(help_text='ID комментария')
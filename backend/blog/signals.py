@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Comment
+from .cache import listing_cache
+from .metrics import count_queries
+from .models import Post, PostAttachment, Comment, CommentAttachment
 from .notification_service import notification_service
+from .thumbnail_service import thumbnail_service
 
 
 @receiver(post_save, sender=Comment)
@@ -10,9 +15,58 @@ def comment_notification_handler(sender, instance, created, **kwargs):
     if not created or instance.is_deleted:
         return
 
-    if instance.parent:
+    # Автор, пост и родитель нужны для текста и получателя: если комментарий
+    # создан по *_id, связи загружаются одним запросом, а не по одной
+    related = ['author', 'post', 'parent'] if instance.parent_id else ['author', 'post']
+    if not all(Comment._meta.get_field(name).is_cached(instance) for name in related):
+        instance = Comment.objects.select_related(*related).get(pk=instance.pk)
+
+    if instance.parent_id:
         # Это ответ на комментарий
         notification_service.notify_reply_to_comment(instance)
     else:
         # Это комментарий к посту
-        notification_service.notify_comment_on_post(instance)
\ No newline at end of file
+        notification_service.notify_comment_on_post(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_counters_handler(sender, instance, origin=None, **kwargs):
+    """
+    Уменьшает счетчики поста и родителя при удалении комментария.
+
+    Сигнал отправляется при любом способе удаления: Comment.delete,
+    QuerySet.delete и каскад от пользователя, поста или родительского
+    комментария (каждый удаленный комментарий вычитает себя сам).
+    """
+    if instance.is_deleted:
+        return
+    # Пост удаляется целиком: его счетчики и счетчики его комментариев не нужны
+    if isinstance(origin, Post) and origin.pk == instance.post_id:
+        return
+    instance._update_counters(-1)
+
+
+@receiver(post_save, sender=PostAttachment)
+@receiver(post_save, sender=CommentAttachment)
+def thumbnail_handler(sender, instance, **kwargs):
+    """Ставит создание миниатюры в фоновую очередь после сохранения нового изображения."""
+    if getattr(instance, '_thumbnail_requested', False):
+        instance._thumbnail_requested = False
+        thumbnail_service.schedule(instance)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=PostAttachment)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=CommentAttachment)
+def listing_cache_invalidation_handler(sender, **kwargs):
+    """Сбрасывает кеш лент после фиксации транзакции с изменением."""
+    transaction.on_commit(listing_cache.invalidate)
+
+
+@receiver(connection_created)
+def query_metrics_handler(sender, connection, **kwargs):
+    """Подключает подсчет SQL-запросов для метрик HTTP-запросов (при переподключении — один раз)."""
+    # В начало списка: connection.execute_wrapper() снимает свою обертку с конца
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
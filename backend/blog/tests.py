@@ -0,0 +1,2168 @@
+import asyncio
+import base64
+import gzip
+import json
+import os
+import re
+import socket
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, views
+from .benchmarks import collect_benchmarks, compare, run_benchmark
+from .cache import listing_cache
+from .channel_layers import MAX_PAYLOAD_SIZE, PostgresChannelLayer
+from .consumers import NotificationConsumer
+from .export_service import post_export_service
+from .fast_serializers import CommentReadSerializer, PostReadSerializer
+from .fieldsets import FieldSelection
+from .imaging import pick_format, render_thumbnails
+from .metrics import request_metrics
+from .models import (
+    Post, PostAttachment, Comment, CommentAttachment, CommentTree, Notification, NotificationOutbox
+)
+from .notification_service import notification_service
+from .outbox_service import outbox_dispatcher
+from .parsers import UploadMultiPartParser
+from .querysets import comment_queryset, post_list_queryset, recent_comments_prefetch
+from .renderers import ORJSONRenderer
+from .serializers import CommentAttachmentSerializer, CommentSerializer, PostSerializer
+from .signals import comment_notification_handler
+from .thread_service import CommentThreadService
+from .thumbnail_service import thumbnail_service
+from .uploads import IMAGE, TEXT
+from .validators import HTMLValidator
+
+User = get_user_model()
+
+
+class CommentCounterTests(TestCase):
+    """Счетчики comments_count поста и replies_count комментария."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>')
+
+    def comment(self, parent=None, **kwargs):
+        return Comment.objects.create(post=self.post, author=self.user, content='Комментарий', parent=parent, **kwargs)
+
+    def assertCounters(self, comments_count, replies=()):
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, comments_count)
+        for comment, count in replies:
+            self.assertEqual(Comment.objects.get(pk=comment.pk).replies_count, count, comment.content)
+
+    def test_create(self):
+        root = self.comment()
+        reply = self.comment(root)
+        self.comment(reply)
+        self.comment(root, is_deleted=True)
+        self.assertCounters(3, [(root, 1), (reply, 1)])
+
+    def test_soft_delete_and_restore(self):
+        root = self.comment()
+        reply = self.comment(root)
+
+        reply.is_deleted = True
+        reply.save()
+        # Повторное сохранение удаленного комментария не меняет счетчики еще раз
+        reply.save()
+        self.assertCounters(1, [(root, 0)])
+
+        reply = Comment.objects.get(pk=reply.pk)
+        reply.is_deleted = False
+        reply.save()
+        self.assertCounters(2, [(root, 1)])
+
+    def test_reparent(self):
+        first, second = self.comment(), self.comment()
+        reply = self.comment(first)
+        self.comment(reply)
+        deleted = self.comment(first, is_deleted=True)
+
+        for comment in (reply, deleted):
+            comment.parent = second
+            comment.save()
+        self.assertCounters(4, [(first, 0), (second, 1), (reply, 1)])
+
+        # Перенос с одновременным удалением
+        reply.parent = first
+        reply.is_deleted = True
+        reply.save()
+        self.assertCounters(3, [(first, 0), (second, 0)])
+
+    def test_hard_delete(self):
+        root = self.comment()
+        reply = self.comment(root)
+        self.comment(reply)
+        self.comment(reply, is_deleted=True)
+        other = self.comment()
+
+        reply.delete()
+        self.assertCounters(2, [(root, 0), (other, 0)])
+        root.delete()
+        self.assertCounters(1)
+
+    def test_queryset_delete(self):
+        """Массовое удаление (действие админки) пересчитывает счетчики."""
+        root = self.comment()
+        replies = [self.comment(root) for _ in range(2)]
+        self.comment(replies[0])
+
+        Comment.objects.filter(pk=replies[0].pk).delete()
+        self.assertCounters(2, [(root, 1)])
+
+    def test_cascade_delete(self):
+        """Каскадное удаление комментариев вместе с пользователем уменьшает счетчики."""
+        commenter = User.objects.create_user(username='commenter', email='commenter@example.com', password='password')
+        root = self.comment()
+        reply = Comment.objects.create(post=self.post, author=commenter, content='Ответ', parent=root)
+        self.comment(reply)
+        Comment.objects.create(post=self.post, author=commenter, content='Удален', parent=root, is_deleted=True)
+        other = self.comment()
+        Comment.objects.create(post=self.post, author=commenter, content='Ответ', parent=other)
+
+        commenter.delete()
+        self.assertCounters(2, [(root, 0), (other, 0)])
+
+    def test_save_without_loaded_state(self):
+        """Экземпляры без значений из from_db (only, созданные с pk) тоже меняют счетчики."""
+        root = self.comment()
+        reply = self.comment(root)
+
+        comment = Comment.objects.only('id', 'post_id', 'parent_id').get(pk=reply.pk)
+        comment.is_deleted = True
+        comment.save()
+        self.assertCounters(1, [(root, 0)])
+
+        Comment(
+            pk=reply.pk, post=self.post, author=self.user, parent=root, content='Комментарий', is_deleted=False
+        ).save()
+        self.assertCounters(2, [(root, 1)])
+        self.assertEqual(CommentTree.objects.filter(comment=reply).count(), 2)
+
+
+class CommentTreeTests(TestCase):
+    """Таблица замыканий при переносе веток и проверки нового родителя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>')
+        cls.other_post = Post.objects.create(author=cls.user, title='Другой пост', content='<p>Текст</p>')
+
+    def comment(self, parent=None, post=None):
+        return Comment.objects.create(
+            post=post or self.post, author=self.user, content='Комментарий', parent=parent
+        )
+
+    @staticmethod
+    def tree_rows():
+        return sorted(CommentTree.objects.values_list('ancestor_id', 'comment_id', 'depth'))
+
+    def assertTreeRebuilt(self):
+        rows = self.tree_rows()
+        call_command('rebuild_comment_tree', stdout=StringIO())
+        self.assertEqual(rows, self.tree_rows())
+
+    def test_move_matches_rebuild(self):
+        first, second = self.comment(), self.comment()
+        reply = self.comment(first)
+        nested = self.comment(reply)
+        self.comment(nested)
+
+        reply.parent = second
+        reply.save()
+        self.assertTreeRebuilt()
+
+        # Ветка становится корнем, затем возвращается на глубину
+        reply.parent = None
+        reply.save()
+        self.assertTreeRebuilt()
+        reply.parent = self.comment(second)
+        reply.save()
+        self.assertTreeRebuilt()
+
+    def test_move_into_own_subtree(self):
+        root = self.comment()
+        reply = self.comment(root)
+        nested = self.comment(reply)
+        rows = self.tree_rows()
+
+        for parent in (reply, nested):
+            root.parent = parent
+            with self.assertRaisesMessage(ValidationError, 'собственный ответ'):
+                root.save()
+        self.assertEqual(rows, self.tree_rows())
+
+        serializer = CommentSerializer(root, data={'parent': nested.pk}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('parent', serializer.errors)
+
+    def test_parent_from_other_post(self):
+        root = self.comment()
+        other = self.comment(post=self.other_post)
+
+        with self.assertRaisesMessage(ValidationError, Comment.OTHER_POST_PARENT_MESSAGE):
+            self.comment(root, post=self.other_post)
+        reply = self.comment(root)
+        reply.parent = other
+        with self.assertRaisesMessage(ValidationError, Comment.OTHER_POST_PARENT_MESSAGE):
+            reply.save()
+        self.assertEqual(Post.objects.get(pk=self.other_post.pk).comments_count, 1)
+
+        comment = Comment(post=self.other_post, author=self.user, content='Комментарий', parent=root)
+        with self.assertRaises(ValidationError):
+            comment.full_clean()
+
+        serializer = CommentSerializer(data={'content': 'Ответ', 'post': self.other_post.pk, 'parent': root.pk})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['parent'], [Comment.OTHER_POST_PARENT_MESSAGE])
+        serializer = CommentSerializer(reply, data={'parent': other.pk}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('parent', serializer.errors)
+
+
+class CommentThreadTests(TestCase):
+    """Ветка комментариев: порядок узлов и ограничения max_depth/max_nodes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>')
+
+        def comment(content, parent=None, **kwargs):
+            return Comment.objects.create(
+                post=cls.post, author=cls.user, content=content, parent=parent, **kwargs
+            )
+
+        cls.root = comment('Корень')
+        cls.first = comment('Первый', cls.root)
+        cls.deleted = comment('Удаленный', cls.root, is_deleted=True)
+        cls.second = comment('Второй', cls.root)
+        comment('Ответ удаленному', cls.deleted)
+        cls.nested = comment('Ответ первому', cls.first)
+        comment('Ответ второму', cls.second)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        # Пользователь попадает в кеш JWT-аутентификации
+        self.addCleanup(cache.clear)
+
+    def get_thread(self, comment, query=''):
+        response = self.client.get(f'/api/comments/{comment.pk}/thread/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    @classmethod
+    def shape(cls, node):
+        return [node['content'], [cls.shape(reply) for reply in node['replies']]]
+
+    def test_subtree_order(self):
+        response = self.get_thread(self.nested)
+        # Ветка строится от корня; ответы удаленного комментария в нее не попадают
+        self.assertEqual(self.shape(response.json()), ['Корень', [
+            ['Первый', [['Ответ первому', []]]],
+            ['Второй', [['Ответ второму', []]]],
+        ]])
+        self.assertNotIn('X-Thread-Truncated', response)
+
+    def test_max_depth(self):
+        response = self.get_thread(self.root, '?max_depth=1')
+        self.assertEqual(self.shape(response.json()), ['Корень', [['Первый', []], ['Второй', []]]])
+        self.assertNotIn('X-Thread-Truncated', response)
+
+    def test_max_nodes(self):
+        # Отбрасываются самые глубокие узлы
+        response = self.get_thread(self.root, '?max_nodes=2')
+        self.assertEqual(self.shape(response.json()), ['Корень', [['Первый', []]]])
+        self.assertEqual(response['X-Thread-Truncated'], 'true')
+
+        # Лимит равен числу загружаемых узлов — обрезки нет (ответ удаленному
+        # комментарию загружается и учитывается в лимите, но в ветку не попадает)
+        response = self.get_thread(self.root, '?max_nodes=6')
+        self.assertEqual(len(response.json()['replies']), 2)
+        self.assertNotIn('X-Thread-Truncated', response)
+
+    def test_limits_clamped_by_settings(self):
+        service = CommentThreadService()
+        with self.settings(COMMENT_THREAD_MAX_NODES=3):
+            comments, truncated = service.get_thread_comments(self.root.pk, max_nodes=100)
+        self.assertEqual([comment.content for comment in comments], ['Корень', 'Первый', 'Второй'])
+        self.assertTrue(truncated)
+
+        # Лимиты читаются при сборке ветки: настройки действуют и на общий экземпляр сервиса
+        with self.settings(COMMENT_THREAD_MAX_DEPTH=1):
+            response = self.get_thread(self.root, '?max_depth=10')
+        self.assertEqual(self.shape(response.json()), ['Корень', [['Первый', []], ['Второй', []]]])
+
+    def test_sparse_fieldset(self):
+        response = self.get_thread(self.root, '?fields=id,content,replies')
+        self.assertEqual(self.shape(response.json()), ['Корень', [
+            ['Первый', [['Ответ первому', []]]],
+            ['Второй', [['Ответ второму', []]]],
+        ]])
+        self.assertEqual(set(response.json()['replies'][0]), {'id', 'content', 'replies'})
+
+        # Поле replies, не указанное в fields, не выводится: в ответе остается только корень
+        response = self.get_thread(self.root, '?fields=id,content')
+        self.assertEqual(response.json(), {'id': self.root.pk, 'content': 'Корень'})
+
+    def test_missing_comment(self):
+        response = self.client.get('/api/comments/0/thread/')
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTests(TestCase):
+    """Курсорная пагинация: переходы по ссылкам, сортировки и некорректные курсоры."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.other = User.objects.create_user(username='other', email='other@example.com', password='password')
+        created_at = timezone.now()
+        cls.posts = []
+        for index in range(7):
+            post = Post.objects.create(
+                author=cls.user,
+                title=f'Пост {index % 3}',
+                # Чем больше повторов слова, тем выше релевантность поиска
+                content='<p>' + ' '.join(['article'] * (index % 4 + 1)) + '</p>',
+                created_at=created_at - timedelta(minutes=index // 2)
+            )
+            cls.posts.append(post)
+        # Одинаковые created_at у пар постов: порядок внутри пары задает id
+        Post.objects.update(updated_at=created_at)
+
+        cls.root = Comment.objects.create(post=cls.posts[0], author=cls.user, content='Корень')
+        for index in range(5):
+            Comment.objects.create(
+                post=cls.posts[0], author=cls.other if index % 2 else cls.user, content='Ответ', parent=cls.root
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.addCleanup(cache.clear)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, url):
+        """Проходит страницы по next, затем обратно по previous; возвращает ID в обоих направлениях."""
+        pages = [self.get(url)]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        self.assertIsNone(pages[0]['previous'])
+
+        forward = [item['id'] for page in pages for item in page['results']]
+        backward_pages = [pages[-1]]
+        while backward_pages[-1]['previous']:
+            backward_pages.append(self.get(backward_pages[-1]['previous']))
+        backward = [item['id'] for page in reversed(backward_pages) for item in page['results']]
+        self.assertEqual(len(backward_pages), len(pages))
+        return forward, backward
+
+    def assertPages(self, url, expected):
+        forward, backward = self.walk(url)
+        self.assertEqual(forward, expected, url)
+        self.assertEqual(backward, expected, url)
+
+    def test_round_trip(self):
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertPages('/api/posts/?page_size=3', expected)
+
+        first = self.get('/api/posts/?page_size=3')
+        second = self.get(first['next'])
+        # Ссылка previous второй страницы возвращает первую страницу
+        self.assertEqual(self.get(second['previous'])['results'], first['results'])
+
+    def test_ties(self):
+        Post.objects.update(created_at=timezone.now())
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        for page_size in (1, 2, 3):
+            self.assertPages(f'/api/posts/?page_size={page_size}', expected)
+
+    def test_ordering_fields(self):
+        for ordering in ('created_at', '-created_at', 'updated_at', '-updated_at', 'title', '-title'):
+            tiebreaker = '-id' if ordering.startswith('-') else 'id'
+            expected = list(Post.objects.order_by(ordering, tiebreaker).values_list('id', flat=True))
+            self.assertPages(f'/api/posts/?page_size=2&ordering={ordering}', expected)
+
+        for ordering in ('author', '-author'):
+            tiebreaker = '-id' if ordering.startswith('-') else 'id'
+            expected = list(self.root.replies.order_by(ordering, tiebreaker).values_list('id', flat=True))
+            self.assertPages(f'/api/comments/{self.root.pk}/replies/?page_size=2&ordering={ordering}', expected)
+
+    def test_annotated_ordering(self):
+        # Результаты поиска сортируются по аннотации search_rank
+        expected = [item['id'] for item in self.get('/api/posts/?search=article&page_size=100')['results']]
+        self.assertEqual(len(expected), len(self.posts))
+        self.assertPages('/api/posts/?search=article&page_size=2', expected)
+
+    def test_invalid_cursor(self):
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        page = self.get('/api/posts/?page_size=2&ordering=title')
+        valid = parse_qs(urlparse(page['next']).query)['cursor'][0]
+        cursors = [
+            'не-курсор',
+            '!!!',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            encode([1, 2]),
+            encode({'r': 0}),
+            encode({'r': 0, 'p': 5}),
+            encode({'r': 0, 'p': ['Пост 0']}),
+            encode({'r': 0, 'p': ['Пост 0', 'id']}),
+            encode({'r': 0, 'p': [None, 1]}),
+            encode({'r': 0, 'p': [['Пост 0'], {'id': 1}]}),
+            valid[:-4],
+        ]
+        for cursor in cursors:
+            response = self.client.get('/api/posts/', {'page_size': 2, 'ordering': 'title', 'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+        # Курсор другой сортировки не подходит к полям текущей
+        response = self.client.get('/api/posts/', {'page_size': 2, 'ordering': '-created_at', 'cursor': encode(
+            {'r': 0, 'p': ['Пост 0', 1]}
+        )})
+        self.assertEqual(response.status_code, 404)
+
+    def test_no_offset_or_count(self):
+        page = self.get('/api/posts/?page_size=2')
+        for url in (page['next'], self.get(page['next'])['previous']):
+            with CaptureQueriesContext(connection) as queries:
+                self.get(url)
+            sql = ' '.join(query['sql'].upper() for query in queries)
+            self.assertNotIn('OFFSET', sql)
+            self.assertNotIn('COUNT(', sql)
+
+
+class RecentCommentsTests(TestCase):
+    """Последние комментарии постов: ROW_NUMBER() ограничивает их число для каждого поста."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        created_at = timezone.now()
+        cls.expected = {}
+        for count in (0, 2, 5):
+            post = Post.objects.create(author=cls.user, title=f'Пост {count}', content='<p>Текст</p>')
+            comments = [
+                Comment.objects.create(
+                    post=post, author=cls.user, content=f'Комментарий {index}',
+                    created_at=created_at - timedelta(minutes=index)
+                )
+                for index in range(count)
+            ]
+            # Удаленные комментарии и ответы в последние не попадают, даже если они новее
+            Comment.objects.create(post=post, author=cls.user, content='Удален', is_deleted=True, created_at=created_at)
+            if comments:
+                Comment.objects.create(post=post, author=cls.user, content='Ответ', parent=comments[-1])
+            cls.expected[post.pk] = [comment.pk for comment in comments]
+
+    def test_limit_per_post(self):
+        for limit in (1, 3, 10):
+            # Посты, комментарии всех постов одним запросом и их вложения
+            with self.assertNumQueries(3):
+                posts = list(Post.objects.prefetch_related(recent_comments_prefetch(limit)))
+            for post in posts:
+                self.assertEqual(
+                    [comment.pk for comment in post.recent_top_comments],
+                    self.expected[post.pk][:limit],
+                    f'limit={limit}, {post.title}'
+                )
+
+    def test_default_limit(self):
+        with self.settings(RECENT_COMMENTS_LIMIT=2):
+            posts = list(post_list_queryset())
+        for post in posts:
+            self.assertEqual([comment.pk for comment in post.recent_top_comments], self.expected[post.pk][:2])
+
+
+class ListingCacheTests(TestCase):
+    """Кеш лент: попадание, условные запросы и сброс после коммита изменений."""
+    url = '/api/posts/published/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>')
+        cls.comment = Comment.objects.create(post=cls.post, author=cls.user, content='Комментарий')
+        PostAttachment.objects.bulk_create([
+            PostAttachment(post=cls.post, file='post_attachments/notes.txt', file_type='text'),
+        ])
+        CommentAttachment.objects.bulk_create([
+            CommentAttachment(comment=cls.comment, image='comment_attachments/image.png'),
+        ])
+
+    def setUp(self):
+        # Версия из прошлой секунды: ответы отдаются с Last-Modified
+        self.set_version(time.time_ns() - 10 ** 10)
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    @staticmethod
+    def set_version(version):
+        listing_cache.cache.set(listing_cache.version_key, version, timeout=None)
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        self.assertIn(response.status_code, (200, 304), response.content)
+        return response
+
+    def assertCacheHit(self, url, client):
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            second = client.get(url)
+        self.assertFalse([query['sql'] for query in queries if 'blog_' in query['sql']])
+        self.assertEqual(second.json(), first.json())
+        return second
+
+    def test_published_listing_is_public(self):
+        self.assertCacheHit(self.url, APIClient())
+
+    def test_post_list_cached_per_visibility(self):
+        Post.objects.create(author=self.user, title='Черновик', content='<p>Текст</p>', is_published=False)
+        reader = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(reader)}')
+
+        # Ответ авторизованным не зависит от пользователя: второй берется из кеша первого
+        first = self.get('/api/posts/')
+        second = self.assertCacheHit('/api/posts/', client)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('Черновик', [post['title'] for post in second.json()['results']])
+
+        # Анонимы видят только опубликованные посты и получают свою запись кеша
+        request = APIRequestFactory().get('/api/posts/')
+        response = views.PostListView.as_view()(request)
+        response.render()
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertNotIn('Черновик', [post['title'] for post in json.loads(response.content)['results']])
+
+    def test_no_last_modified_within_version_second(self):
+        # Запись в ту же секунду получила бы тот же Last-Modified: отдается только ETag
+        self.set_version(time.time_ns())
+        response = self.get()
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(time.time())).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_cache_hit(self):
+        first = self.get()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get()
+        self.assertFalse([query['sql'] for query in queries if 'blog_' in query['sql']])
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_requests(self):
+        response = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_invalidation_on_commit(self):
+        def create_post():
+            Post.objects.create(author=self.user, title='Новый', content='<p>Текст</p>')
+
+        def update_post():
+            self.post.title = 'Переименован'
+            self.post.save()
+
+        def create_comment():
+            Comment.objects.create(post=self.post, author=self.user, content='Новый')
+
+        def delete_comment():
+            Comment.objects.get(content='Новый').delete()
+
+        def save_attachment(model):
+            def save():
+                model.objects.get().save()
+            return save
+
+        def delete_attachment(model):
+            def delete():
+                model.objects.get().delete()
+            return delete
+
+        changes = [
+            ('post create', create_post),
+            ('post save', update_post),
+            ('comment create', create_comment),
+            ('comment delete', delete_comment),
+            ('post attachment save', save_attachment(PostAttachment)),
+            ('post attachment delete', delete_attachment(PostAttachment)),
+            ('comment attachment save', save_attachment(CommentAttachment)),
+            ('comment attachment delete', delete_attachment(CommentAttachment)),
+            ('post delete', lambda: Post.objects.get(title='Новый').delete()),
+        ]
+        for name, change in changes:
+            with self.subTest(name):
+                etag = self.get()['ETag']
+                version = listing_cache.get_version()
+                with self.captureOnCommitCallbacks() as callbacks:
+                    change()
+                # До коммита ответы отдаются из кеша
+                self.assertEqual(listing_cache.get_version(), version)
+                self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+                for callback in callbacks:
+                    callback()
+                self.assertNotEqual(listing_cache.get_version(), version)
+                response = self.get(HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [post['title'] for post in response.json()['results']],
+                    list(Post.objects.filter(is_published=True).values_list('title', flat=True))
+                )
+
+
+class ThumbnailServiceTests(TestCase):
+    """Синхронная генерация миниатюр (process): варианты, запасной JPEG и ошибка обработки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>')
+        cls.comment = Comment.objects.create(post=post, author=cls.user, content='Комментарий')
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name, THUMBNAIL_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def attachment(self, content, name='image.png'):
+        # bulk_create не отправляет сигналы: миниатюра создается явным вызовом process
+        attachment = CommentAttachment(comment=self.comment)
+        attachment.image.save(name, SimpleUploadedFile(name, content), save=False)
+        CommentAttachment.objects.bulk_create([attachment])
+        return CommentAttachment.objects.get(image=attachment.image.name)
+
+    @staticmethod
+    def image(size=(800, 600), mode='RGBA', format_name='PNG'):
+        output = BytesIO()
+        Image.new(mode, size, (200, 50, 50, 128) if mode == 'RGBA' else 'red').save(output, format=format_name)
+        return output.getvalue()
+
+    def process(self, attachment):
+        thumbnail_service.process(CommentAttachment, attachment.pk)
+        attachment.refresh_from_db()
+        return attachment
+
+    def test_success(self):
+        attachment = self.process(self.attachment(self.image()))
+
+        self.assertEqual(attachment.thumbnail_status, CommentAttachment.THUMBNAIL_READY)
+        self.assertTrue(attachment.thumbnail.name.endswith('.jpg'))
+        with Image.open(attachment.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.format, 'JPEG')
+        widths = set()
+        for name, variant in attachment.thumbnail_variants.items():
+            path = attachment.thumbnail.storage.path(variant['name'])
+            with Image.open(path) as image:
+                self.assertEqual((image.width, image.height), (variant['width'], variant['height']), name)
+                self.assertEqual(image.format, pick_format(settings.THUMBNAIL_FORMATS))
+            widths.add(variant['width'])
+        self.assertEqual(len(widths), len(attachment.thumbnail_variants))
+        self.assertEqual(
+            Notification.objects.get(user=self.user).title, 'Миниатюра готова'
+        )
+
+    def test_fallback_to_jpeg(self):
+        # Ни один из форматов не поддерживается сборкой Pillow: варианты кодируются в JPEG
+        with self.settings(THUMBNAIL_FORMATS=['NOSUCHFORMAT']):
+            attachment = self.process(self.attachment(self.image()))
+
+        self.assertEqual(attachment.thumbnail_status, CommentAttachment.THUMBNAIL_READY)
+        self.assertTrue(attachment.thumbnail_variants)
+        for variant in attachment.thumbnail_variants.values():
+            self.assertTrue(variant['name'].endswith('.jpeg'))
+            with Image.open(attachment.thumbnail.storage.path(variant['name'])) as image:
+                self.assertEqual(image.format, 'JPEG')
+
+    def test_jpeg_draft_decoding(self):
+        # JPEG декодируется с уменьшением, но не меньше самого большого варианта
+        with mock.patch.object(JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft) as draft:
+            result = render_thumbnails(
+                BytesIO(self.image((2600, 1950), 'RGB', 'JPEG')),
+                settings.THUMBNAIL_VARIANTS, ['JPEG'], settings.THUMBNAIL_FALLBACK_VARIANT
+            )
+        draft.assert_called_once_with(mock.ANY, 'RGB', max(settings.THUMBNAIL_VARIANTS.values()))
+        self.assertEqual(
+            {name: variant[1:3] for name, variant in result['variants'].items()},
+            settings.THUMBNAIL_VARIANTS
+        )
+        self.assertIsNotNone(result['fallback'])
+
+    def test_mixed_aspect_variants(self):
+        # Рамки не вложены друг в друга: каждый вариант вписан в свою рамку, как из оригинала
+        variants = {'list': (320, 240), 'portrait': (240, 320), 'wide': (640, 160)}
+        with mock.patch.object(JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft) as draft:
+            result = render_thumbnails(BytesIO(self.image((600, 800), 'RGB', 'JPEG')), variants, ['JPEG'], 'list')
+        draft.assert_called_once_with(mock.ANY, 'RGB', (640, 320))
+        self.assertEqual(
+            {name: variant[1:3] for name, variant in result['variants'].items()},
+            {'list': (180, 240), 'portrait': (240, 320), 'wide': (120, 160)}
+        )
+
+    def test_srcset(self):
+        request = APIRequestFactory().get('/')
+        attachment = self.attachment(self.image())
+        data = CommentAttachmentSerializer(attachment, context={'request': request}).data
+        self.assertIsNone(data['thumbnail_url'])
+        self.assertIsNone(data['thumbnail_srcset'])
+
+        attachment = self.process(attachment)
+        data = CommentAttachmentSerializer(attachment, context={'request': request}).data
+        storage = attachment.thumbnail.storage
+        variants = attachment.thumbnail_variants
+        self.assertEqual(data['thumbnail_url'], request.build_absolute_uri(attachment.thumbnail.url))
+        self.assertEqual(data['thumbnail_srcset'], ', '.join(
+            f"{request.build_absolute_uri(storage.url(variants[name]['name']))} {width}w"
+            for name, width in (('list', 320), ('preview', 640), ('retina', 800))
+        ))
+
+    def test_small_image_not_upscaled(self):
+        attachment = self.process(self.attachment(self.image((40, 30), 'RGB', 'JPEG'), 'image.jpg'))
+        self.assertEqual(
+            [(variant['width'], variant['height']) for variant in attachment.thumbnail_variants.values()],
+            [(40, 30)]
+        )
+
+    def test_failed(self):
+        bomb = self.image((100, 100))
+        previous_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = 100
+        self.addCleanup(setattr, Image, 'MAX_IMAGE_PIXELS', previous_limit)
+
+        # Поврежденный файл (OSError) и слишком большое изображение (DecompressionBombError)
+        for content in (b'not an image', self.image((10, 10))[:60], bomb):
+            with self.subTest(content=content[:10]):
+                with self.assertLogs('blog.thumbnail_service', 'ERROR'):
+                    attachment = self.process(self.attachment(content))
+                self.assertEqual(attachment.thumbnail_status, CommentAttachment.THUMBNAIL_FAILED)
+                self.assertFalse(attachment.thumbnail)
+                self.assertEqual(attachment.thumbnail_variants, {})
+                self.assertEqual(
+                    Notification.objects.filter(user=self.user).latest('id').title,
+                    'Ошибка обработки изображения'
+                )
+
+
+class LoopbackChannelLayer(PostgresChannelLayer):
+    """
+    PostgresChannelLayer, у которого NOTIFY заменен доставкой в _dispatch
+    всех слоев сети в их цикле событий (как это делает слушатель LISTEN).
+    """
+
+    def __init__(self, network, **kwargs):
+        super().__init__(**kwargs)
+        self.network = network
+        self.published = []
+        network.append(self)
+
+    def _notify(self, payload):
+        self.published.append(json.loads(payload))
+        for layer in self.network:
+            layer.loop.call_soon_threadsafe(layer._dispatch, json.loads(payload))
+
+    async def _ensure_listener(self):
+        self.loop = asyncio.get_running_loop()
+
+
+class FakeListenConnection:
+    """Соединение psycopg с LISTEN: poll переносит в notifies отправленные сообщения."""
+
+    def __init__(self):
+        self.socket, self.peer = socket.socketpair()
+        self.executed = []
+        self.pending = []
+        self.notifies = []
+        self.broken = False
+        self.closed = False
+
+    def cursor(self):
+        return nullcontext(SimpleNamespace(execute=self.executed.append))
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def poll(self):
+        if self.broken:
+            raise OperationalError('server closed the connection unexpectedly')
+        self.notifies.extend(SimpleNamespace(payload=payload) for payload in self.pending)
+        self.pending = []
+
+    def close(self):
+        self.closed = True
+        self.socket.close()
+        self.peer.close()
+
+
+class FakeListenChannelLayer(PostgresChannelLayer):
+    """PostgresChannelLayer на FakeListenConnection вместо PostgreSQL."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.connections = []
+
+    def _connect(self):
+        connection = FakeListenConnection()
+        self.connections.append(connection)
+        return connection
+
+
+class PostgresChannelLayerTests(TestCase):
+    """Маршрутизация сообщений между процессами: локальные каналы, NOTIFY и лимит его размера."""
+
+    async def make_layers(self, count):
+        network = []
+        layers = [LoopbackChannelLayer(network) for _ in range(count)]
+        for layer in layers:
+            await layer._ensure_listener()
+        return layers
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), timeout=1)
+
+    async def assertNothingReceived(self, layer, channel):
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), timeout=0.05)
+
+    async def test_local_send(self):
+        first, _ = await self.make_layers(2)
+        channel = await first.new_channel()
+        await first.send(channel, {'type': 'test.message', 'text': 'локально'})
+        self.assertEqual(await self.receive(first, channel), {'type': 'test.message', 'text': 'локально'})
+        # Канал своего процесса не требует NOTIFY
+        self.assertEqual(first.published, [])
+
+    async def test_remote_send(self):
+        first, second = await self.make_layers(2)
+        channel = await first.new_channel()
+        await second.send(channel, {'type': 'test.message'})
+
+        self.assertEqual(second.published, [{'channel': channel, 'message': {'type': 'test.message'}}])
+        self.assertEqual(await self.receive(first, channel), {'type': 'test.message'})
+        # Слой, которому канал не принадлежит, сообщение не сохраняет
+        await asyncio.sleep(0)
+        self.assertNotIn(channel, second.channels)
+
+    async def test_group_send(self):
+        first, second, sender = await self.make_layers(3)
+        channels = [await first.new_channel(), await second.new_channel()]
+        await first.group_add('notifications', channels[0])
+        await second.group_add('notifications', channels[1])
+
+        message = {'type': 'test.message', 'items': [1, 2]}
+        await sender.group_send('notifications', message)
+        self.assertEqual(len(sender.published), 1)
+        for layer, channel in zip((first, second), channels):
+            received = await self.receive(layer, channel)
+            self.assertEqual(received, message)
+            received['items'].append(3)
+        self.assertEqual(message['items'], [1, 2])
+
+        await first.group_discard('notifications', channels[0])
+        await sender.group_send('notifications', {'type': 'test.message'})
+        await self.receive(second, channels[1])
+        await self.assertNothingReceived(first, channels[0])
+
+    async def test_payload_limit(self):
+        first, sender = await self.make_layers(2)
+        channel = await first.new_channel()
+        await first.group_add('notifications', channel)
+
+        # Лимит считается в байтах UTF-8: 4000 кириллических символов — это 8000 байт
+        for text in ('x' * MAX_PAYLOAD_SIZE, 'я' * (MAX_PAYLOAD_SIZE // 2)):
+            with self.assertRaisesMessage(ValueError, str(MAX_PAYLOAD_SIZE)):
+                await sender.group_send('notifications', {'type': 'test.message', 'text': text})
+        self.assertEqual(sender.published, [])
+
+        text = 'x' * (MAX_PAYLOAD_SIZE - 100)
+        await sender.group_send('notifications', {'type': 'test.message', 'text': text})
+        self.assertEqual((await self.receive(first, channel))['text'], text)
+
+    async def test_malformed_payload_skipped(self):
+        layer = FakeListenChannelLayer()
+        channel = await layer.new_channel()
+        await layer.group_add('notifications', channel)
+        connection = layer._listener
+        self.assertEqual(connection.executed, ['LISTEN channels_layer'])
+
+        connection.pending = [
+            'not json', '5', '{"group": ["notifications"]}', '{"channel": "%s"}' % channel,
+            json.dumps({'group': 'notifications', 'message': {'type': 'test.message'}}),
+        ]
+        with self.assertLogs('blog.channel_layers', 'WARNING') as logs:
+            layer._on_notify(connection)
+        self.assertEqual(len(logs.records), 4)
+        self.assertEqual(await self.receive(layer, channel), {'type': 'test.message'})
+        await layer.close()
+
+    async def test_listener_reconnects(self):
+        layer = FakeListenChannelLayer()
+        channel = await layer.new_channel()
+        await layer.group_add('notifications', channel)
+        broken = layer._listener
+
+        broken.broken = True
+        with self.assertLogs('blog.channel_layers', 'ERROR'):
+            layer._on_notify(broken)
+        self.assertTrue(broken.closed)
+        self.assertIsNone(layer._listener)
+
+        # Ожидающий receive получает сообщение через новое соединение
+        receiving = asyncio.ensure_future(self.receive(layer, channel))
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(layer.connections), 2)
+        layer._listener.pending = [json.dumps({'group': 'notifications', 'message': {'type': 'test.message'}})]
+        layer._on_notify(layer._listener)
+        self.assertEqual(await receiving, {'type': 'test.message'})
+        await layer.close()
+
+    async def test_failed_connect_retried(self):
+        def refuse():
+            raise OperationalError('connection refused')
+
+        layer = FakeListenChannelLayer()
+        connect = layer._connect
+        layer._connect = refuse
+        channel = await layer.new_channel()
+        with self.assertRaises(OperationalError):
+            await layer.group_add('notifications', channel)
+
+        layer._connect = connect
+        await layer.group_add('notifications', channel)
+        self.assertEqual(len(layer.connections), 1)
+        await layer.close()
+
+    def test_notify_channel_name(self):
+        with self.assertRaises(ValueError):
+            PostgresChannelLayer(notify_channel='channels; DROP TABLE blog_post')
+
+    @skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY есть только в PostgreSQL')
+    async def test_postgres_notify(self):
+        receiver, sender = PostgresChannelLayer(), PostgresChannelLayer()
+        try:
+            channel = await receiver.new_channel()
+            await receiver.group_add('notifications', channel)
+
+            await sender.group_send('notifications', {'type': 'test.message'})
+            self.assertEqual(await self.receive(receiver, channel), {'type': 'test.message'})
+        finally:
+            await receiver.close()
+            await sender.close()
+
+
+class FailingChannelLayer(InMemoryChannelLayer):
+    """Слой каналов, недоступный для отправки в группы."""
+
+    async def group_send(self, group, message):
+        raise ConnectionError('слой каналов недоступен')
+
+
+class NotificationOutboxTests(TestCase):
+    """Outbox уведомлений: запись в транзакции комментария и отправка диспетчером."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.author, title='Пост', content='<p>Текст</p>')
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def comment(self):
+        return Comment.objects.create(post=self.post, author=self.reader, content='Комментарий')
+
+    def test_comment_relations_loaded_once(self):
+        # Автор, пост и родитель загружаются одним запросом, если они не загружены
+        parent = Comment.objects.create(post=self.post, author=self.author, content='Комментарий')
+        comment = self.comment()
+        reply = Comment.objects.create(post=self.post, author=self.reader, content='Ответ', parent=parent)
+        for instance, related in ((comment, ('author', 'post')), (reply, ('author', 'post', 'parent'))):
+            for queryset, queries in ((Comment.objects.all(), 3), (Comment.objects.select_related(*related), 2)):
+                loaded = queryset.get(pk=instance.pk)
+                # Запросы: загрузка связей (если нужна), уведомление и запись outbox
+                with self.subTest(content=instance.content, queries=queries), self.assertNumQueries(queries):
+                    comment_notification_handler(Comment, loaded, created=True)
+        self.assertEqual(NotificationOutbox.objects.filter(user=self.author).count(), 6)
+
+    def test_written_in_comment_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.comment()
+            row = NotificationOutbox.objects.get()
+        self.assertEqual(row.user, self.author)
+        self.assertEqual(row.payload['title'], 'Новый комментарий')
+        self.assertEqual(row.payload['id'], Notification.objects.get(user=self.author).pk)
+        # Отправка запускается только после коммита
+        self.assertIn(outbox_dispatcher.wake, callbacks)
+
+    def test_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.comment()
+                self.assertEqual(NotificationOutbox.objects.count(), 1)
+                raise RuntimeError
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_sent_row_deleted(self):
+        self.comment()
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'user_{self.author.pk}', channel)
+        self.addCleanup(async_to_sync(channel_layer.group_discard), f'user_{self.author.pk}', channel)
+
+        self.assertEqual(outbox_dispatcher.drain(), 1)
+        message = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(message['type'], 'notification_message')
+        self.assertEqual(message['notification']['title'], 'Новый комментарий')
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_failed_send(self):
+        self.comment()
+        with self.settings(CHANNEL_LAYERS={'default': {'BACKEND': 'blog.tests.FailingChannelLayer'}}):
+            with self.assertLogs('blog.outbox_service', 'WARNING'):
+                self.assertEqual(outbox_dispatcher.drain(), 0)
+
+        row = NotificationOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertIn('слой каналов недоступен', row.last_error)
+        self.assertGreater(row.locked_until, timezone.now())
+        # До истечения задержки повтора строка не забирается
+        self.assertEqual(outbox_dispatcher.drain(), 0)
+
+        NotificationOutbox.objects.update(locked_until=None)
+        self.assertEqual(outbox_dispatcher.drain(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_max_attempts(self):
+        self.comment()
+        NotificationOutbox.objects.update(attempts=settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS)
+        self.assertEqual(outbox_dispatcher.drain(), 0)
+        self.assertTrue(NotificationOutbox.objects.exists())
+
+
+class NotificationTests(TestCase):
+    """Уведомления: модель, счетчик непрочитанных, массовая отметка и повторная отправка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        cls.other = User.objects.create_user(username='other', email='other@example.com', password='password')
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def notify(self, user=None, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                notification_service.create_notification('info', f'Уведомление {index}', 'Текст', (user or self.user).pk)
+                for index in range(count)
+            ]
+
+    def test_model(self):
+        payload, = self.notify()
+        notification = Notification.objects.get()
+        self.assertFalse(notification.read)
+        self.assertEqual(payload, {
+            'id': notification.pk,
+            'type': 'info',
+            'title': 'Уведомление 0',
+            'message': 'Текст',
+            'timestamp': notification.created_at.isoformat(),
+            'read': False,
+            'data': {},
+        })
+        self.notify()
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['Уведомление 0'] * 2)
+        self.assertGreater(*Notification.objects.values_list('id', flat=True))
+
+    def test_unread_count_cached(self):
+        self.notify(count=2)
+        self.notify(self.other)
+        self.assertEqual(notification_service.get_unread_count(self.user.pk), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(notification_service.get_unread_count(self.user.pk), 2)
+
+        self.notify()
+        self.assertEqual(notification_service.get_unread_count(self.user.pk), 3)
+        self.assertEqual(notification_service.get_unread_count(self.other.pk), 1)
+
+    def test_unread_count_race(self):
+        """Значение, подсчитанное до фиксации нового уведомления, не остается в кеше."""
+        self.notify()
+        # Читатель получил версию и подсчитал уведомления до коммита записи...
+        version = notification_service._get_unread_version(self.user.pk)
+        stale = Notification.objects.filter(user=self.user, read=False).count()
+        self.notify()
+        # ...и записал подсчет в кеш уже после инвалидации
+        cache.add(notification_service._unread_count_key(self.user.pk, version), stale)
+        self.assertEqual(notification_service.get_unread_count(self.user.pk), 2)
+
+    def test_mark_read(self):
+        ids = [payload['id'] for payload in self.notify(count=5)]
+        other, = self.notify(self.other)
+        self.assertEqual(notification_service.get_unread_count(self.user.pk), 5)
+
+        def mark_read(data):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/notifications/mark-read/', data, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            return response.json()
+
+        # Чужие уведомления не отмечаются
+        self.assertEqual(mark_read({'ids': [ids[0], other['id']]}), {'updated': 1, 'unread_count': 4})
+        self.assertEqual(mark_read({'up_to_id': ids[2]}), {'updated': 2, 'unread_count': 2})
+        self.assertEqual(mark_read({'up_to_id': ids[2]}), {'updated': 0, 'unread_count': 2})
+        self.assertEqual(mark_read({'all': True}), {'updated': 2, 'unread_count': 0})
+        self.assertEqual(notification_service.get_unread_count(self.other.pk), 1)
+
+        response = self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_websocket_mark_read_validation(self):
+        consumer = NotificationConsumer()
+        consumer.user = self.user
+        frames = []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            frames.append(json.loads(text_data))
+
+        consumer.send = send
+        # Некорректные параметры не доходят до БД: клиент получает сообщение об ошибке
+        for message in (
+            {'action': 'mark_read', 'ids': 5},
+            {'action': 'mark_read', 'ids': '12'},
+            {'action': 'mark_read', 'ids': [1, True]},
+            {'action': 'mark_read', 'up_to_id': '3'},
+            [1, 2],
+        ):
+            with self.subTest(message=message):
+                frames.clear()
+                await consumer.receive(json.dumps(message))
+                self.assertEqual(len(frames), 1)
+                self.assertEqual(frames[0]['type'], 'error')
+
+    def test_missed_notifications(self):
+        ids = [payload['id'] for payload in self.notify(count=5)]
+        self.notify(self.other)
+        notification_service.mark_read(self.user.pk, ids=[ids[2]])
+
+        missed = notification_service.get_missed_notifications(self.user.pk, ids[0])
+        self.assertEqual([payload['id'] for payload in missed], [ids[1], ids[3], ids[4]])
+        self.assertEqual(
+            [payload['id'] for payload in notification_service.get_missed_notifications(self.user.pk, 0, limit=2)],
+            ids[:2]
+        )
+        self.assertEqual(notification_service.get_missed_notifications(self.user.pk, ids[4]), [])
+
+
+class QueryPlanTests(TestCase):
+    """Проверяет, что основные запросы лент и веток используют индексы, а не полный просмотр таблиц."""
+    posts_count = 200
+    comments_per_post = 10
+
+    # Полный просмотр таблицы в плане PostgreSQL и SQLite
+    # (поиск по таблице FTS5 с условием MATCH — это обращение к полнотекстовому индексу)
+    SEQ_SCAN_PATTERNS = {
+        'postgresql': re.compile(r'Seq Scan on (blog_\w+)'),
+        'sqlite': re.compile(r'\bSCAN (blog_\w+)\b(?! VIRTUAL TABLE INDEX \d+:\S*M)'),
+    }
+    # Обход таблицы по индексу в порядке сортировки (лента с LIMIT) допустим только для лент без фильтра
+    ORDERED_INDEX_SCAN_PATTERNS = {
+        'postgresql': re.compile(r'Seq Scan on (blog_\w+)'),
+        'sqlite': re.compile(r'\bSCAN (blog_\w+)\b(?! USING| VIRTUAL TABLE INDEX \d+:\S*M)'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        other = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+
+        posts = Post.objects.bulk_create([
+            Post(
+                author=cls.user if i % 10 == 0 else other,
+                title=f'Пост {i}',
+                content='Текст',
+                is_published=i % 4 != 0
+            )
+            for i in range(cls.posts_count)
+        ])
+
+        roots = Comment.objects.bulk_create([
+            Comment(author=other, post=post, content=f'Комментарий {j}', is_deleted=j % 7 == 0)
+            for post in posts
+            for j in range(cls.comments_per_post)
+        ])
+        replies = Comment.objects.bulk_create([
+            Comment(author=cls.user, post_id=root.post_id, parent=root, content='Ответ')
+            for root in roots
+        ])
+
+        CommentTree.objects.bulk_create(
+            [CommentTree(comment=c, ancestor=c, depth=0) for c in roots + replies]
+            + [CommentTree(comment=r, ancestor=r.parent, depth=1) for r in replies]
+        )
+
+        cls.post = posts[1]
+        cls.root = roots[cls.comments_per_post + 1]
+        cls.reply = replies[cls.comments_per_post + 1]
+
+    def setUp(self):
+        # Ответы лент не должны браться из кеша, иначе запросы к БД не выполнятся
+        listing_cache.invalidate()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        if connection.vendor == 'postgresql':
+            # На маленьком наборе данных планировщик предпочитает Seq Scan;
+            # с отключенным Seq Scan он остается в плане только при отсутствии индекса
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def capture_queries(self, url):
+        """Выполняет запрос к API и возвращает выполненные SELECT по таблицам блога."""
+        queries = []
+
+        def wrapper(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT') and 'blog_' in sql:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(queries)
+        return queries
+
+    def explain(self, sql, params):
+        prefix = 'EXPLAIN' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN'
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def assertNoSeqScan(self, url, allow_ordered_index_scan=False):
+        patterns = self.ORDERED_INDEX_SCAN_PATTERNS if allow_ordered_index_scan else self.SEQ_SCAN_PATTERNS
+        pattern = patterns[connection.vendor]
+        for sql, params in self.capture_queries(url):
+            plan = self.explain(sql, params)
+            match = pattern.search(plan)
+            self.assertIsNone(
+                match,
+                f'{url}: полный просмотр таблицы {match and match.group(1)}\n{sql}\n{plan}'
+            )
+
+    def test_post_list(self):
+        self.assertNoSeqScan('/api/posts/', allow_ordered_index_scan=True)
+
+    def test_post_published_list(self):
+        self.assertNoSeqScan('/api/posts/published/', allow_ordered_index_scan=True)
+
+    def test_post_my_list(self):
+        self.assertNoSeqScan('/api/posts/my/')
+
+    def test_post_detail(self):
+        self.assertNoSeqScan(f'/api/posts/{self.post.pk}/')
+
+    def test_post_top_comments(self):
+        self.assertNoSeqScan(f'/api/posts/{self.post.pk}/top-comments/')
+
+    def test_comment_replies(self):
+        self.assertNoSeqScan(f'/api/comments/{self.root.pk}/replies/')
+
+    def test_comment_thread(self):
+        self.assertNoSeqScan(f'/api/comments/{self.reply.pk}/thread/')
+
+    def test_post_search(self):
+        self.assertNoSeqScan('/api/posts/?search=Пост')
+
+    def test_comment_search(self):
+        self.assertNoSeqScan('/api/comments/?search=Комментарий')
+
+    def test_next_page(self):
+        next_url = self.client.get('/api/posts/published/').json()['next']
+        self.assertIsNotNone(next_url)
+        self.assertNoSeqScan(next_url, allow_ordered_index_scan=True)
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск по параметру search (PostgreSQL или FTS5 в SQLite)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.in_title = Post.objects.create(author=cls.user, title='Django и каналы', content='<p>Текст</p>')
+        cls.in_content = Post.objects.create(author=cls.user, title='Заметки', content='<p>Немного про Django</p>')
+        Post.objects.bulk_create([
+            Post(author=cls.user, title=f'Python {i}', content='<p>Текст</p>')
+            for i in range(25)
+        ])
+        cls.comment = Comment.objects.create(author=cls.user, post=cls.in_title, content='Отличная статья')
+
+    def setUp(self):
+        listing_cache.invalidate()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def search(self, url, text, **params):
+        response = self.client.get(url, {'search': text, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_title_ranks_above_content(self):
+        results = self.search('/api/posts/', 'django')['results']
+        self.assertEqual([post['id'] for post in results], [self.in_title.pk, self.in_content.pk])
+
+    def test_explicit_ordering(self):
+        results = self.search('/api/posts/', 'django', ordering='title')['results']
+        self.assertEqual([post['id'] for post in results], [self.in_title.pk, self.in_content.pk])
+
+    def test_index_follows_updates(self):
+        self.in_content.title = 'Каналы'
+        self.in_content.content = '<p>Без упоминаний</p>'
+        self.in_content.save()
+        results = self.search('/api/posts/', 'django')['results']
+        self.assertEqual([post['id'] for post in results], [self.in_title.pk])
+
+    def test_short_query_matches_word_prefix(self):
+        page = self.search('/api/posts/', 'pyth')
+        self.assertEqual(len(page['results']), 20)
+        rest = self.client.get(page['next']).json()
+        ids = {post['id'] for post in page['results'] + rest['results']}
+        self.assertEqual(len(ids), 25)
+        self.assertIsNone(rest['next'])
+
+    def test_comment_search(self):
+        results = self.search('/api/comments/', 'статья')['results']
+        self.assertEqual([comment['id'] for comment in results], [self.comment.pk])
+        self.assertEqual(self.search('/api/comments/', 'каналы')['results'], [])
+
+    def test_migration_ddl(self):
+        migration = import_module('blog.migrations.0009_search_index')
+
+        def statements(function, **kwargs):
+            executed = []
+            schema_editor = SimpleNamespace(connection=SimpleNamespace(vendor='postgresql'), execute=executed.append)
+            function(None, schema_editor, **kwargs)
+            return '\n'.join(executed)
+
+        # Конфигурация зафиксирована в миграции, команда rebuild_search_index передает текущую
+        with self.settings(SEARCH_CONFIG='english'):
+            self.assertIn("to_tsvector('russian'", statements(migration.install_search_index))
+        self.assertIn("to_tsvector('english'", statements(migration.install_search_index, config='english'))
+        with self.assertRaises(ValueError):
+            statements(migration.install_search_index, config="english'); DROP TABLE blog_post; --")
+
+        # Расширение pg_trgm общее для базы: при откате не удаляется
+        removed = statements(migration.remove_search_index)
+        self.assertIn('DROP COLUMN IF EXISTS search_vector', removed)
+        self.assertNotIn('EXTENSION', removed)
+
+    def test_rebuild_requires_migration(self):
+        MigrationRecorder(connection).migration_qs.filter(app='blog', name='0009_search_index').delete()
+        with self.assertRaisesMessage(CommandError, '0009_search_index'):
+            call_command('rebuild_search_index', stdout=StringIO())
+
+
+class HTMLValidatorTests(TestCase):
+    """Однопроходная проверка и нормализация разметки."""
+
+    def setUp(self):
+        self.validator = HTMLValidator()
+
+    def assertRejected(self, value):
+        with self.assertRaises(ValidationError):
+            self.validator.clean(value)
+
+    def test_normalizes_markup(self):
+        self.assertEqual(
+            self.validator.clean("<STRONG>a &amp; b</STRONG> <a href='https://example.com' title=\"t\">x</a><!-- c -->"),
+            '<strong>a &amp; b</strong> <a href="https://example.com" title="t">x</a>'
+        )
+
+    def test_rejects_forbidden_markup(self):
+        self.assertRejected('<script>alert(1)</script>')
+        self.assertRejected('<i class="x">текст</i>')
+        self.assertRejected('<a href="https://example.com" onclick="x">текст</a>')
+        self.assertRejected('<a href="java\tscript:alert(1)">текст</a>')
+        self.assertRejected('<strong>без закрывающего тега')
+        self.assertRejected('<i>' * 1000 + '</i>' * 1000)
+
+    def test_parser_is_reused_after_error(self):
+        self.assertRejected('<i>' + 'текст ' * 20000 + '<script>')
+        self.assertEqual(self.validator.clean('<i>ok</i>'), '<i>ok</i>')
+
+    def test_serializer_stores_normalized_content(self):
+        serializer = PostSerializer(data={'title': 'Пост', 'content': "<A href='https://example.com'>x</A>"})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['content'], '<a href="https://example.com">x</a>')
+
+
+class CommentImportTests(TestCase):
+    """Массовый импорт дерева комментариев поста."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='password', is_staff=True
+        )
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.author, title='Пост', content='<p>Текст</p>')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        self.url = f'/api/posts/{self.post.pk}/comments/import/'
+
+    def tree_rows(self):
+        return sorted(CommentTree.objects.values_list('comment_id', 'ancestor_id', 'depth'))
+
+    def test_nested_tree(self):
+        data = [
+            {'content': 'Первый <i>корень</i>', 'replies': [
+                {'content': 'Ответ', 'author': self.author.pk, 'replies': [{'content': 'Ответ на ответ'}]},
+                # Выгрузка не содержит текста удаленных комментариев
+                {'content': '', 'is_deleted': True},
+            ]},
+            {'content': 'Второй корень'},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {'comments': 5, 'tree_rows': 9})
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 4)
+        root = Comment.objects.get(content='Первый <i>корень</i>')
+        self.assertEqual(root.replies_count, 1)
+
+        # Таблица замыканий совпадает с построенной с нуля по parent
+        imported = self.tree_rows()
+        call_command('rebuild_comment_tree', stdout=StringIO())
+        self.assertEqual(imported, self.tree_rows())
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user_id', 'title')),
+            sorted([
+                (self.author.pk, 'Новый комментарий'),
+                (self.author.pk, 'Новый комментарий'),
+                (self.author.pk, 'Ответ на комментарий'),
+                (self.admin.pk, 'Ответ на комментарий'),
+            ])
+        )
+
+    def test_flat_ndjson_under_existing_comment(self):
+        parent = Comment.objects.create(author=self.author, post=self.post, content='Родитель')
+        body = '{"id": "a", "content": "Ответ"}\n\n{"parent": "a", "content": "Ответ на ответ"}\n'
+        response = self.client.post(
+            f'{self.url}?parent={parent.pk}&notify=false', body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {'comments': 2, 'tree_rows': 5})
+        parent.refresh_from_db()
+        self.assertEqual(parent.replies_count, 1)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_invalid_input_is_rejected(self):
+        for data in (
+            [{'content': '<script>alert(1)</script>'}],
+            [{'content': 'Ответ', 'parent': 'missing'}],
+            [{'content': 'Текст', 'author': 0}],
+            [{'content': ''}],
+        ):
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertFalse(Comment.objects.exists())
+
+
+class PostExportTests(TestCase):
+    """Потоковая выгрузка постов с комментариями в NDJSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='password', is_staff=True
+        )
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.admin, title='Пост', content='<p>Текст</p>')
+        cls.other_post = Post.objects.create(author=cls.admin, title='Другой', content='<p>Текст</p>')
+        first = Comment.objects.create(author=cls.admin, post=cls.post, content='Первый')
+        Comment.objects.create(author=cls.admin, post=cls.other_post, content='Другой пост')
+        second = Comment.objects.create(author=cls.admin, post=cls.post, content='Второй')
+        reply = Comment.objects.create(author=cls.admin, post=cls.post, parent=second, content='Ответ')
+        Comment.objects.create(author=cls.admin, post=cls.post, parent=reply, content='Ответ на ответ')
+        Comment.objects.create(author=cls.admin, post=cls.post, parent=first, content='Ответ первому')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            content = gzip.decompress(content)
+        return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+
+    def test_threads_follow_posts(self):
+        # Посты, комментарии и вложения тех и других — независимо от объема выгрузки
+        with self.assertNumQueries(4):
+            records = list(post_export_service.iter_records(Post.objects.all()))
+        self.assertEqual(
+            [(record['type'], record.get('content') if record['type'] == 'comment' else record['title'])
+             for record in records],
+            [
+                ('post', 'Пост'),
+                ('comment', 'Первый'),
+                ('comment', 'Ответ первому'),
+                ('comment', 'Второй'),
+                ('comment', 'Ответ'),
+                ('comment', 'Ответ на ответ'),
+                ('post', 'Другой'),
+                ('comment', 'Другой пост'),
+            ]
+        )
+
+    def test_all_posts_for_admin_only(self):
+        self.assertEqual(len(self.export('/api/posts/export/')), 8)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.author)}')
+        self.assertEqual(self.client.get('/api/posts/export/').status_code, 403)
+
+    def test_single_post_gzip(self):
+        records = self.export(f'/api/posts/{self.post.pk}/export/?gzip=true')
+        self.assertEqual(len(records), 6)
+        self.assertEqual({record.get('post', record['id']) for record in records}, {self.post.pk})
+
+    def test_single_post_visibility(self):
+        draft = Post.objects.create(author=self.author, title='Черновик', content='<p>Текст</p>', is_published=False)
+        url = f'/api/posts/{draft.pk}/export/'
+        reader = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(reader)}')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(len(self.export(f'/api/posts/{self.post.pk}/export/')), 6)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.author)}')
+        self.assertEqual(len(self.export(url)), 1)
+
+    def test_deleted_comment_content_omitted(self):
+        Comment.objects.create(author=self.admin, post=self.post, content='Секрет', is_deleted=True)
+        records = self.export(f'/api/posts/{self.post.pk}/export/')
+        deleted = [record for record in records if record.get('is_deleted')]
+        self.assertEqual(len(deleted), 1)
+        self.assertEqual(deleted[0]['content'], '')
+
+
+class PostExportASGITests(TransactionTestCase):
+    """Выгрузка под ASGI: фрагменты уходят клиенту по одному, а не после чтения всей выгрузки."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='password', is_staff=True
+        )
+        for index in range(3):
+            post = Post.objects.create(author=self.admin, title=f'Пост {index}', content='<p>Текст</p>')
+            root = Comment.objects.create(author=self.admin, post=post, content='Комментарий')
+            Comment.objects.create(author=self.admin, post=post, parent=root, content='Ответ')
+        self.addCleanup(cache.clear)
+
+        # Каждая запись — отдельный фрагмент; считаем фрагменты, выданные генератором
+        self.produced = 0
+        iter_ndjson = post_export_service.iter_ndjson
+
+        def counting_iter_ndjson(posts, compress=False):
+            for chunk in iter_ndjson(posts, compress=compress):
+                self.produced += 1
+                yield chunk
+
+        post_export_service.buffer_size = 1
+        post_export_service.iter_ndjson = counting_iter_ndjson
+        self.addCleanup(delattr, post_export_service, 'buffer_size')
+        self.addCleanup(delattr, post_export_service, 'iter_ndjson')
+
+    def request(self, path, query_string=b''):
+        """Запрос через ASGIHandler; возвращает статус и тела сообщений с числом выданных к тому моменту фрагментов."""
+        messages = []
+        disconnected = asyncio.Event()
+        sent_request = False
+
+        async def receive():
+            nonlocal sent_request
+            if not sent_request:
+                sent_request = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                messages.append((message.get('body', b''), self.produced))
+            else:
+                messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string,
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Bearer {AccessToken.for_user(self.admin)}'.encode()),
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        async_to_sync(ASGIHandler())(scope, receive, send)
+        start, *bodies = messages
+        return start['status'], [(body, produced) for body, produced in bodies if body]
+
+    def test_chunks_streamed_one_at_a_time(self):
+        status, bodies = self.request('/api/posts/export/')
+        self.assertEqual(status, 200)
+        # 3 поста и 6 комментариев, по записи во фрагменте
+        self.assertEqual(len(bodies), 9)
+        # К отправке i-го фрагмента генератор выдал ровно i фрагментов
+        self.assertEqual([produced for _, produced in bodies], list(range(1, 10)))
+        records = [json.loads(body) for body, _ in bodies]
+        self.assertEqual([record['type'] for record in records[:3]], ['post', 'comment', 'comment'])
+
+    def test_gzip(self):
+        status, bodies = self.request('/api/posts/export/', b'gzip=true')
+        self.assertEqual(status, 200)
+        lines = gzip.decompress(b''.join(body for body, _ in bodies)).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 9)
+        self.assertEqual(json.loads(lines[0])['title'], 'Пост 0')
+
+
+class SparseFieldsetTests(TestCase):
+    """Параметры fields и expand у постов и комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>')
+        cls.comment = Comment.objects.create(author=cls.user, post=cls.post, content='Комментарий')
+        cls.reply = Comment.objects.create(author=cls.user, post=cls.post, parent=cls.comment, content='Ответ')
+
+    def setUp(self):
+        listing_cache.invalidate()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        # Пользователь попадает в кеш аутентификации до подсчета запросов
+        self.client.get('/api/posts/?fields=id')
+
+    def get(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_post_list_fields_skip_prefetches(self):
+        page = self.get('/api/posts/?fields=id,title', queries=1)
+        self.assertEqual(page['results'], [{'id': self.post.pk, 'title': 'Пост'}])
+
+    def test_nested_fields_and_expand(self):
+        page = self.get(
+            '/api/posts/?fields=id,recent_comments.id,recent_comments.replies.id'
+            '&expand=recent_comments.replies',
+            queries=3
+        )
+        self.assertEqual(page['results'], [{
+            'id': self.post.pk,
+            'recent_comments': [{'id': self.comment.pk, 'replies': [{'id': self.reply.pk}]}],
+        }])
+
+    def test_comment_replies_only_when_expanded(self):
+        page = self.get('/api/comments/?fields=id,content', queries=1)
+        self.assertEqual(page['results'][0], {'id': self.comment.pk, 'content': 'Комментарий'})
+
+        page = self.get('/api/comments/?fields=id,replies.content&expand=replies', queries=2)
+        self.assertEqual(page['results'][0], {'id': self.comment.pk, 'replies': [{'content': 'Ответ'}]})
+
+    def test_fields_do_not_affect_writes(self):
+        response = self.client.post(
+            '/api/comments/?fields=id', {'post': self.post.pk, 'content': 'Новый'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(list(response.json()), ['id'])
+        self.assertEqual(Comment.objects.get(pk=response.json()['id']).content, 'Новый')
+
+
+class FastSerializerTests(TestCase):
+    """Быстрые сериализаторы списков выдают то же, что и ModelSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='автор', email='author@example.com', password='password')
+        post = Post.objects.create(author=cls.user, title='Пост "в кавычках"', content='<p>Текст</p>')
+        Post.objects.create(author=cls.user, title='Без вложений', content='<p>Текст</p>')
+        PostAttachment.objects.bulk_create([
+            PostAttachment(post=post, file='post_attachments/2026/01/01/заметки 1.txt', file_type='text'),
+            PostAttachment(
+                post=post, file='post_attachments/photo.png', file_type='image',
+                thumbnail='post_thumbnails/thumb.jpg', thumbnail_status='ready',
+                thumbnail_variants={
+                    'webp': {'name': 'post_thumbnails/thumb.webp', 'width': 300},
+                    'avif': {'name': 'post_thumbnails/thumb.avif', 'width': 200},
+                }
+            ),
+        ])
+        comment = Comment.objects.create(author=cls.user, post=post, content='Комментарий')
+        Comment.objects.create(author=cls.user, post=post, parent=comment, content='Ответ')
+        CommentAttachment.objects.bulk_create([
+            CommentAttachment(comment=comment, image='comment_attachments/image.png')
+        ])
+
+    def assertSameOutput(self, url, queryset_builder, serializer_class, fast_serializer_class):
+        request = Request(APIRequestFactory().get(url, HTTP_HOST='blog.example.com'))
+        items = list(queryset_builder(FieldSelection.from_request(request)))
+        context = {'request': request}
+        expected = JSONRenderer().render(serializer_class(items, many=True, context=context).data)
+        actual = ORJSONRenderer().render(fast_serializer_class(items, many=True, context=context).data)
+        self.assertEqual(actual, expected, url)
+
+    def test_posts(self):
+        for url in (
+            '/api/posts/',
+            '/api/posts/?fields=id,title,attachments.file_url',
+            '/api/posts/?expand=recent_comments.replies',
+        ):
+            self.assertSameOutput(
+                url, lambda selection: post_list_queryset(selection=selection), PostSerializer, PostReadSerializer
+            )
+
+    def test_comments(self):
+        for url in ('/api/comments/', '/api/comments/?fields=id,replies.post_title&expand=replies'):
+            self.assertSameOutput(
+                url,
+                lambda selection: comment_queryset(Comment.objects.order_by('id'), selection),
+                CommentSerializer,
+                CommentReadSerializer
+            )
+
+
+class UploadValidationTests(TestCase):
+    """Файлы проверяются и отклоняются во время приема тела запроса."""
+    file_types = {'file': (TEXT, IMAGE), 'image': (IMAGE,)}
+
+    def parse(self, data, **extra):
+        request = Request(
+            APIRequestFactory().post('/api/uploads/', data, format='multipart', **extra),
+            parsers=[UploadMultiPartParser()],
+            parser_context={'view': SimpleNamespace(upload_file_types=self.file_types)}
+        )
+        return request.FILES
+
+    @staticmethod
+    def image(size, format_name='PNG', name='image.png', **options):
+        content = BytesIO()
+        Image.new('L', size).save(content, format_name, **options)
+        return SimpleUploadedFile(name, content.getvalue())
+
+    def assertRejected(self, field, data, message, **extra):
+        with self.assertRaises(exceptions.ValidationError) as error:
+            self.parse(data, **extra)
+        self.assertIn(message, str(error.exception.detail[field][0]))
+
+    def test_valid_files_are_kept_in_memory(self):
+        jpeg = self.image((640, 480), 'JPEG', 'photo.jpg')
+        # Два блока APP2 по 64 КБ перед заголовком с размерами
+        padding = (b'\xff\xe2' + (65000 + 2).to_bytes(2, 'big') + b'\x00' * 65000) * 2
+        content = jpeg.read()
+        jpeg = SimpleUploadedFile('photo.jpg', content[:2] + padding + content[2:])
+        files = self.parse({
+            'file': SimpleUploadedFile('заметки.txt', 'Привет, мир'.encode('utf-8')),
+            'image': jpeg,
+        })
+
+        self.assertIsInstance(files['file'], InMemoryUploadedFile)
+        self.assertEqual(files['file'].file_type, TEXT)
+        self.assertEqual(files['file'].read().decode('utf-8'), 'Привет, мир')
+        self.assertEqual(files['image'].file_type, IMAGE)
+        self.assertEqual(files['image'].size, jpeg.size)
+
+    def test_content_must_match_extension(self):
+        self.assertRejected('image', {'image': SimpleUploadedFile('image.png', b'plain text')}, 'не является изображением')
+        self.assertRejected('file', {'file': self.image((10, 10), name='notes.txt')}, 'не соответствует')
+        self.assertRejected('file', {'file': SimpleUploadedFile('GIF.txt', b'GIF89a text')}, 'не соответствует')
+        self.assertRejected('file', {'file': SimpleUploadedFile('notes.txt', b'\xff\xfe binary')}, 'UTF-8')
+        self.assertRejected('image', {'image': SimpleUploadedFile('notes.txt', b'text')}, 'расширение')
+
+        # Формат изображения должен совпадать с расширением
+        for format_name, name in (('PNG', 'image.gif'), ('GIF', 'image.jpg'), ('JPEG', 'photo.png')):
+            self.assertRejected('image', {'image': self.image((10, 10), format_name, name)}, 'не соответствует')
+        files = self.parse({
+            'image': self.image((10, 10), 'JPEG', 'PHOTO.JPEG'),
+            'file': self.image((10, 10), 'GIF', 'image.gif'),
+        })
+        self.assertEqual((files['image'].file_type, files['file'].file_type), (IMAGE, IMAGE))
+        self.assertRejected('other', {'other': SimpleUploadedFile('notes.txt', b'text')}, 'не поддерживается')
+
+    def test_size_limits(self):
+        self.assertRejected(
+            'file', {'file': SimpleUploadedFile('notes.txt', b'a' * (100 * 1024 + 1))}, '100 КБ'
+        )
+        # Лимит запроса проверяется по Content-Length до чтения тела
+        self.assertRejected(
+            'non_field_errors', {'file': SimpleUploadedFile('notes.txt', b'text')}, 'Размер запроса',
+            CONTENT_LENGTH=str(100 * 1024 * 1024)
+        )
+
+    def test_decompression_bomb_is_rejected_by_header(self):
+        self.assertRejected('image', {'image': self.image((10000, 5000))}, 'слишком большое')
+
+    def test_rejected_upload_returns_field_error(self):
+        user = User.objects.create_user(username='uploader', email='uploader@example.com', password='password')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        response = client.post(
+            '/api/post-attachments/create/',
+            {'file': SimpleUploadedFile('image.gif', b'not a gif')},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json())
+
+
+class RequestMetricsTests(TestCase):
+    """Метрики запросов, бюджет SQL-запросов и заголовок Server-Timing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        Post.objects.create(author=cls.user, title='Пост', content='Текст', is_published=True)
+
+    def setUp(self):
+        request_metrics.clear()
+        # Лента кешируется: каждый тест начинает с пустого кеша
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/posts/')
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        labels = f'view="{resolve("/api/posts/")._func_path}",route="post-list",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', text)
+        self.assertIn(f'http_request_db_queries_bucket{{{labels},le="+Inf"}} 1', text)
+        self.assertIn(f'http_request_serialization_duration_seconds_sum{{{labels}}}', text)
+        # Сам /metrics в метрики не попадает
+        self.assertNotIn('route="metrics"', text)
+
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_metrics_loopback_only_by_default(self):
+        self.assertEqual(settings.METRICS_ALLOWED_IPS, ['127.0.0.1', '::1'])
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='::1').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 404)
+
+        with self.settings(METRICS_ALLOWED_IPS=[]):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+    def test_query_budget_logs_sql(self):
+        with self.settings(QUERY_BUDGETS={'post-list': 1}):
+            with self.assertLogs('backend.middleware.metrics_middleware', 'WARNING') as logs:
+                self.client.get('/api/posts/')
+
+        self.assertIn('/api/posts/ (post-list)', logs.output[0])
+        self.assertIn('FROM "blog_post"', logs.output[0])
+        self.assertIn('http_request_query_budget_exceeded_total{', request_metrics.render())
+
+    def test_server_timing_header(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/posts/'))
+        with self.settings(SERVER_TIMING_HEADER=True):
+            response = self.client.get('/api/posts/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", serialization;dur=[\d.]+, total;dur=')
+
+
+class SeedBlogTests(TestCase):
+    """Генерация тестовых данных командой seed_blog."""
+
+    def seed(self, **options):
+        options = {
+            'users': 20, 'posts': 30, 'comments': 500, 'max_depth': 3,
+            'post_attachments': 0, 'comment_attachments': 0, **options
+        }
+        call_command('seed_blog', stdout=StringIO(), **options)
+
+    def test_seed_creates_consistent_trees(self):
+        self.seed()
+
+        self.assertEqual(User.objects.filter(username__startswith='seed42_').count(), 20)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 500)
+        visible = Comment.objects.filter(is_deleted=False).count()
+        self.assertEqual(sum(Post.objects.values_list('comments_count', flat=True)), visible)
+        # Строка глубины 0 на каждый комментарий, глубина ограничена max_depth
+        self.assertEqual(CommentTree.objects.filter(depth=0).count(), 500)
+        self.assertEqual(max(CommentTree.objects.values_list('depth', flat=True)), 3)
+        # Таблица замыканий совпадает с перестроенной по parent
+        rows = set(CommentTree.objects.values_list('comment_id', 'ancestor_id', 'depth'))
+        call_command('rebuild_comment_tree', stdout=StringIO())
+        self.assertEqual(set(CommentTree.objects.values_list('comment_id', 'ancestor_id', 'depth')), rows)
+
+    def test_seed_is_deterministic(self):
+        self.seed(seed=7, prefix='first')
+        first = list(Comment.objects.order_by('pk').values_list('content', 'created_at', 'is_deleted'))
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        self.seed(seed=7, prefix='second')
+        second = list(Comment.objects.order_by('pk').values_list('content', 'created_at', 'is_deleted'))
+
+        self.assertEqual(first, second)
+        with self.assertRaises(CommandError):
+            self.seed(seed=7, prefix='second')
+
+
+class BenchmarkSuiteTests(TestCase):
+    """Набор микробенчмарков bench_suite."""
+
+    def test_database_benchmarks_roll_back(self):
+        benchmarks = list(collect_benchmarks(['insert_depth_10', 'move_subtree_10', 'notifications.comment']))
+        self.assertEqual(len(benchmarks), 3)
+
+        for benchmark in benchmarks:
+            stats = run_benchmark(benchmark, rounds=2, min_time=0)
+            self.assertEqual(stats['rounds'], 2)
+            self.assertGreater(stats['median'], 0)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_output_and_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            call_command(
+                'bench_suite', patterns=['html_validator.typical'], rounds=2, min_time=0,
+                output=path, stdout=StringIO()
+            )
+            with open(path, encoding='utf-8') as file:
+                result = json.load(file)
+            self.assertEqual(list(result['benchmarks']), ['html_validator.typical_2kb'])
+            self.assertEqual(result['benchmarks']['html_validator.typical_2kb']['stats']['rounds'], 2)
+
+            # Медиана в базовом результате в 10 раз меньше — регрессия
+            result['benchmarks']['html_validator.typical_2kb']['stats']['median'] /= 10
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(result, file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'bench_suite', patterns=['html_validator.typical'], rounds=2, min_time=0,
+                    compare=path, fail_on_regression=True, stdout=StringIO()
+                )
+
+    def test_compare_statuses(self):
+        def result(**medians):
+            return {'benchmarks': {name: {'stats': {'median': value}} for name, value in medians.items()}}
+
+        rows = compare(
+            result(fast=1.0, slow=1.0, same=1.0, gone=1.0),
+            result(fast=0.5, slow=2.0, same=1.05, added=1.0),
+            0.1
+        )
+        self.assertEqual(
+            {name: status for name, _, _, _, status in rows},
+            {'fast': 'improvement', 'slow': 'regression', 'same': 'same', 'gone': 'removed', 'added': 'new'}
+        )
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    """Нагрузочный тест loadtest в процессе: приложение работает в потоке со своим подключением к БД."""
+
+    def setUp(self):
+        call_command(
+            'seed_blog', users=5, posts=10, comments=200, max_depth=2,
+            post_attachments=0, comment_attachments=0, stdout=StringIO()
+        )
+
+    def run_loadtest(self, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'loadtest.json')
+            options = {
+                'concurrency': 3, 'requests': 30, 'mix': 'comment-create=0', 'output': path, **options
+            }
+            try:
+                call_command('loadtest', stdout=StringIO(), **options)
+            finally:
+                with open(path, encoding='utf-8') as file:
+                    self.result = json.load(file)
+
+    def test_reports_routes_within_budget(self):
+        self.run_loadtest(budget=['post-list:p99=60000'])
+
+        self.assertEqual(self.result['requests'], 30)
+        self.assertEqual(self.result['errors'], 0)
+        self.assertEqual(self.result['violations'], [])
+        self.assertEqual(
+            set(self.result['routes']), {'post-list', 'post-top-comments', 'comment-replies', 'ws-connect'}
+        )
+        for route in self.result['routes'].values():
+            self.assertLessEqual(route['p50_ms'], route['p95_ms'])
+            self.assertLessEqual(route['p95_ms'], route['p99_ms'])
+        ws = self.result['routes']['ws-connect']
+        self.assertEqual(ws['statuses'], {'101': ws['requests']})
+
+    def test_exceeded_budget_fails(self):
+        with self.assertRaisesMessage(CommandError, 'post-list: p50'):
+            self.run_loadtest(
+                mix='post-top-comments=0,comment-replies=0,ws-connect=0,comment-create=0',
+                budget=['post-list:p50=0']
+            )
+        self.assertEqual(self.result['routes']['post-list']['requests'], 30)
+
+
+class AsyncReadViewTests(TestCase):
+    """Асинхронные представления чтения отдают те же байты, что и синхронные."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        cls.post = Post.objects.create(author=cls.user, title='Пост', content='<p>Текст</p>', is_published=True)
+        Post.objects.create(author=cls.user, title='Черновик', content='<p>Текст</p>', is_published=False)
+        cls.root = Comment.objects.create(post=cls.post, author=cls.user, content='Корень')
+        cls.reply = Comment.objects.create(post=cls.post, author=cls.user, content='Ответ', parent=cls.root)
+        Comment.objects.create(post=cls.post, author=cls.user, content='Ответ на ответ', parent=cls.reply)
+        Comment.objects.create(post=cls.post, author=cls.user, content='Второй ответ', parent=cls.root)
+        Comment.objects.create(post=cls.post, author=cls.user, content='Удален', parent=cls.root, is_deleted=True)
+        Comment.objects.create(post=cls.post, author=cls.user, content='Второй корень')
+
+    def render(self, view_class, path, user, **kwargs):
+        request = APIRequestFactory().get(path, HTTP_HOST='blog.example.com')
+        if user is not None:
+            force_authenticate(request, user)
+        view = view_class.as_view()
+        if iscoroutinefunction(view):
+            view = async_to_sync(view)
+        response = view(request, **kwargs).render()
+        # ETag и Last-Modified зависят от версии кеша лент, а не от представления
+        return response.status_code, response.get('X-Thread-Truncated'), response.has_header('ETag'), response.content
+
+    def assertSameResponse(self, sync_view, async_view, path, user=True, **kwargs):
+        user = self.user if user else None
+        listing_cache.invalidate()
+        expected = self.render(sync_view, path, user, **kwargs)
+        listing_cache.invalidate()
+        with self.subTest(path=path):
+            self.assertEqual(self.render(async_view, path, user, **kwargs), expected)
+        return expected
+
+    def test_post_list(self):
+        for path in (
+            '/api/posts/',
+            '/api/posts/?fields=id,title,recent_comments.content',
+            '/api/posts/?expand=recent_comments.replies',
+            f'/api/posts/?author={self.user.pk}&ordering=title',
+            '/api/posts/?author=0',
+        ):
+            self.assertSameResponse(views.PostListView, async_views.AsyncPostListView, path)
+
+        _, _, cached, _ = self.assertSameResponse(
+            views.PostListView, async_views.AsyncPostListView, '/api/posts/', user=False
+        )
+        self.assertTrue(cached)
+
+        status, _, _, content = self.assertSameResponse(
+            views.PostListView, async_views.AsyncPostListView, '/api/posts/?page_size=1'
+        )
+        next_url = json.loads(content)['next']
+        self.assertSameResponse(views.PostListView, async_views.AsyncPostListView, next_url)
+
+    def test_post_detail(self):
+        for path in ('', '?expand=comments.replies', '?fields=id,comments.id', '?fields=id'):
+            self.assertSameResponse(
+                views.PostRetrieveView, async_views.AsyncPostRetrieveView, f'/api/posts/{self.post.pk}/{path}',
+                pk=self.post.pk
+            )
+        status, *_ = self.assertSameResponse(
+            views.PostRetrieveView, async_views.AsyncPostRetrieveView, '/api/posts/0/', pk=0
+        )
+        self.assertEqual(status, 404)
+
+    def test_comments(self):
+        cases = (
+            (views.PostTopCommentsView, async_views.AsyncPostTopCommentsView, 'posts/{}/top-comments/', self.post.pk),
+            (views.CommentRepliesListView, async_views.AsyncCommentRepliesListView, 'comments/{}/replies/', self.root.pk),
+            (views.CommentThreadView, async_views.AsyncCommentThreadView, 'comments/{}/thread/', self.reply.pk),
+        )
+        for sync_view, async_view, path, pk in cases:
+            for query in ('', '?expand=replies&fields=id,content,replies', '?ordering=-created_at'):
+                self.assertSameResponse(sync_view, async_view, f'/api/{path.format(pk)}{query}', pk=pk)
+            status, *_ = self.assertSameResponse(sync_view, async_view, f'/api/{path.format(0)}', pk=0)
+            self.assertEqual(status, 404)
+
+        _, truncated, _, _ = self.assertSameResponse(
+            views.CommentThreadView, async_views.AsyncCommentThreadView,
+            f'/api/comments/{self.reply.pk}/thread/?max_nodes=2', pk=self.reply.pk
+        )
+        self.assertEqual(truncated, 'true')
+
+    async def test_async_stack_metrics(self):
+        request_metrics.clear()
+        # Пользователь попадает в кеш JWT-аутентификации
+        self.addCleanup(cache.clear)
+        response = await AsyncClient().get(
+            f'/api/posts/{self.post.pk}/', headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['id'], self.post.pk)
+        # Запросы async ORM выполняются в потоках sync_to_async и все равно учитываются
+        queries = re.search(r'http_request_db_queries_sum\{[^}]*route="post-detail"[^}]*\} (\d+)', request_metrics.render())
+        self.assertGreater(int(queries[1]), 0)
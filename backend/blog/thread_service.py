@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db.models import F, Q
+
+from .fieldsets import FieldSelection
+from .models import Comment, CommentTree
+from .serializers import CommentSerializer
+
+
+class CommentThreadService:
+    """Сборка ветки комментариев по таблице замыканий за фиксированное число запросов."""
+
+    def __init__(self, max_depth=None, max_nodes=None):
+        # None — лимиты из настроек, которые читаются при каждой сборке ветки
+        self._max_depth = max_depth
+        self._max_nodes = max_nodes
+
+    @property
+    def max_depth(self):
+        return self._max_depth or settings.COMMENT_THREAD_MAX_DEPTH
+
+    @property
+    def max_nodes(self):
+        return self._max_nodes or settings.COMMENT_THREAD_MAX_NODES
+
+    def get_root_id(self, comment_id):
+        """Возвращает ID корневого комментария ветки (None, если комментарий не найден)."""
+        return self._root_id_queryset(comment_id).first()
+
+    def _root_id_queryset(self, comment_id):
+        return CommentTree.objects.filter(
+            comment_id=comment_id
+        ).order_by('-depth').values_list('ancestor_id', flat=True)
+
+    def get_thread_comments(self, root_id, max_depth=None, max_nodes=None):
+        """
+        Загружает поддерево корня одним запросом вместе с авторами и вложениями.
+
+        Комментарии упорядочены по глубине, поэтому при срабатывании лимита
+        отбрасываются самые глубокие узлы, а дерево остается связным.
+        """
+        max_nodes = self._clamp(max_nodes, self.max_nodes)
+        comments = list(self._thread_queryset(root_id, max_depth, max_nodes))
+        return comments[:max_nodes], len(comments) > max_nodes
+
+    def _thread_queryset(self, root_id, max_depth, max_nodes):
+        queryset = Comment.objects.filter(
+            descendants__ancestor_id=root_id,
+            descendants__depth__lte=self._clamp(max_depth, self.max_depth)
+        ).filter(
+            Q(is_deleted=False) | Q(pk=root_id)
+        ).annotate(
+            thread_depth=F('descendants__depth')
+        ).select_related('author', 'post').prefetch_related(
+            'attachments'
+        ).order_by('thread_depth', 'created_at', 'id')
+
+        # Берем на один узел больше, чтобы понять, была ли ветка обрезана
+        return queryset[:max_nodes + 1]
+
+    def build_thread(self, comment_id, context=None, max_depth=None, max_nodes=None):
+        """
+        Возвращает ветку, содержащую комментарий, в формате CommentSerializer
+        с вложенным списком replies, и флаг обрезки ветки.
+        """
+        root_id = self.get_root_id(comment_id)
+        if root_id is None:
+            raise Comment.DoesNotExist
+
+        comments, truncated = self.get_thread_comments(root_id, max_depth, max_nodes)
+        return self._assemble(root_id, comments, context), truncated
+
+    async def abuild_thread(self, comment_id, context=None, max_depth=None, max_nodes=None):
+        """build_thread для асинхронных представлений: те же запросы через async ORM."""
+        root_id = await self._root_id_queryset(comment_id).afirst()
+        if root_id is None:
+            raise Comment.DoesNotExist
+
+        max_nodes = self._clamp(max_nodes, self.max_nodes)
+        comments = [comment async for comment in self._thread_queryset(root_id, max_depth, max_nodes)]
+        return self._assemble(root_id, comments[:max_nodes], context), len(comments) > max_nodes
+
+    @staticmethod
+    def _assemble(root_id, comments, context):
+        """Сериализует комментарии и собирает из них дерево с корнем root_id."""
+        context = context or {}
+        # Поля всех узлов выбираются параметром fields, а replies заполняется ниже
+        # по таблице замыканий (и не выводится, если fields его не содержит)
+        selection = FieldSelection.from_request(context.get('request'))
+        with_replies = selection.includes('replies')
+        serialized = CommentSerializer(
+            comments, many=True, context=context, selection=selection.without_expand('replies')
+        ).data
+
+        nodes = {}
+        for comment, data in zip(comments, serialized):
+            if with_replies:
+                data['replies'] = []
+            if comment.pk == root_id:
+                nodes[comment.pk] = data
+                continue
+            # Ответы удаленных комментариев не попадают в ветку
+            parent = nodes.get(comment.parent_id)
+            if parent is not None:
+                if with_replies:
+                    parent['replies'].append(data)
+                nodes[comment.pk] = data
+
+        return nodes[root_id]
+
+    @staticmethod
+    def _clamp(value, limit):
+        """Ограничивает запрошенное значение сверху лимитом из настроек."""
+        if value is None or value < 0:
+            return limit
+        return min(value, limit)
+
+
+comment_thread_service = CommentThreadService()
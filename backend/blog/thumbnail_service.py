@@ -0,0 +1,169 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from .cache import listing_cache
+from .imaging import render_thumbnails
+from .notification_service import notification_service
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailService:
+    """
+    Фоновая генерация миниатюр вложений.
+
+    Вложение сохраняется сразу со статусом pending, после коммита транзакции
+    задача уходит в пул процессов, а результат записывается в БД и
+    отправляется загрузившему пользователю через NotificationConsumer.
+    Статус pending в БД служит очередью: незавершенные задачи
+    дообрабатывает команда process_thumbnails.
+    """
+
+    def __init__(self):
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn: рабочим процессам не нужно наследовать состояние сервера
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def schedule(self, attachment):
+        """Ставит генерацию миниатюры в очередь после фиксации транзакции."""
+        model, pk = type(attachment), attachment.pk
+        transaction.on_commit(lambda: self._submit(model, pk))
+
+    def _submit(self, model, pk):
+        if not settings.THUMBNAIL_ASYNC:
+            self.process(model, pk)
+            return
+
+        attachment = model.objects.filter(pk=pk).first()
+        if attachment is None:
+            return
+        future = self.executor.submit(render_thumbnails, attachment.source_file.path, *self._render_options())
+        future.add_done_callback(partial(self._on_rendered, model, pk))
+
+    def _render_options(self):
+        return (
+            settings.THUMBNAIL_VARIANTS,
+            settings.THUMBNAIL_FORMATS,
+            settings.THUMBNAIL_FALLBACK_VARIANT,
+            settings.THUMBNAIL_QUALITY,
+        )
+
+    def _on_rendered(self, model, pk, future):
+        """Сохраняет результат из пула (выполняется в служебном потоке пула)."""
+        close_old_connections()
+        try:
+            attachment = model.objects.filter(pk=pk).first()
+            if attachment is None:
+                return
+            try:
+                data = future.result()
+            except Exception:
+                logger.exception('Ошибка обработки изображения %s #%s', model.__name__, pk)
+                self._mark_failed(attachment)
+                return
+            self._store(attachment, data)
+        finally:
+            close_old_connections()
+
+    def process(self, model, pk):
+        """Синхронно создает миниатюру (команда process_thumbnails и режим без пула)."""
+        attachment = model.objects.filter(pk=pk).first()
+        if attachment is None:
+            return
+        try:
+            with attachment.source_file.open('rb') as source:
+                data = render_thumbnails(source, *self._render_options())
+        except Exception:
+            # Кроме ошибок чтения Pillow бросает DecompressionBombError, ValueError и др.;
+            # вложение не должно навсегда остаться в статусе pending
+            logger.exception('Ошибка обработки изображения %s #%s', model.__name__, pk)
+            self._mark_failed(attachment)
+            return
+        self._store(attachment, data)
+
+    def _store(self, attachment, data):
+        """Сохраняет файлы миниатюр, обновляет статус и уведомляет загрузившего пользователя."""
+        storage = attachment.thumbnail.storage
+        field = attachment.thumbnail.field
+        stem = os.path.splitext(os.path.basename(attachment.source_file.name))[0]
+
+        # Файлы предыдущей обработки (при замене исходного изображения) больше не нужны
+        for variant in attachment.thumbnail_variants.values():
+            storage.delete(variant['name'])
+        if attachment.thumbnail:
+            storage.delete(attachment.thumbnail.name)
+
+        variants = {}
+        for name, (content, width, height, extension) in data['variants'].items():
+            variants[name] = {
+                'name': storage.save(
+                    field.generate_filename(attachment, f'thumb_{stem}_{name}.{extension}'),
+                    ContentFile(content)
+                ),
+                'width': width,
+                'height': height,
+            }
+        thumbnail = storage.save(
+            field.generate_filename(attachment, f'thumb_{stem}.jpg'),
+            ContentFile(data['fallback'])
+        ) if data['fallback'] else None
+
+        type(attachment).objects.filter(pk=attachment.pk).update(
+            thumbnail=thumbnail,
+            thumbnail_variants=variants,
+            thumbnail_status=attachment.THUMBNAIL_READY
+        )
+        attachment.thumbnail = thumbnail
+        attachment.thumbnail_variants = variants
+        attachment.thumbnail_status = attachment.THUMBNAIL_READY
+        # update() не отправляет сигналы, поэтому кеш лент сбрасываем сами
+        listing_cache.invalidate()
+        self._notify(attachment)
+
+    def _mark_failed(self, attachment):
+        type(attachment).objects.filter(pk=attachment.pk).update(
+            thumbnail_status=attachment.THUMBNAIL_FAILED
+        )
+        attachment.thumbnail_status = attachment.THUMBNAIL_FAILED
+        self._notify(attachment)
+
+    def _notify(self, attachment):
+        ready = attachment.thumbnail_status == attachment.THUMBNAIL_READY
+        with transaction.atomic():
+            self._enqueue_notification(attachment, ready)
+
+    def _enqueue_notification(self, attachment, ready):
+        notification = notification_service.create_notification(
+            notification_type='success' if ready else 'error',
+            title='Миниатюра готова' if ready else 'Ошибка обработки изображения',
+            message=f'Вложение {os.path.basename(attachment.source_file.name)}',
+            user_id=attachment.uploader_id,
+            data={
+                'attachment': {
+                    'id': attachment.pk,
+                    'model': attachment._meta.model_name,
+                    'thumbnail_status': attachment.thumbnail_status,
+                    'thumbnail_url': attachment.thumbnail.url if attachment.thumbnail else None,
+                    'thumbnail_srcset': attachment.thumbnail_srcset(),
+                }
+            }
+        )
+        notification_service.enqueue_notification(attachment.uploader_id, notification)
+
+
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,225 @@
+"""
+Проверка загружаемых файлов во время приема тела запроса.
+
+UploadValidationHandler подключается парсером UploadMultiPartParser к view
+с атрибутом upload_file_types ({поле: допустимые типы}) и отклоняет
+файл, как только это становится возможно:
+
+- по Content-Length запроса и части multipart — до чтения данных;
+- по числу принятых байт — как только оно превышает лимит типа файла;
+- по сигнатуре и заголовку изображения (формат, ширина и высота) из первых
+  байт файла — до полного приема и без декодирования пикселей, поэтому
+  изображения-«бомбы» с огромными размерами отклоняются сразу.
+
+Файлы держатся в памяти (лимиты небольшие) и на диск не пишутся.
+Ошибка — rest_framework.exceptions.ValidationError по имени поля,
+остаток тела запроса при этом не читается.
+"""
+import codecs
+import os
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+TEXT = 'text'
+IMAGE = 'image'
+
+EXTENSION_TYPES = {
+    'jpg': IMAGE,
+    'jpeg': IMAGE,
+    'png': IMAGE,
+    'gif': IMAGE,
+    'txt': TEXT,
+}
+
+# Формат изображения, который должен соответствовать расширению
+EXTENSION_FORMATS = {
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'png': 'PNG',
+    'gif': 'GIF',
+}
+
+# Сигнатуры допустимых форматов изображений
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+# Запас на заголовки multipart и обычные поля формы в Content-Length запроса
+FORM_OVERHEAD = 64 * 1024
+
+
+def file_extension(name):
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def file_type_by_name(name):
+    """Тип файла по расширению имени (None — расширение не поддерживается)."""
+    return EXTENSION_TYPES.get(file_extension(name))
+
+
+def max_upload_size(file_type):
+    """Лимит размера файла типа file_type в байтах."""
+    return settings.UPLOAD_MAX_SIZE[file_type]
+
+
+def format_size(size):
+    if size >= 1024 * 1024:
+        return f'{size // (1024 * 1024)} МБ'
+    return f'{size // 1024} КБ'
+
+
+def sniff_image_format(head):
+    """Формат изображения по сигнатуре в начале файла или None."""
+    for signature, format_name in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return format_name
+    return None
+
+
+def read_image_header(head):
+    """
+    Размеры изображения (ширина, высота) по началу файла, без декодирования
+    пикселей; None, если заголовок еще не принят целиком.
+    Image.DecompressionBombError — размеры больше двух MAX_IMAGE_PIXELS Pillow.
+    """
+    with warnings.catch_warnings():
+        # Размер проверяется по UPLOAD_MAX_IMAGE_PIXELS, предупреждение Pillow не нужно
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        try:
+            with Image.open(BytesIO(head)) as img:
+                return img.size
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+
+class UploadValidationHandler(FileUploadHandler):
+    """Обработчик загрузки с ранним отклонением файлов (см. описание модуля)."""
+
+    def __init__(self, request=None, file_types=None):
+        super().__init__(request)
+        self.file_types = file_types or {}
+        self.files_count = 0
+
+    def reject(self, message, field_name=None):
+        raise ValidationError({field_name or self.field_name or 'non_field_errors': [message]})
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        sizes = [
+            max_upload_size(file_type)
+            for file_types in self.file_types.values()
+            for file_type in file_types
+        ]
+        limit = max(sizes, default=0) * settings.UPLOAD_MAX_FILES + FORM_OVERHEAD
+        if content_length > limit:
+            self.reject(f'Размер запроса превышает {format_size(limit)}.', 'non_field_errors')
+        return None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        allowed = self.file_types.get(field_name)
+        if not allowed:
+            self.reject('Загрузка файлов в это поле не поддерживается.')
+
+        self.files_count += 1
+        if self.files_count > settings.UPLOAD_MAX_FILES:
+            self.reject(f'Можно загрузить не более {settings.UPLOAD_MAX_FILES} файлов за запрос.')
+
+        self.file_type = file_type_by_name(file_name)
+        if self.file_type not in allowed:
+            extensions = ', '.join(name for name, value in EXTENSION_TYPES.items() if value in allowed)
+            self.reject(f'Недопустимое расширение файла. Разрешены: {extensions}')
+
+        self.limit = max_upload_size(self.file_type)
+        if content_length is not None and content_length > self.limit:
+            self.reject(f'Размер файла не должен превышать {format_size(self.limit)}.')
+
+        self.file = BytesIO()
+        self.head = b''
+        self.checked = False
+        self.decoder = codecs.getincrementaldecoder('utf-8')() if self.file_type == TEXT else None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.limit:
+            self.reject(f'Размер файла не должен превышать {format_size(self.limit)}.')
+        if not self.checked:
+            self.head += raw_data
+            self._check_head(final=False)
+        if self.decoder is not None:
+            self._check_text(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.checked:
+            self._check_head(final=True)
+        if self.decoder is not None:
+            self._check_text(b'', final=True)
+        self.file.seek(0)
+        uploaded = InMemoryUploadedFile(
+            file=self.file,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra
+        )
+        # Тип, подтвержденный содержимым (см. PostAttachment._set_file_type)
+        uploaded.file_type = self.file_type
+        return uploaded
+
+    def _check_head(self, final):
+        """Проверяет начало файла: сигнатуру и заголовок изображения."""
+        image_format = sniff_image_format(self.head)
+        if self.file_type == TEXT:
+            if image_format is not None:
+                self.reject('Содержимое файла не соответствует расширению.')
+            self.checked = True
+            return
+
+        if image_format is None:
+            if len(self.head) >= 8 or final:
+                self.reject('Файл не является изображением JPEG, PNG или GIF.')
+            return
+        # Например, PNG с именем .gif: браузер и миниатюры ориентируются на расширение
+        if image_format != EXTENSION_FORMATS[file_extension(self.file_name)]:
+            self.reject('Содержимое файла не соответствует расширению.')
+
+        try:
+            size = read_image_header(self.head)
+        except Image.DecompressionBombError:
+            self.reject(self._too_many_pixels_message())
+        if size is None:
+            # Заголовок (например, EXIF перед размерами JPEG) еще не принят целиком
+            if final or len(self.head) >= settings.UPLOAD_SNIFF_SIZE:
+                self.reject('Не удалось прочитать заголовок изображения.')
+            return
+
+        width, height = size
+        if width * height > settings.UPLOAD_MAX_IMAGE_PIXELS:
+            self.reject(self._too_many_pixels_message(f' ({width}x{height})'))
+        self.checked = True
+        self.head = b''
+
+    @staticmethod
+    def _too_many_pixels_message(size=''):
+        return f'Изображение{size} слишком большое: не более {settings.UPLOAD_MAX_IMAGE_PIXELS} пикселей.'
+
+    def _check_text(self, data, final=False):
+        try:
+            text = self.decoder.decode(data, final)
+        except UnicodeDecodeError:
+            self.reject('Текстовый файл должен быть в кодировке UTF-8.')
+        if '\x00' in text:
+            self.reject('Содержимое файла не соответствует расширению.')
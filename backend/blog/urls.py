@@ -1,16 +1,27 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
     PostListView, PostCreateView, PostRetrieveView, PostUpdateView, PostDestroyView,
     PostPublishedListView, PostMyListView, PostTogglePublishView, PostTopCommentsView,
+    PostExportView,
     PostAttachmentListView, PostAttachmentCreateView, PostAttachmentRetrieveView, PostAttachmentDestroyView,
     CommentListView, CommentCreateView, CommentReplyCreateView, CommentRetrieveView,
     CommentUpdateView, CommentDestroyView, CommentRestoreView, CommentRepliesListView,
-    CommentThreadView, CommentAttachmentListView, CommentAttachmentCreateView,
+    CommentThreadView, CommentImportView, CommentAttachmentListView, CommentAttachmentCreateView,
     CommentAttachmentRetrieveView, CommentAttachmentDestroyView,
-    CommentTreeListView, CommentAncestorsListView, CommentDescendantsListView, CommentViewSet
+    CommentTreeListView, CommentAncestorsListView, CommentDescendantsListView, CommentViewSet,
+    NotificationListView, NotificationUnreadCountView, NotificationMarkReadView
 )
+
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import (
+        AsyncPostListView as PostListView, AsyncPostRetrieveView as PostRetrieveView,
+        AsyncPostTopCommentsView as PostTopCommentsView, AsyncCommentRepliesListView as CommentRepliesListView,
+        AsyncCommentThreadView as CommentThreadView
+    )
+
 router = DefaultRouter()
 router.register(r'comments', CommentViewSet, basename='comment')
 urlpatterns = [
@@ -24,6 +35,9 @@ urlpatterns = [
     path('posts/my/', PostMyListView.as_view(), name='post-my'),
     path('posts/<int:pk>/toggle-publish/', PostTogglePublishView.as_view(), name='post-toggle-publish'),
     path('posts/<int:pk>/top-comments/', PostTopCommentsView.as_view(), name='post-top-comments'),
+    path('posts/export/', PostExportView.as_view(), name='post-export-all'),
+    path('posts/<int:pk>/export/', PostExportView.as_view(), name='post-export'),
+    path('posts/<int:pk>/comments/import/', CommentImportView.as_view(), name='post-comments-import'),
 
     # Вложения постов
     path('post-attachments/', PostAttachmentListView.as_view(), name='post-attachment-list'),
@@ -41,6 +55,11 @@ urlpatterns = [
     # path('comments/<int:pk>/restore/', CommentRestoreView.as_view(), name='comment-restore'),
     path('comments/<int:pk>/replies/', CommentRepliesListView.as_view(), name='comment-replies'),
     path('comments/<int:pk>/thread/', CommentThreadView.as_view(), name='comment-thread'),
+
+    # Уведомления
+    path('notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('notifications/unread-count/', NotificationUnreadCountView.as_view(), name='notification-unread-count'),
+    path('notifications/mark-read/', NotificationMarkReadView.as_view(), name='notification-mark-read'),
     #
     # # Вложения комментариев
     # path('comment-attachments/', CommentAttachmentListView.as_view(), name='comment-attachment-list'),
@@ -1,87 +1,164 @@
-from io import StringIO
+import re
+import threading
+
 from lxml import etree
 from django.core.exceptions import ValidationError
 from django.core.validators import BaseValidator
-from django.utils.html import strip_tags
-import re
 
 from rest_framework import permissions
 
+from .uploads import TEXT, file_type_by_name, format_size, max_upload_size
+
+_URL_SCHEME = re.compile(r'([a-zA-Z][a-zA-Z0-9+.-]*):')
+_URL_IGNORED_CHARS = dict.fromkeys(range(0x21))
+
 
 class HTMLValidator(BaseValidator):
-    def __init__(self, allowed_tags=None):
+    """
+    Потоковый валидатор и нормализатор HTML-разметки постов и комментариев.
+
+    Разрешенные теги и атрибуты и корректность XHTML проверяются за один
+    проход: значение подается в XMLPullParser частями, и события открытия
+    тегов проверяются по мере разбора, поэтому запрещенный тег в начале
+    большого документа отклоняется без разбора остального. Парсер создается
+    один раз на поток и переиспользуется. Глубину вложенности ограничивает
+    libxml2 (256 уровней).
+
+    clean() возвращает нормализованную разметку (теги в нижнем регистре,
+    атрибуты в двойных кавычках, экранированный текст, без комментариев),
+    поэтому при записи через API валидатор выполняется один раз, а результат
+    сохраняется как есть.
+    """
+    chunk_size = 64 * 1024
+    url_attributes = ('href',)
+    allowed_url_schemes = ('http', 'https', 'mailto')
+
+    def __init__(self, allowed_tags=None, allowed_attributes=None):
         self.allowed_tags = allowed_tags or ['a', 'code', 'i', 'strong']
+        self.allowed_attributes = allowed_attributes or {'a': ('href', 'title')}
+        self._local = threading.local()
         super().__init__(limit_value=None)
 
-        # Регулярное выражение для поиска всех HTML-тегов
-        self.all_tags_pattern = re.compile(r'<(/?)(\w+)([^>]*)>')
-
-        # Регулярное выражение для проверки атрибутов в тегах
-        self.attr_pattern = re.compile(
-            r'\s+(href|title)="[^"]*"'  # Разрешаем только href и title в кавычках
-        )
-
     def __call__(self, value):
+        self.clean(value)
+
+    def clean(self, value):
+        """Проверяет разметку и возвращает ее нормализованный вариант."""
         if not value:
             return value
 
-        # 1. Проверяем все теги в тексте
-        self._validate_all_tags(value)
+        parser = self._get_parser()
+        root = None
+
+        def validate_events():
+            nonlocal root
+            for _, element in parser.read_events():
+                if root is None:
+                    # Служебный корневой элемент, в который оборачивается значение
+                    root = element
+                else:
+                    self._validate_element(element)
 
-        # 2. Проверяем валидность XHTML с lxml
         try:
-            parser = etree.XMLParser()
-            etree.parse(StringIO(f"<root>{value}</root>"), parser)
+            parser.feed('<root>')
+            for start in range(0, len(value), self.chunk_size):
+                parser.feed(value[start:start + self.chunk_size])
+                validate_events()
+            parser.feed('</root>')
+            parser.close()
+            validate_events()
         except etree.XMLSyntaxError as e:
+            self._reset_parser(parser)
             raise ValidationError(f'Некорректный XHTML: {str(e)}')
-
-        return value
-
-    def _validate_all_tags(self, html):
-        """Проверяет, что используются только разрешенные теги."""
-        pos = 0
-        while True:
-            match = self.all_tags_pattern.search(html, pos)
-            if not match:
-                break
-
-            tag = match.group(2).lower()
-            is_closing = match.group(1) == '/'
-            attrs = match.group(3) or ''
-
-            # Проверяем, разрешен ли тег
+        except ValidationError:
+            self._reset_parser(parser)
+            raise
+
+        html = etree.tostring(root, encoding='unicode')
+        # Отрезаем <root> и </root> (пустой корень сериализуется как <root/>)
+        return html[len('<root>'):-len('</root>')] if html != '<root/>' else ''
+
+    def _validate_element(self, element):
+        tag = element.tag
+        if tag not in self.allowed_tags:
+            tag = tag.lower()
             if tag not in self.allowed_tags:
                 raise ValidationError(
                     f'Использован запрещенный тег <{tag}>. '
                     f'Разрешены только: {", ".join(self.allowed_tags)}'
                 )
-
-            # Для разрешенных тегов проверяем атрибуты
-            if tag == 'a' and not is_closing:
-                if not self._validate_anchor_attributes(attrs):
+            element.tag = tag
+
+        attributes = element.items()
+        if not attributes:
+            return
+        allowed_attributes = self.allowed_attributes.get(tag, ())
+        for attribute, value in attributes:
+            if attribute not in allowed_attributes:
+                if allowed_attributes:
                     raise ValidationError(
-                        'Тег <a> должен содержать только атрибуты href и title'
+                        f'Тег <{tag}> должен содержать только атрибуты {" и ".join(allowed_attributes)}'
                     )
-            elif attrs.strip():  # Другие теги не должны иметь атрибутов
-                raise ValidationError(
-                    f'Тег <{tag}> не должен содержать атрибутов'
-                )
-
-            pos = match.end()
-
-    def _validate_anchor_attributes(self, attrs):
-        """Проверяет атрибуты для тега <a>."""
-        # Удаляем все разрешенные атрибуты и проверяем, осталось ли что-то
-        cleaned_attrs = self.attr_pattern.sub('', attrs)
-        # Должны остаться только пробелы или ничего
-        return not cleaned_attrs.strip()
+                raise ValidationError(f'Тег <{tag}> не должен содержать атрибутов')
+            if attribute in self.url_attributes:
+                self.check_url(value)
+
+    def check_url(self, url):
+        """Запрещает ссылки со схемами вроде javascript: и data:."""
+        # Браузеры игнорируют пробелы и управляющие символы в схеме ("java\tscript:")
+        match = _URL_SCHEME.match(url.translate(_URL_IGNORED_CHARS))
+        scheme = match.group(1).lower() if match else None
+        if scheme and scheme not in self.allowed_url_schemes:
+            raise ValidationError(
+                f'Недопустимая ссылка: схема {scheme}: не разрешена. '
+                f'Разрешены: {", ".join(self.allowed_url_schemes)}'
+            )
+
+    def _get_parser(self):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = etree.XMLPullParser(
+                events=('start',),
+                resolve_entities=False,
+                no_network=True,
+                remove_comments=True,
+                remove_pis=True
+            )
+            self._local.parser = parser
+        return parser
+
+    def _reset_parser(self, parser):
+        """После ошибки в середине документа парсер закрывается, а его события сбрасываются."""
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        for _ in parser.read_events():
+            pass
+
+    def __getstate__(self):
+        # Парсеры потоков не копируются вместе с валидатором (deepcopy полей моделей)
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, self.__class__)
+            and self.allowed_tags == other.allowed_tags
+            and self.allowed_attributes == other.allowed_attributes
+        )
 
 
 def validate_file_size(value):
-    """Проверяет, что текстовые файлы не превышают 100KB."""
-    limit = 100 * 1024
+    """Проверяет размер файла по лимиту его типа (UPLOAD_MAX_SIZE: текст 100KB, изображения 5MB)."""
+    limit = max_upload_size(file_type_by_name(value.name) or TEXT)
     if value.size > limit:
-        raise ValidationError('Размер файла превышает лимит 100KB.')
+        raise ValidationError(f'Размер файла превышает лимит {format_size(limit)}.')
 
 class IsAuthor(permissions.BasePermission):
     """Проверяет, является ли пользователь автором объекта."""
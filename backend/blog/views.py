@@ -1,55 +1,133 @@
+import time
+
 from rest_framework.decorators import action
 from rest_framework import generics, permissions, status, parsers, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
-from django.db.models import Count, Prefetch, Q
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
-from .models import Post, PostAttachment, Comment, CommentAttachment, CommentTree
+from .cache import listing_cache
+from .export_service import post_export_service
+from .fast_serializers import CommentReadSerializer, PostReadSerializer
+from .fieldsets import FieldSelection
+from .import_service import comment_import_service
+from .metrics import request_metrics
+from .models import Post, PostAttachment, Comment, CommentAttachment, CommentTree, Notification
 from .serializers import (
     PostSerializer, PostDetailSerializer, PostAttachmentCreateSerializer,
     PostAttachmentSerializer, CommentSerializer, CommentAttachmentSerializer,
-    CommentAttachmentCreateSerializer, CommentTreeSerializer
+    CommentAttachmentCreateSerializer, CommentTreeSerializer,
+    NotificationSerializer, NotificationMarkReadSerializer
 )
+from .notification_service import notification_service
+from .parsers import NDJSONParser, UploadMultiPartParser
+from .querysets import comment_queryset, post_list_queryset
+from .search import FullTextSearchFilter, SearchRankOrderingFilter
+from .thread_service import comment_thread_service
+from .uploads import IMAGE, TEXT
 from .validators import IsAuthor
 
 
-class PostListView(generics.ListAPIView):
+class RecentCommentsMixin:
+    """
+    Общий queryset постов с последними N комментариями верхнего уровня.
+
+    Связи и prefetch подгружаются только для полей, выбранных параметром fields.
+    """
+    recent_comments_limit = None  # None — значение RECENT_COMMENTS_LIMIT из настроек
+
+    def get_post_queryset(self):
+        return post_list_queryset(self.recent_comments_limit, FieldSelection.from_request(self.request))
+
+
+class FastListMixin:
+    """
+    Списки на чтение сериализуются быстрым read-only сериализатором
+    (fast_serializers) с тем же результатом, что и serializer_class.
+    """
+    fast_serializer_class = None
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.request.method == 'GET' and self.fast_serializer_class is not None:
+            return self.fast_serializer_class(*args, many=True, context=self.get_serializer_context())
+        return super().get_serializer(*args, **kwargs)
+
+
+class CachedListMixin:
+    """
+    Кеширование ответа списка с версионированной инвалидацией и условными запросами.
+
+    Ответ кешируется по эндпоинту и query-параметрам (включая курсор) и отдается
+    с ETag и Last-Modified; повторный запрос с If-None-Match/If-Modified-Since
+    получает 304 без обращения к БД.
+    """
+    cache_endpoint = None
+
+    def get_cache_endpoint(self, request):
+        """Эндпоинт в ключе кеша; ответы, различающиеся для пользователей, разделяются здесь."""
+        return self.cache_endpoint
+
+    def list(self, request, *args, **kwargs):
+        version = listing_cache.get_version()
+        key = listing_cache.make_key(self.get_cache_endpoint(request), request, version)
+        entry = listing_cache.get(key)
+        if entry is None:
+            response = super().list(request, *args, **kwargs)
+            entry = listing_cache.set(key, response.data, version)
+        return self.get_cached_response(request, entry)
+
+    def get_cached_response(self, request, entry):
+        """Ответ из записи кеша: 304 по условным заголовкам или данные с ETag и Last-Modified."""
+        last_modified = entry['last_modified']
+        # Last-Modified точен до секунды: пока секунда версии не прошла, следующая
+        # запись получит тот же Last-Modified, и If-Modified-Since дал бы ложный 304
+        if time.time() < last_modified + 1:
+            last_modified = None
+        not_modified = get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class PostListView(CachedListMixin, FastListMixin, RecentCommentsMixin, generics.ListAPIView):
     """Список постов с фильтрацией, поиском и сортировкой."""
     serializer_class = PostSerializer
+    fast_serializer_class = PostReadSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, SearchRankOrderingFilter]
     filterset_fields = ['is_published', 'author']
     search_fields = ['title', 'content']
     ordering_fields = ['created_at', 'updated_at', 'title']
     ordering = ['-created_at']
+    cache_endpoint = 'post-list'
 
-    def get_queryset(self):
-        # Получаем последние 3 комментария верхнего уровня (parent=None)
-        recent_top_comments_prefetch = Prefetch(
-            'comments',
-            queryset=Comment.objects.filter(
-                is_deleted=False,
-                parent__isnull=True  # Только комментарии верхнего уровня
-            ).select_related('author').annotate(
-                replies_count=Count(
-                    'replies',
-                    filter=Q(replies__is_deleted=False)
-                )
-            ).order_by('-created_at')[:3],  # Последние 3 комментария
-            to_attr='recent_top_comments'
-        )
-
-        queryset = Post.objects.select_related('author').prefetch_related(
-            'attachments',
-            recent_top_comments_prefetch
-        ).annotate(
-            comments_count=Count('comments', filter=Q(comments__is_deleted=False))
-        )
+    def get_cache_endpoint(self, request):
+        # Авторизованные пользователи видят и неопубликованные посты: ответ для них
+        # не зависит от пользователя, но отличается от ответа анонимам
+        visibility = 'all' if request.user.is_authenticated else 'published'
+        return f'{self.cache_endpoint}:{visibility}'
 
+    def get_queryset(self):
+        queryset = self.get_post_queryset()
         if not self.request.user.is_authenticated:
             queryset = queryset.filter(is_published=True)
         return queryset
@@ -64,7 +142,7 @@ class PostCreateView(generics.CreateAPIView):
         serializer.save(author=self.request.user)
 
 
-class PostRetrieveView(generics.RetrieveAPIView):
+class PostRetrieveView(RecentCommentsMixin, generics.RetrieveAPIView):
     """Просмотр деталей поста."""
     queryset = Post.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -73,27 +151,7 @@ class PostRetrieveView(generics.RetrieveAPIView):
         return PostDetailSerializer
 
     def get_queryset(self):
-        # Для детального просмотра тоже используем только комментарии верхнего уровня
-        recent_top_comments_prefetch = Prefetch(
-            'comments',
-            queryset=Comment.objects.filter(
-                is_deleted=False,
-                parent__isnull=True
-            ).select_related('author').annotate(
-                replies_count=Count(
-                    'replies',
-                    filter=Q(replies__is_deleted=False)
-                )
-            ).order_by('-created_at')[:3],
-            to_attr='recent_top_comments'
-        )
-
-        return Post.objects.select_related('author').prefetch_related(
-            'attachments',
-            recent_top_comments_prefetch
-        ).annotate(
-            comments_count=Count('comments', filter=Q(comments__is_deleted=False))
-        )
+        return self.get_post_queryset()
 
 
 class PostUpdateView(generics.UpdateAPIView):
@@ -109,60 +167,25 @@ class PostDestroyView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAuthor]
 
 
-class PostPublishedListView(generics.ListAPIView):
+class PostPublishedListView(CachedListMixin, FastListMixin, RecentCommentsMixin, generics.ListAPIView):
     """Список опубликованных постов."""
     serializer_class = PostSerializer
+    fast_serializer_class = PostReadSerializer
     permission_classes = [permissions.AllowAny]
+    cache_endpoint = 'post-published'
 
     def get_queryset(self):
-        recent_top_comments_prefetch = Prefetch(
-            'comments',
-            queryset=Comment.objects.filter(
-                is_deleted=False,
-                parent__isnull=True
-            ).select_related('author').annotate(
-                replies_count=Count(
-                    'replies',
-                    filter=Q(replies__is_deleted=False)
-                )
-            ).order_by('-created_at')[:3],
-            to_attr='recent_top_comments'
-        )
-
-        return Post.objects.filter(is_published=True).select_related('author').prefetch_related(
-            'attachments',
-            recent_top_comments_prefetch
-        ).annotate(
-            comments_count=Count('comments', filter=Q(comments__is_deleted=False))
-        )
+        return self.get_post_queryset().filter(is_published=True)
 
 
-class PostMyListView(generics.ListAPIView):
+class PostMyListView(FastListMixin, RecentCommentsMixin, generics.ListAPIView):
     """Список постов текущего пользователя."""
     serializer_class = PostSerializer
+    fast_serializer_class = PostReadSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        recent_top_comments_prefetch = Prefetch(
-            'comments',
-            queryset=Comment.objects.filter(
-                is_deleted=False,
-                parent__isnull=True
-            ).select_related('author').annotate(
-                replies_count=Count(
-                    'replies',
-                    filter=Q(replies__is_deleted=False)
-                )
-            ).order_by('-created_at')[:3],
-            to_attr='recent_top_comments'
-        )
-
-        return Post.objects.filter(author=self.request.user).select_related('author').prefetch_related(
-            'attachments',
-            recent_top_comments_prefetch
-        ).annotate(
-            comments_count=Count('comments', filter=Q(comments__is_deleted=False))
-        )
+        return self.get_post_queryset().filter(author=self.request.user)
 
 
 class PostTogglePublishView(APIView):
@@ -178,9 +201,10 @@ class PostTogglePublishView(APIView):
         return Response(serializer.data)
 
 
-class PostTopCommentsView(generics.ListAPIView):
+class PostTopCommentsView(FastListMixin, generics.ListAPIView):
     """Получение комментариев верхнего уровня для конкретного поста."""
     serializer_class = CommentSerializer
+    fast_serializer_class = CommentReadSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'author']
@@ -188,13 +212,58 @@ class PostTopCommentsView(generics.ListAPIView):
 
     def get_queryset(self):
         post = get_object_or_404(Post, pk=self.kwargs['pk'])
-        return Comment.objects.filter(
+        return comment_queryset(Comment.objects.filter(
             post=post,
             parent__isnull=True,
             is_deleted=False
-        ).select_related('author').annotate(
-            replies_count=Count('replies', filter=Q(replies__is_deleted=False))
+        ), FieldSelection.from_request(self.request))
+
+
+class PostExportView(APIView):
+    """
+    Потоковая выгрузка поста с обсуждением (или всех постов) в NDJSON.
+
+    Все посты выгружаются только администратору, остальным — опубликованный
+    или собственный пост (иначе 404). Query-параметр gzip=true — отдать
+    файл, сжатый gzip. Под ASGI ответ получает асинхронный итератор, чтобы
+    выгрузка не читалась в память целиком.
+    """
+
+    def get_permissions(self):
+        if 'pk' in self.kwargs:
+            return [permissions.IsAuthenticatedOrReadOnly()]
+        return [permissions.IsAdminUser()]
+
+    def get_queryset(self):
+        queryset = Post.objects.all()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        visible = Q(is_published=True)
+        if user.is_authenticated:
+            visible |= Q(author=user)
+        return queryset.filter(visible)
+
+    def get(self, request, pk=None):
+        posts = self.get_queryset()
+        filename = 'posts.ndjson'
+        if pk is not None:
+            posts = posts.filter(pk=get_object_or_404(posts, pk=pk).pk)
+            filename = f'post-{pk}.ndjson'
+
+        compress = request.query_params.get('gzip', 'false').lower() == 'true'
+        if isinstance(request._request, ASGIRequest):
+            chunks = post_export_service.aiter_ndjson(posts, compress=compress)
+        else:
+            chunks = post_export_service.iter_ndjson(posts, compress=compress)
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='application/gzip' if compress else 'application/x-ndjson'
         )
+        if compress:
+            filename += '.gz'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
 class PostAttachmentListView(generics.ListAPIView):
@@ -214,6 +283,7 @@ class PostAttachmentCreateView(generics.CreateAPIView):
     """Создание вложения к посту."""
     serializer_class = PostAttachmentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    upload_file_types = {'file': (TEXT, IMAGE)}
 
     def perform_create(self, serializer):
         post = serializer.validated_data['post']
@@ -241,26 +311,19 @@ class PostAttachmentDestroyView(generics.DestroyAPIView):
         return attachment
 
 
-class CommentListView(generics.ListAPIView):
+class CommentListView(FastListMixin, generics.ListAPIView):
     """Список комментариев с фильтрацией."""
     serializer_class = CommentSerializer
+    fast_serializer_class = CommentReadSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, SearchRankOrderingFilter]
     filterset_fields = ['post', 'parent', 'author', 'is_deleted']
     search_fields = ['content']
     ordering_fields = ['created_at', 'updated_at']
     ordering = ['created_at']
 
     def get_queryset(self):
-        queryset = Comment.objects.select_related('author', 'post', 'parent').prefetch_related(
-            'attachments',
-            Prefetch(
-                'replies',
-                queryset=Comment.objects.filter(is_deleted=False).select_related('author')
-            )
-        ).annotate(
-            replies_count=Count('replies', filter=Q(replies__is_deleted=False))
-        )
+        queryset = comment_queryset(Comment.objects.all(), FieldSelection.from_request(self.request))
 
         if not self.request.user.is_authenticated:
             queryset = queryset.filter(is_deleted=False)
@@ -271,7 +334,8 @@ class CommentCreateView(generics.CreateAPIView):
     """Создание комментария."""
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = (parsers.MultiPartParser, parsers.JSONParser)
+    parser_classes = (UploadMultiPartParser, parsers.JSONParser)
+    upload_file_types = {'attachments': (IMAGE,)}
 
     def perform_create(self, serializer):
         # Сохраняем комментарий
@@ -325,7 +389,7 @@ class CommentDestroyView(generics.DestroyAPIView):
 
     def perform_destroy(self, instance):
         instance.is_deleted = True
-        instance.save()
+        instance.save(update_fields=['is_deleted', 'updated_at'])
 
 
 class CommentRestoreView(APIView):
@@ -336,14 +400,15 @@ class CommentRestoreView(APIView):
         comment = get_object_or_404(Comment, pk=pk)
         self.check_object_permissions(request, comment)
         comment.is_deleted = False
-        comment.save()
+        comment.save(update_fields=['is_deleted', 'updated_at'])
         serializer = CommentSerializer(comment)
         return Response(serializer.data)
 
 
-class CommentRepliesListView(generics.ListAPIView):
+class CommentRepliesListView(FastListMixin, generics.ListAPIView):
     """Список ответов на комментарий."""
     serializer_class = CommentSerializer
+    fast_serializer_class = CommentReadSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'author']
@@ -351,9 +416,7 @@ class CommentRepliesListView(generics.ListAPIView):
 
     def get_queryset(self):
         comment = get_object_or_404(Comment, pk=self.kwargs['pk'])
-        return comment.replies.filter(is_deleted=False).select_related('author').annotate(
-            replies_count=Count('replies', filter=Q(replies__is_deleted=False))
-        )
+        return comment_queryset(comment.replies.filter(is_deleted=False), FieldSelection.from_request(self.request))
 
 
 class CommentThreadView(APIView):
@@ -361,23 +424,56 @@ class CommentThreadView(APIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get(self, request, pk):
-        comment = get_object_or_404(Comment, pk=pk)
-        root_comment = comment
-        while root_comment.parent:
-            root_comment = root_comment.parent
+        try:
+            thread, truncated = comment_thread_service.build_thread(
+                pk,
+                context={'request': request},
+                max_depth=self._get_int_param('max_depth'),
+                max_nodes=self._get_int_param('max_nodes')
+            )
+        except Comment.DoesNotExist:
+            raise Http404
+
+        response = Response(thread)
+        if truncated:
+            response['X-Thread-Truncated'] = 'true'
+        return response
 
-        def get_comment_tree(parent_comment):
-            replies = parent_comment.replies.filter(is_deleted=False).order_by('created_at')
-            result = []
-            for reply in replies:
-                reply_data = CommentSerializer(reply, context={'request': request}).data
-                reply_data['replies'] = get_comment_tree(reply)
-                result.append(reply_data)
-            return result
+    def _get_int_param(self, name):
+        """Возвращает целочисленный query-параметр или None."""
+        try:
+            return int(self.request.query_params[name])
+        except (KeyError, ValueError):
+            return None
 
-        root_data = CommentSerializer(root_comment, context={'request': request}).data
-        root_data['replies'] = get_comment_tree(root_comment)
-        return Response(root_data)
+
+class CommentImportView(APIView):
+    """
+    Массовый импорт дерева комментариев поста (JSON или NDJSON).
+
+    Query-параметры: parent — ID комментария поста, к которому добавляются ответы;
+    notify=false — не создавать уведомления о новых комментариях.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = (parsers.JSONParser, NDJSONParser)
+
+    def post(self, request, pk):
+        post = get_object_or_404(Post, pk=pk)
+        parent = None
+        if request.query_params.get('parent'):
+            parent = get_object_or_404(Comment, pk=request.query_params['parent'], post=post)
+
+        try:
+            result = comment_import_service.import_comments(
+                post,
+                request.data,
+                default_author_id=request.user.pk,
+                parent=parent,
+                notify=request.query_params.get('notify', 'true').lower() != 'false'
+            )
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
+        return Response(result, status=status.HTTP_201_CREATED)
 
 
 class CommentAttachmentListView(generics.ListAPIView):
@@ -397,6 +493,7 @@ class CommentAttachmentCreateView(generics.CreateAPIView):
     """Создание вложения к комментарию."""
     serializer_class = CommentAttachmentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    upload_file_types = {'image': (IMAGE,)}
 
     def perform_create(self, serializer):
         comment = serializer.validated_data['comment']
@@ -461,11 +558,64 @@ class CommentDescendantsListView(generics.ListAPIView):
 
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class NotificationListView(generics.ListAPIView):
+    """Уведомления текущего пользователя (?unread=true — только непрочитанные)."""
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = ('-id',)
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(user=self.request.user)
+        if self.request.query_params.get('unread') in ('true', '1'):
+            queryset = queryset.filter(read=False)
+        return queryset
+
+
+class NotificationUnreadCountView(APIView):
+    """Количество непрочитанных уведомлений."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread_count': notification_service.get_unread_count(request.user.id)})
+
+
+class NotificationMarkReadView(APIView):
+    """Массовая отметка уведомлений прочитанными."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = NotificationMarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        updated = notification_service.mark_read(
+            request.user.id,
+            ids=None if data['all'] else data.get('ids'),
+            up_to_id=None if data['all'] else data.get('up_to_id')
+        )
+        # Кеш счетчика сбрасывается только после коммита, поэтому считаем по БД
+        return Response({
+            'updated': updated,
+            'unread_count': notification_service.count_unread(request.user.id)
+        })
+
+
+class CommentViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    fast_serializer_class = CommentReadSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = (parsers.MultiPartParser, parsers.JSONParser)
+    parser_classes = (UploadMultiPartParser, parsers.JSONParser)
+    upload_file_types = {'attachments': (IMAGE,)}
+    filter_backends = [FullTextSearchFilter, SearchRankOrderingFilter]
+    search_fields = ['content']
+    ordering_fields = ['created_at', 'updated_at']
+    ordering = ['created_at']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = comment_queryset(queryset, FieldSelection.from_request(self.request))
+        return queryset
 
     def perform_create(self, serializer):
         # Сохраняем комментарий
@@ -490,4 +640,11 @@ class CommentViewSet(viewsets.ModelViewSet):
             parent=parent_comment,
             post=parent_comment.post
         )
-        return Response(serializer.data, status=201)
\ No newline at end of file
+        return Response(serializer.data, status=201)
+
+
+def metrics_view(request):
+    """Метрики запросов в текстовом формате Prometheus (см. blog.metrics)."""
+    if settings.METRICS_ALLOWED_IPS and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(request_metrics.render(), content_type=request_metrics.content_type)
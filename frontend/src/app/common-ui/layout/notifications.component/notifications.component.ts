@@ -34,6 +34,7 @@ export class NotificationsComponent implements OnInit, OnDestroy {
   constructor(private websocketService: WebsocketService) {}
 
   ngOnInit(): void {
+    this.websocketService.unreadCount$.subscribe(count => this.unreadCount = count);
     this.websocketService.notifications$.subscribe(notification => {
       this.notifications.unshift(notification);
       if (!notification.read) {
@@ -62,9 +63,10 @@ export class NotificationsComponent implements OnInit, OnDestroy {
   markAllAsRead(): void {
     this.notifications.forEach(n => n.read = true);
     this.unreadCount = 0;
+    this.websocketService.markAllAsRead();
   }
 
-  removeNotification(id: string): void {
+  removeNotification(id: number): void {
     this.notifications = this.notifications.filter(n => n.id !== id);
   }
 
@@ -3,7 +3,9 @@ export interface Attachment{
   file_type: string;
   file_url: string;
   image_url: string;
-  thumbnail_url: string;
+  thumbnail_url: string | null;
+  thumbnail_srcset: string | null;
+  thumbnail_status: 'none' | 'pending' | 'ready' | 'failed';
   upload_at: Date;
 }
 export interface Comment {
@@ -35,3 +37,9 @@ export interface Post {
   comments_count: number;
   recent_comments: Comment[];
 }
+
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
@@ -2,8 +2,8 @@
 import { inject, Injectable } from '@angular/core';
 import { HttpClient, HttpErrorResponse } from '@angular/common/http';
 import { Observable, throwError } from 'rxjs';
-import { catchError, retry } from 'rxjs/operators';
-import { Post, Comment } from '../interfaces/posts-interfaces';
+import { catchError, map, retry } from 'rxjs/operators';
+import { Post, Comment, CursorPage } from '../interfaces/posts-interfaces';
 import {environment} from '../../environments/environment';
 
 @Injectable({
@@ -19,9 +19,10 @@ export class PostsService {
    * Получить все посты
    */
   getAllPosts(): Observable<Post[]> {
-    return this.http.get<Post[]>(`${this.baseApiUrl}posts/`)
+    return this.http.get<CursorPage<Post>>(`${this.baseApiUrl}posts/`)
       .pipe(
         retry(2),
+        map(page => page.results),
         catchError(this.handleError)
       );
   }
@@ -34,9 +35,10 @@ export class PostsService {
       return throwError(() => new Error('Некорректный ID поста'));
     }
 
-    return this.http.get<Comment[]>(`${this.baseApiUrl}posts/${postId}/top-comments/`)
+    return this.http.get<CursorPage<Comment>>(`${this.baseApiUrl}posts/${postId}/top-comments/`)
       .pipe(
         retry(2),
+        map(page => page.results),
         catchError(this.handleError)
       );
   }
@@ -44,19 +46,22 @@ export class PostsService {
   /**
    * Получить список ответов на комментарий с пагинацией
    */
-  getCommentReplies(commentId: number, page: number = 1, pageSize: number = 25): Observable<Comment[]> {
+  getCommentReplies(commentId: number, cursor: string | null = null, pageSize: number = 25): Observable<Comment[]> {
     if (!commentId || commentId <= 0) {
       return throwError(() => new Error('Некорректный ID комментария'));
     }
 
-    const params = {
-      page: page.toString(),
+    const params: Record<string, string> = {
       page_size: pageSize.toString()
     };
+    if (cursor) {
+      params['cursor'] = cursor;
+    }
 
-    return this.http.get<Comment[]>(`${this.baseApiUrl}comments/${commentId}/replies/`, { params })
+    return this.http.get<CursorPage<Comment>>(`${this.baseApiUrl}comments/${commentId}/replies/`, { params })
       .pipe(
         retry(2),
+        map(page => page.results),
         catchError(this.handleError)
       );
   }
@@ -7,12 +7,13 @@ import { environment } from '../../environments/environment';
 import {AuthService} from '../../auth/auth-service';
 
 export interface Notification {
-  id: string;
+  id: number;
   type: 'info' | 'success' | 'warning' | 'error';
   title: string;
   message: string;
   timestamp: Date;
   read: boolean;
+  data?: Record<string, any>;
 }
 
 @Injectable({
@@ -22,6 +23,10 @@ export class WebsocketService implements OnDestroy {
   private socket$!: WebSocketSubject<any>; // Add definite assignment assertion
   private notificationsSubject = new Subject<Notification>();
   public notifications$ = this.notificationsSubject.asObservable();
+  private unreadCountSubject = new Subject<number>();
+  public unreadCount$ = this.unreadCountSubject.asObservable();
+  // id последнего полученного уведомления: при переподключении сервер досылает пропущенные
+  private lastNotificationId: number | null = null;
   private authService = inject(AuthService);
 
   constructor() {
@@ -33,7 +38,10 @@ export class WebsocketService implements OnDestroy {
 
   private getWebSocketConfig() {
     const token = this.authService.token;
-    const url = `${environment.wsUrl}?token=${token}`;
+    let url = `${environment.wsUrl}?token=${token}`;
+    if (this.lastNotificationId !== null) {
+      url += `&last_id=${this.lastNotificationId}`;
+    }
 
     return {
       url,
@@ -68,21 +76,38 @@ export class WebsocketService implements OnDestroy {
     console.log('Incoming message:', message);
 
     if (message.type === 'notification' && message.notification) {
-      const incoming = message.notification;
-
-      const notification: Notification = {
-        id: incoming.id || Date.now().toString(),
-        type: incoming.type || 'info',
-        title: incoming.title || 'Уведомление',
-        message: incoming.message || '',
-        timestamp: new Date(incoming.timestamp), // корректная дата
-        read: incoming.read ?? false
-      };
-
-      this.notificationsSubject.next(notification);
+      this.emitNotification(message.notification);
+    } else if (message.type === 'notifications_replay') {
+      (message.notifications || []).forEach((incoming: any) => this.emitNotification(incoming));
+    } else if (message.type === 'connection_established') {
+      this.unreadCountSubject.next(message.unread_count ?? 0);
+    } else if (message.type === 'unread_count') {
+      this.unreadCountSubject.next(message.count);
+    }
+  }
+
+  private emitNotification(incoming: any): void {
+    const notification: Notification = {
+      id: incoming.id,
+      type: incoming.type || 'info',
+      title: incoming.title || 'Уведомление',
+      message: incoming.message || '',
+      timestamp: new Date(incoming.timestamp), // корректная дата
+      read: incoming.read ?? false,
+      data: incoming.data
+    };
+
+    if (this.lastNotificationId === null || notification.id > this.lastNotificationId) {
+      this.lastNotificationId = notification.id;
     }
+    this.notificationsSubject.next(notification);
   }
 
+  public markAllAsRead(): void {
+    if (this.lastNotificationId !== null) {
+      this.sendMessage({action: 'mark_read', up_to_id: this.lastNotificationId});
+    }
+  }
 
   public sendMessage(message: any): void {
     if (this.socket$ && !this.socket$.closed) {
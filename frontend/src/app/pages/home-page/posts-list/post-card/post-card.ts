@@ -1,5 +1,5 @@
 import { Component, Input, OnInit, inject } from '@angular/core';
-import {CommonModule, NgOptimizedImage} from '@angular/common';
+import {CommonModule} from '@angular/common';
 import {CommentThread} from './comment-thread/comment-thread';
 import {Post} from '../../../../data/interfaces/posts-interfaces';
 import {PostsService} from '../../../../data/services/posts-service';
@@ -10,7 +10,7 @@ import {ImagePreviewModal} from '../../../../common-ui/image-preview-modal/image
 @Component({
   selector: 'app-post-card',
   standalone: true,
-  imports: [CommonModule, CommentThread, AddComment, ImagePreviewModal, NgOptimizedImage],
+  imports: [CommonModule, CommentThread, AddComment, ImagePreviewModal],
   templateUrl: './post-card.html',
   styleUrl: './post-card.css'
 })